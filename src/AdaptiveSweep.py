@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import argparse
+import math
+import glob
+import sys
+import os
+
+from ClusterSpheres import PrepareClusters
+from Aggregate import Aggregator, read_table, read_runs
+from Analysis import load_timescores, run_means
+from Backends import BACKENDS
+from Indock import parse_overrides
+from Outdock import outdock_elapsed
+
+STATE_FIELDS = ["round", "k", "seeds", "pc_enrich", "speedup", "score", "status"]
+
+# baseline run every k is compared to (generate_baseline in Analysis.py)
+BASELINE = (1, 0)
+
+def run_dir(k, n):
+    return "k{}_{}".format(k, n)
+
+def has_results(dir_name):
+    """
+    DOCK results of a run were extracted (Extract.jl), or every one of
+    its subclusters has a finished OUTDOCK (with its elapsed line)
+    """
+    if os.path.isfile(os.path.join(dir_name, "time_and_enrichment.tab")):
+        return True
+    subdirs = glob.glob(os.path.join(dir_name, "subcluster*"))
+    return len(subdirs) > 0 and all(
+        outdock_elapsed(os.path.join(s, "OUTDOCK")) is not None for s in subdirs
+        )
+
+class SuccessiveHalving:
+    """
+    Successive halving over k : every surviving k gets eta times more
+    seeds each round (up to max_seeds) and only the best 1 / eta of them
+    are kept for the next round
+    """
+
+    def __init__(self, k_list, min_seeds=2, eta=2, max_seeds=16):
+        self.k_list = sorted(set(k for k in k_list if k != BASELINE[0]))
+        self.min_seeds = min_seeds
+        self.eta = eta
+        self.max_seeds = max_seeds
+
+    def seeds(self, round_idx):
+        return min(self.min_seeds * self.eta ** round_idx, self.max_seeds)
+
+    def rank(self, scores):
+        """
+        k values from best to worst score, k without a score rank last
+        """
+        return sorted(
+            scores, key=lambda k : (np.isnan(scores[k]), -np.nan_to_num(scores[k]), k)
+            )
+
+    def keep(self, scores):
+        num_kept = max(1, math.ceil(len(scores) / self.eta))
+        return sorted(self.rank(scores)[:num_kept])
+
+class SimulatedScorer:
+    """
+    Stands in for DOCK and Extract.jl : writes the time_and_enrichment.tab
+    of a run from a smooth model of k (subcluster time falling as
+    1 / k ** time_exp, LogAUC peaking at best_k) with seeded noise, so an
+    adaptive sweep can be run end to end without a queue
+    """
+
+    def __init__(self, best_k=6, gain=8.0, width=3.0, time_exp=0.8, noise=1.0, seed=0):
+        self.best_k = best_k
+        self.gain = gain
+        self.width = width
+        self.time_exp = time_exp
+        self.noise = noise
+        self.seed = seed
+
+    def peak(self, k):
+        return self.gain * np.exp(-((k - self.best_k) / self.width) ** 2)
+
+    def values(self, k, n, num_sdi):
+        """
+        (subcluster times, percent AUC, percent LogAUC) of run k{k}_{n}
+        """
+        rng = np.random.RandomState([self.seed, k, n])
+        times = 3600.0 / k ** self.time_exp * rng.lognormal(0, 0.1, num_sdi)
+        log_auc = 20.0 + self.peak(k) - self.peak(BASELINE[0]) + rng.normal(0, self.noise)
+        auc = 70.0 + 0.5 * (log_auc - 20.0) + rng.normal(0, self.noise)
+        return times, auc, log_auc
+
+    def write(self, k, n, num_sdi):
+        dir_name = run_dir(k, n)
+        times, auc, log_auc = self.values(k, n, num_sdi)
+        with open(os.path.join(dir_name, "time_and_enrichment.tab"), "w+") as f:
+            for i, t in enumerate(sorted(times)):
+                f.write("{}/subcluster{:04d}\t{:.4f}\t{:.4f}\t{:.4f}\n".format(dir_name, i, t, auc, log_auc))
+
+class AdaptiveSweep:
+    """
+    Adaptive (k, seed) sweep driven by successive halving
+
+    Each call to step scores the current round once all of its runs have
+    results (read back through Aggregate.py), keeps the best k values and
+    prepares the new seeds of the next round with PrepareClusters. The
+    search stops when one k is left, the seed budget is reached or the
+    best score moved less than plateau between rounds. Rounds are kept in
+    adaptive_sweep.tab and the subclusters of the latest batch are listed
+    in adaptive_dirlist for submission.
+
+    A k is scored by its mean LogAUC change over the baseline (k1_0) plus
+    speedup_weight * log2 of its mean speedup.
+    """
+
+    state_fn = "adaptive_sweep.tab"
+    dirlist_fn = "adaptive_dirlist"
+
+    def __init__(self, search, prepare_options, output_dir="adaptive", speedup_weight=0.1, plateau=0.02, scorer=None, jobs=None, serial=False, verbose=False):
+        self.search = search
+        self.prepare_options = prepare_options
+        self.output_dir = output_dir
+        self.speedup_weight = speedup_weight
+        self.plateau = plateau
+        self.scorer = scorer
+        self.jobs = jobs
+        self.serial = serial
+        self.verbose = verbose
+
+    def read_state(self):
+        if not os.path.isfile(self.state_fn):
+            return []
+        header, rows = read_table(self.state_fn)
+        return [dict(zip(header, r)) for r in rows]
+
+    def write_state(self, rows):
+        with open(self.state_fn + ".tmp", "w+") as f:
+            f.write("\t".join(STATE_FIELDS) + "\n")
+            for row in rows:
+                f.write("\t".join(
+                    "{:.4f}".format(row[c]) if isinstance(row[c], float) else str(row[c])
+                    for c in STATE_FIELDS
+                    ) + "\n")
+        os.replace(self.state_fn + ".tmp", self.state_fn)
+
+    def round_runs(self, rows):
+        return [BASELINE] + [
+            (int(r["k"]), n) for r in rows for n in range(int(r["seeds"]))
+            ]
+
+    def prepare(self, runs, build_store=False):
+        """
+        builds the run directories of a batch (existing ones are kept),
+        the shared store is only built with the first round so DOCK jobs
+        of earlier rounds keep reading the same shards
+        """
+        pc = PrepareClusters(
+            k_list = sorted(set(k for k, _ in runs)),
+            num_iter = max(n for _, n in runs) + 1,
+            runs = runs,
+            incremental = True,
+            jobs = self.jobs,
+            serial = self.serial,
+            verbose = self.verbose,
+            **self.prepare_options
+            )
+        if not pc.build_clusters(build_store=build_store):
+            sys.exit("ERROR : failed to prepare round directories")
+
+        # runs rejected by the build (k not reached) get no directory
+        runs = [(k, n) for k, n in runs if os.path.isdir(run_dir(k, n))]
+        with open(self.dirlist_fn, "w+") as f:
+            for k, n in runs:
+                for i in range(pc.num_sdi_clusters):
+                    f.write("./{}/subcluster{:04d}\n".format(run_dir(k, n), i))
+
+        if self.scorer is not None:
+            for k, n in runs:
+                self.scorer.write(k, n, pc.num_sdi_clusters)
+
+    def collect(self):
+        """
+        mean LogAUC change and speedup of every built run
+        """
+        # one scoring for the whole sweep : Extract.jl once every run has it
+        built = [d for d in read_runs(".") if os.path.isdir(d)]
+        extracted = all(os.path.isfile(os.path.join(d, "time_and_enrichment.tab")) for d in built)
+        agg = Aggregator(
+            ["."], self.output_dir, jobs=self.jobs, serial=self.serial,
+            verbose=self.verbose, bootstrap=0,
+            scores="extract" if extracted else "outdock",
+            sphere_files={None : os.path.join(self.prepare_options["meta_dir"], "dockfiles", "matching_spheres.sph")}
+            )
+        if not agg.run():
+            sys.exit("ERROR : failed to aggregate the sweep results")
+        return run_means(load_timescores(
+            os.path.join(self.output_dir, "merged_time_and_enrichment.tab")
+            ))
+
+    def score(self, frame, k, seeds):
+        names = set(run_dir(k, n) for n in range(seeds))
+        runs = frame[(frame.k == k) & frame.cluster_id.isin(names)]
+        pc_enrich = runs.pc_enrich.mean()
+        speedup = runs.speedup.mean()
+        return pc_enrich, speedup, pc_enrich + self.speedup_weight * np.log2(speedup)
+
+    def start(self):
+        seeds = self.search.seeds(0)
+        rows = [
+            {"round" : 0, "k" : k, "seeds" : seeds, "pc_enrich" : "nan",
+             "speedup" : "nan", "score" : "nan", "status" : "pending"}
+            for k in self.search.k_list
+            ]
+        self.prepare(self.round_runs(rows), build_store=True)
+        self.write_state(rows)
+        print("Round 0 : {} runs of k {} prepared".format(len(self.round_runs(rows)), self.search.k_list))
+
+    def step(self):
+        """
+        advances the search by one round, returns True once it is done
+        """
+        rows = self.read_state()
+        if not rows:
+            self.start()
+            return False
+
+        round_idx = max(int(r["round"]) for r in rows)
+        current = [r for r in rows if int(r["round"]) == round_idx]
+        if any(r["status"] == "best" for r in current):
+            return True
+
+        runs = self.round_runs(current)
+        missing = [
+            run_dir(k, n) for k, n in runs
+            if os.path.isdir(run_dir(k, n)) and not has_results(run_dir(k, n))
+            ]
+        if missing:
+            print("Round {} : waiting for {} of {} runs".format(round_idx, len(missing), len(runs)))
+            return False
+
+        frame = self.collect()
+        scores = {}
+        for r in current:
+            r["pc_enrich"], r["speedup"], r["score"] = self.score(frame, int(r["k"]), int(r["seeds"]))
+            scores[int(r["k"])] = r["score"]
+
+        previous = [float(r["score"]) for r in rows if int(r["round"]) == round_idx - 1]
+        best_score = np.nanmax(list(scores.values()))
+        kept = self.search.keep(scores)
+        seeds = self.search.seeds(round_idx + 1)
+        plateau = self.plateau is not None and previous and \
+            abs(best_score - np.nanmax(previous)) < self.plateau
+        done = len(kept) == 1 or seeds == int(current[0]["seeds"]) or plateau
+
+        if done:
+            best = self.search.rank(scores)[0]
+            for r in current:
+                r["status"] = "best" if int(r["k"]) == best else "dropped"
+            self.write_state(rows)
+            r = [r for r in current if int(r["k"]) == best][0]
+            print("Best k : {} (LogAUC change {:.4f}, speedup {:.2f}, {} seeds){}".format(
+                best, r["pc_enrich"], r["speedup"], r["seeds"],
+                " : score plateau" if plateau else ""
+                ))
+            return True
+
+        new_rows = []
+        new_runs = []
+        for r in current:
+            k = int(r["k"])
+            r["status"] = "kept" if k in kept else "dropped"
+            if k in kept:
+                new_rows.append({
+                    "round" : round_idx + 1, "k" : k, "seeds" : seeds, "pc_enrich" : "nan",
+                    "speedup" : "nan", "score" : "nan", "status" : "pending"
+                    })
+                new_runs += [(k, n) for n in range(int(r["seeds"]), seeds)]
+
+        self.prepare(new_runs)
+        self.write_state(rows + new_rows)
+        print("Round {} : kept k {} of {}, {} new runs prepared".format(
+            round_idx + 1, kept, sorted(scores), len(new_runs)
+            ))
+        return False
+
+    def run(self):
+        """
+        one step, or the whole search when results are simulated
+        """
+        if self.scorer is None:
+            return self.step()
+        while not self.step():
+            pass
+        return True
+
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-i", "--input", required=True, type=str,
+        help="Input meta directory to prepare for clustering"
+    )
+    p.add_argument(
+        "-k", "--num_clusters", nargs="+", required=True, type=int,
+        help="Candidate numbers of clusters (k1_0 is always built as the baseline)"
+    )
+    p.add_argument(
+        "-n", "--min_seeds", default=2, required=False, type=int,
+        help="Seeds of every k in the first round"
+    )
+    p.add_argument(
+        "-e", "--eta", default=2, required=False, type=int,
+        help="Seed growth and reduction factor between rounds"
+    )
+    p.add_argument(
+        "--max_seeds", default=16, required=False, type=int,
+        help="Largest number of seeds of a k"
+    )
+    p.add_argument(
+        "-w", "--speedup_weight", default=0.1, required=False, type=float,
+        help="Weight of log2(speedup) added to the LogAUC change when ranking k"
+    )
+    p.add_argument(
+        "--plateau", default=0.02, required=False, type=float,
+        help="Stop when the best score changes less than this between rounds (negative to disable)"
+    )
+    p.add_argument(
+        "-o", "--output", default="adaptive", required=False, type=str,
+        help="Output directory of the aggregated round results"
+    )
+    p.add_argument(
+        "--simulate", action='store_true', required=False,
+        help="write simulated results for every prepared run and run the whole search locally"
+    )
+    p.add_argument(
+        "--simulate_best_k", default=6, required=False, type=int,
+        help="k with the best simulated LogAUC"
+    )
+    p.add_argument(
+        "-s", "--num_sdi", default=20, required=False, type=int,
+        help="Number of clusters to split sdi set into"
+    )
+    p.add_argument(
+        "-b", "--backend", default="kmeans", required=False, type=str,
+        choices=sorted(BACKENDS),
+        help="Spatial clustering backend"
+    )
+    p.add_argument(
+        "-l", "--layout", default="classic", required=False, type=str,
+        choices=["classic", "shared"],
+        help="Directory layout of the runs"
+    )
+    p.add_argument(
+        "-m", "--scale_match_goal", action="store_true", required=False,
+        help="scale match goal in INDOCK files to reflect 1/k matches"
+    )
+    p.add_argument(
+        "-p", "--param", nargs="+", required=False, type=str, metavar="KEY=VALUE",
+        help="INDOCK parameters to set in every run"
+    )
+    p.add_argument(
+        "-j", "--jobs", default=None, required=False, type=int,
+        help="Number of worker processes (default: all cores)"
+    )
+    p.add_argument(
+        "--serial", action='store_true', required=False,
+        help="prepare and aggregate in the main process (debugging)"
+    )
+    p.add_argument(
+        "-v", "--verbose", action='store_true', required=False,
+        help="increase verbosity"
+    )
+    args = p.parse_args()
+    try:
+        args.param = parse_overrides(args.param)
+    except ValueError as e:
+        p.error(str(e))
+    return args
+
+def main():
+    args = get_args()
+    if BACKENDS[args.backend].deterministic:
+        # every seed has the same partition, a single round ranks the k values
+        args.min_seeds = args.max_seeds = 1
+    sweep = AdaptiveSweep(
+        search = SuccessiveHalving(args.num_clusters, args.min_seeds, args.eta, args.max_seeds),
+        prepare_options = {
+            "meta_dir" : args.input,
+            "num_sdi_clusters" : args.num_sdi,
+            "backend" : args.backend,
+            "layout" : args.layout,
+            "scale_match_goal" : args.scale_match_goal,
+            "indock_params" : args.param
+        },
+        output_dir = args.output,
+        speedup_weight = args.speedup_weight,
+        plateau = args.plateau if args.plateau >= 0 else None,
+        scorer = SimulatedScorer(best_k=args.simulate_best_k) if args.simulate else None,
+        jobs = args.jobs,
+        serial = args.serial,
+        verbose = args.verbose
+    )
+    sweep.run()
+
+if __name__ == '__main__':
+    main()
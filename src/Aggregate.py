@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import argparse
+import hashlib
+import sys
+import re
+import os
+
+from Scheduler import Scheduler, TaskErrors, TaskFailure, describe, write_failures, log_failures
+from Outdock import subcluster_outdocks
+from Enrichment import directory_run, score_runs, bootstrap_runs
+from Cooccurrence import CoocWriter
+from SphereFile import SphereSet
+from SphereUsage import SphereIndex, accumulate, parse_sphere_files
+
+re_run = re.compile(r"^k[0-9]+_[0-9]+$")
+
+TIME_FIELDS = [
+    "subcluster", "time", "auc", "log_auc", "outdock_auc", "outdock_log_auc",
+    "auc_lo", "auc_hi", "log_auc_lo", "log_auc_hi", "score_source"
+    ]
+
+# scoring used for the auc / log_auc columns
+SCORE_SOURCES = ["extract", "outdock"]
+
+# bumped when the content of the part files changes
+PART_VERSION = 4
+
+def read_table(fn):
+    """
+    tab separated file as (header, rows of string fields)
+    """
+    with open(fn, "r") as f:
+        header = next(f).rstrip("\n").split("\t")
+        rows = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+    return header, rows
+
+def read_runs(sweep_dir):
+    """
+    run directory names of a sweep, from the build manifest or the dirlist
+    """
+    manifest_fn = os.path.join(sweep_dir, "build_manifest.tab")
+    if os.path.isfile(manifest_fn):
+        _, rows = read_table(manifest_fn)
+        return sorted(r[0] for r in rows)
+
+    runs = set()
+    with open(os.path.join(sweep_dir, "dirlist"), "r") as f:
+        for line in f:
+            parts = line.strip().split("/")
+            parts = [p for p in parts if p not in ("", ".")]
+            if parts and re_run.match(parts[0]):
+                runs.add(parts[0])
+    return sorted(runs)
+
+def read_aliases(sweep_dir):
+    """
+    (alias dir_name, run_dir) pairs of a deduplicated sweep
+    """
+    fn = os.path.join(sweep_dir, "seed_aliases.tab")
+    if not os.path.isfile(fn):
+        return []
+    header, rows = read_table(fn)
+    d_idx, r_idx = header.index("dir_name"), header.index("run_dir")
+    return [(r[d_idx], r[r_idx]) for r in rows if r[d_idx] != r[r_idx]]
+
+def find_sweeps(root):
+    """
+    directories below root holding a sweep (a build manifest or a
+    dirlist), run directories themselves are not searched
+    """
+    sweeps = []
+    for path, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not re_run.match(d) and not d.startswith("."))
+        if "build_manifest.tab" in files or (
+                "dirlist" in files and not re_run.match(os.path.basename(path))
+                ):
+            sweeps.append(path)
+    return sweeps
+
+def layout_keys(sweep_dir, receptor=None, match_type=None):
+    """
+    receptor and match type from a receptor/match_type/k{k}_{n} layout
+    """
+    path = os.path.abspath(sweep_dir)
+    return (
+        receptor or os.path.basename(os.path.dirname(path)),
+        match_type or os.path.basename(path)
+        )
+
+def signature(fns):
+    """
+    size and modification time of the inputs of a directory
+    """
+    parts = []
+    for fn in fns:
+        if os.path.isfile(fn):
+            st = os.stat(fn)
+            parts.append("{}:{}:{}".format(os.path.basename(fn), st.st_size, st.st_mtime_ns))
+    return ";".join(parts)
+
+class Aggregator:
+    """
+    Collects the per directory outputs of Extract.jl (time_and_enrichment.tab,
+    coords.tab) of whole sweeps into the tables read by Performance.py
+
+    When the OUTDOCKs and ligand / decoy names of a directory are present,
+    its AUC and LogAUC are also scored from them (outdock_auc,
+    outdock_log_auc) with bootstrap intervals. The auc / log_auc columns
+    hold the Extract.jl values, or the OUTDOCK values of every directory
+    with scores="outdock", so a sweep is never compared on mixed scorings.
+
+    Hit pose coordinates of coords.tab are matched to the rows of the
+    receptor matching_spheres.sph (sphere_files, receptor -> path with
+    None for every receptor), which number the spheres (ms_id) of the
+    usage table and co-occurrence matrices of all runs of the receptor.
+
+    Run directories are reduced in batches by the workers to small part
+    files (subcluster timings, usage counts and co-occurrence of its hit
+    spheres) kept in {output}/.aggregate, the OUTDOCK scores of a batch
+    are resampled together. Parts of directories whose inputs are
+    unchanged since the last aggregation are reused, the final tables are
+    then streamed from the parts one directory at a time.
+    """
+
+    manifest_fn = "aggregate_manifest.tab"
+
+    # run directories per task
+    batch_size = 16
+
+    def __init__(self, roots, output_dir, receptor=None, match_type=None, jobs=None, serial=False, verbose=False, bootstrap=200, alpha=0.05, cooc_format="npy", scores="extract", sphere_files=None, tol=0.01):
+        self.roots = roots
+        self.output_dir = output_dir
+        self.receptor = receptor
+        self.match_type = match_type
+        self.jobs = jobs
+        self.serial = serial
+        self.verbose = verbose
+        self.bootstrap = bootstrap
+        self.alpha = alpha
+        self.cooc_format = cooc_format
+        self.scores = scores
+        self.sphere_files = sphere_files or {}
+        self.tol = tol
+        self.cache_dir = os.path.join(output_dir, ".aggregate")
+
+        # (receptor, match_type, cluster_id) -> run directory holding its results
+        self.keys = {}
+        self.receptors = {}
+
+        # receptor -> (SphereSet, SphereIndex), loaded on first use
+        self.spheres = {}
+
+    def discover(self):
+        for root in self.roots:
+            for sweep in find_sweeps(root):
+                receptor, match_type = layout_keys(sweep, self.receptor, self.match_type)
+                for run in read_runs(sweep):
+                    run_dir = os.path.join(sweep, run)
+                    if os.path.isdir(run_dir):
+                        self.keys[(receptor, match_type, run)] = run_dir
+                        self.receptors[run_dir] = receptor
+                for alias, run in read_aliases(sweep):
+                    run_dir = os.path.join(sweep, run)
+                    if os.path.isdir(run_dir):
+                        self.keys[(receptor, match_type, alias)] = run_dir
+        return self.keys
+
+    def inputs(self, run_dir):
+        return [
+            os.path.join(run_dir, "time_and_enrichment.tab"),
+            os.path.join(run_dir, "coords.tab"),
+            os.path.join(run_dir, "ligands.names"),
+            os.path.join(run_dir, "decoys.names")
+            ] + subcluster_outdocks(run_dir)
+
+    def signature(self, run_dir):
+        """
+        inputs and the scoring settings their part was built with
+        """
+        sphere_fn = self.sphere_fn(self.receptors.get(run_dir))
+        return "v{};s{};b{}:{};t{};{}".format(
+            PART_VERSION, self.scores, self.bootstrap, self.alpha, self.tol,
+            signature(self.inputs(run_dir) + ([sphere_fn] if sphere_fn else []))
+            )
+
+    def sphere_fn(self, receptor):
+        return self.sphere_files.get(receptor, self.sphere_files.get(None))
+
+    def sphere_index(self, receptor):
+        """
+        matching spheres of a receptor and their KD-tree, None without a
+        sphere file
+        """
+        if receptor not in self.spheres:
+            fn = self.sphere_fn(receptor)
+            if fn is None:
+                self.spheres[receptor] = None
+            else:
+                spheres = SphereSet.from_file(fn)
+                self.spheres[receptor] = (spheres, SphereIndex(spheres.coords, self.tol))
+        return self.spheres[receptor]
+
+    def part_fn(self, run_dir):
+        h = hashlib.sha1(os.path.abspath(run_dir).encode()).hexdigest()
+        return os.path.join(self.cache_dir, "{}.npz".format(h))
+
+    def read_manifest(self):
+        fn = os.path.join(self.cache_dir, self.manifest_fn)
+        if not os.path.isfile(fn):
+            return {}
+        _, rows = read_table(fn)
+        return {r[0] : r[1] for r in rows}
+
+    def write_manifest(self, signatures):
+        fn = os.path.join(self.cache_dir, self.manifest_fn)
+        with open(fn + ".tmp", "w+") as f:
+            f.write("run_dir\tsignature\n")
+            for run_dir in sorted(signatures):
+                f.write("{}\t{}\n".format(run_dir, signatures[run_dir]))
+        os.replace(fn + ".tmp", fn)
+
+    def has_outdocks(self, run_dir):
+        return (
+            os.path.isfile(os.path.join(run_dir, "ligands.names")) and
+            os.path.isfile(os.path.join(run_dir, "decoys.names")) and
+            len(subcluster_outdocks(run_dir)) > 0
+            )
+
+    def enrichment(self, run_dirs):
+        """
+        subcluster timings and percent AUC / LogAUC with their bootstrap
+        intervals from the OUTDOCKs of run directories, all scored and
+        resampled together
+
+        returns ({run_dir : (times, values)}, {run_dir : error})
+        """
+        errors = {}
+        results = {}
+        for run_dir in run_dirs:
+            try:
+                results[run_dir] = directory_run(run_dir)
+            except (Exception, SystemExit) as e:
+                errors[run_dir] = describe(e)
+
+        scored = [d for d in run_dirs if d in results]
+        runs = [results[d][1] for d in scored]
+        try:
+            auc, log_auc = score_runs(runs)
+            ci = bootstrap_runs(runs, num_boot=self.bootstrap, alpha=self.alpha)
+        except (Exception, SystemExit) as e:
+            errors.update({d : describe(e) for d in scored})
+            return {}, errors
+
+        values = [auc, log_auc, ci["auc_lo"], ci["auc_hi"], ci["log_auc_lo"], ci["log_auc_hi"]]
+        return {
+            d : (
+                sorted(results[d][0], key=lambda t : t[2]),
+                ["{:.4f}".format(v[i] * 100) for v in values]
+                )
+            for i, d in enumerate(scored)
+        }, errors
+
+    def process_batch(self, run_dirs):
+        """
+        reduces a batch of run directories to their part files
+        """
+        scored, errors = self.enrichment([d for d in run_dirs if self.has_outdocks(d)])
+        for run_dir in run_dirs:
+            if run_dir in errors:
+                continue
+            try:
+                self.process(run_dir, scored.get(run_dir))
+            except (Exception, SystemExit) as e:
+                errors[run_dir] = describe(e)
+        if errors:
+            raise TaskErrors(errors)
+
+    def process(self, run_dir, outdock=None):
+        """
+        reduces one run directory to its part file, outdock holds the
+        (times, values) of its OUTDOCKs when they were scored
+        """
+        time_fn, coords_fn = self.inputs(run_dir)[:2]
+
+        has_times = os.path.isfile(time_fn)
+        if self.scores == "outdock" and outdock is None:
+            raise FileNotFoundError(
+                "no subcluster*/OUTDOCK, ligands.names and decoys.names in {} (needed with --scores outdock)".format(run_dir)
+                )
+        if self.scores == "extract" and not has_times:
+            raise FileNotFoundError(
+                "missing {} (run Extract.jl first, or score the OUTDOCKs with --scores outdock)".format(time_fn)
+                )
+
+        # AUC, LogAUC and intervals of the OUTDOCKs (unlabelled molecules
+        # left out), Extract.jl counts them as decoys and has no interval
+        scores = outdock[1] if outdock is not None else ["nan"] * 6
+
+        # subcluster, time, AUC, LogAUC : subcluster is the last path element
+        times = []
+        if has_times:
+            with open(time_fn, "r") as f:
+                for line in f:
+                    values = line.split()
+                    if len(values) < 4:
+                        continue
+                    point = scores[:2] if self.scores == "outdock" else values[-2:]
+                    times.append((
+                        values[0].rstrip("/").split("/")[-1], values[-3],
+                        *point, *scores, self.scores
+                        ))
+        else:
+            times = [
+                (sub_idx, "{}".format(elapsed), *scores[:2], *scores, self.scores)
+                for _, sub_idx, elapsed in outdock[0]
+                ]
+
+        # usage and co-occurrence of the spheres the hits used
+        used = np.zeros(0, dtype=np.int64)
+        usage = np.zeros((0, 3), dtype=np.int64)
+        cooc = np.zeros((0, 0), dtype=np.int64)
+        spheres = self.sphere_index(self.receptors.get(run_dir))
+        if spheres is not None and os.path.isfile(coords_fn):
+            acc = accumulate(coords_fn, spheres[1])
+            if acc.unmatched and self.verbose:
+                print("WARNING : {} sphere coordinates of {} match no sphere".format(acc.unmatched, coords_fn))
+            used = np.flatnonzero(acc.usage[:, 0])
+            usage = acc.usage[used]
+            cooc = acc.cooc[np.ix_(used, used)]
+
+        tmp_fn = self.part_fn(run_dir) + ".tmp.npz"
+        np.savez(
+            tmp_fn,
+            times = np.array(times, dtype=str).reshape(-1, len(TIME_FIELDS)),
+            spheres = used, usage = usage, cooc = cooc
+            )
+        os.replace(tmp_fn, self.part_fn(run_dir))
+
+    def update_parts(self):
+        """
+        processes every directory whose inputs changed, returns failures
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        previous = self.read_manifest()
+
+        run_dirs = sorted(set(self.keys.values()))
+        signatures = {d : self.signature(d) for d in run_dirs}
+        todo = [
+            d for d in run_dirs
+            if previous.get(d) != signatures[d] or not os.path.isfile(self.part_fn(d))
+            ]
+        if self.verbose:
+            print("Aggregate : {} directories, {} to process".format(len(run_dirs), len(todo)))
+
+        scheduler = Scheduler(jobs=self.jobs, serial=self.serial)
+        size = max(1, min(self.batch_size, -(-len(todo) // scheduler.num_workers(len(todo)))))
+        batches = [tuple(todo[i:i + size]) for i in range(0, len(todo), size)]
+        failures = scheduler.run(self, "process_batch", [(b,) for b in batches], keys=batches)
+
+        # a batch that failed as a whole (e.g. its worker died) fails each directory
+        failures = [
+            TaskFailure(d, t.error, t.traceback) for t in failures
+            for d in (t.key if isinstance(t.key, tuple) else [t.key])
+            ]
+        failed = set(t.key for t in failures)
+        self.write_manifest({
+            d : s for d, s in signatures.items()
+            if d not in failed and (d in todo or d in previous)
+            })
+        return failures
+
+    def load_part(self, run_dir):
+        with np.load(self.part_fn(run_dir)) as part:
+            return {name : part[name] for name in part.files}
+
+    def write_tables(self, failed=()):
+        keys = sorted(k for k, d in self.keys.items() if d not in failed and os.path.isfile(self.part_fn(d)))
+        sizes = {}
+        for key in keys:
+            spheres = self.sphere_index(key[0])
+            sizes[key[0]] = len(spheres[0]) if spheres is not None else 0
+        max_spheres = max(list(sizes.values()) + [0])
+
+        time_fn = os.path.join(self.output_dir, "merged_time_and_enrichment.tab")
+        usage_fn = os.path.join(self.output_dir, "sphere_usage.tab")
+        cooc_prefix = os.path.join(self.output_dir, "co-occurrence")
+
+        f_cooc = None
+        writer = None
+        if self.cooc_format == "tab":
+            f_cooc = open(cooc_prefix + ".tab", "w+")
+            f_cooc.write("\t".join(
+                ["receptor", "match_type", "cluster_id"] +
+                ["sph.{}".format(i) for i in range(1, max_spheres + 1)]
+                ) + "\n")
+        else:
+            writer = CoocWriter(cooc_prefix, [sizes[key[0]] for key in keys])
+
+        with open(time_fn, "w+") as f_time, open(usage_fn, "w+") as f_usage:
+            f_time.write("\t".join(["receptor", "match_type", "cluster_id"] + TIME_FIELDS) + "\n")
+            f_usage.write(
+                "receptor\tmatch_type\tcluster_id\tx\ty\tz\tms_id\tUsage\tLigand_Usage\tDecoy_Usage\n"
+                )
+
+            for key in keys:
+                part = self.load_part(self.keys[key])
+                prefix = "\t".join(key)
+
+                f_time.writelines(
+                    "{}\t{}\n".format(prefix, "\t".join(row)) for row in part["times"]
+                    )
+
+                # ms_id is the 1 based row of the receptor sphere file
+                used = part["spheres"]
+                if used.size > 0:
+                    coords = self.sphere_index(key[0])[0].coords
+                    f_usage.writelines(
+                        "{}\t{:.5f}\t{:.5f}\t{:.5f}\t{}\t{}\t{}\t{}\n".format(prefix, *coords[i], i + 1, *u)
+                        for i, u in zip(used, part["usage"])
+                        )
+
+                # receptor wide matrix
+                n = sizes[key[0]]
+                mat = np.zeros((n, n), dtype=np.int64)
+                if used.size > 0:
+                    mat[np.ix_(used, used)] = part["cooc"]
+
+                if writer is not None:
+                    writer.add(key, mat)
+                    continue
+
+                # wide table rows are padded to the widest receptor
+                pad = "\t" * (max_spheres - n)
+                f_cooc.writelines(
+                    "{}\t{}{}\n".format(prefix, "\t".join(map(str, row)), pad) for row in mat
+                    )
+
+        if writer is not None:
+            writer.close()
+        else:
+            f_cooc.close()
+
+        return len(keys)
+
+    def run(self):
+        self.discover()
+        for receptor in sorted(set(k[0] for k in self.keys)):
+            if self.sphere_fn(receptor) is None:
+                print("WARNING : no matching_spheres.sph given for {} (-s), its sphere usage and co-occurrence are not written".format(receptor))
+        failures = self.update_parts()
+        num_keys = self.write_tables(failed=set(t.key for t in failures))
+        if self.verbose:
+            print("Aggregate : wrote {} runs to {}".format(num_keys, self.output_dir))
+
+        fail_fn = os.path.join(self.output_dir, "aggregate_failures.tab")
+        if os.path.isfile(fail_fn):
+            os.remove(fail_fn)
+        if failures:
+            write_failures(fail_fn, failures)
+            log_failures(failures, verbose=self.verbose)
+            return False
+        return True
+
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-i", "--input", nargs="+", required=True, type=str,
+        help="Experiment directories (searched for receptor/match_type/k*_* sweeps)"
+    )
+    p.add_argument(
+        "-o", "--output", default="../data", required=False, type=str,
+        help="Output directory for the merged tables"
+    )
+    p.add_argument(
+        "-r", "--receptor", default=None, required=False, type=str,
+        help="Receptor name for every sweep (default: from the layout)"
+    )
+    p.add_argument(
+        "-t", "--match_type", default=None, required=False, type=str,
+        help="Match type for every sweep (default: from the layout)"
+    )
+    p.add_argument(
+        "-j", "--jobs", default=None, required=False, type=int,
+        help="Number of worker processes (default: all cores)"
+    )
+    p.add_argument(
+        "-b", "--bootstrap", default=200, required=False, type=int,
+        help="Bootstrap resamples for the AUC / LogAUC confidence intervals, needs the OUTDOCKs (0 to skip)"
+    )
+    p.add_argument(
+        "-a", "--alpha", default=0.05, required=False, type=float,
+        help="Confidence intervals cover 1 - alpha"
+    )
+    p.add_argument(
+        "-c", "--cooc_format", default="npy", required=False, type=str,
+        choices=["npy", "tab"],
+        help="co-occurrence.npy with an index table, or the wide co-occurrence.tab"
+    )
+    p.add_argument(
+        "-s", "--spheres", nargs="+", default=[], required=False, type=str,
+        help="matching_spheres.sph numbering the spheres of the usage tables : one file for every receptor, or RECEPTOR=path for each receptor"
+    )
+    p.add_argument(
+        "--tol", default=0.01, required=False, type=float,
+        help="Largest distance (angstroms) between a pose sphere coordinate and its sphere"
+    )
+    p.add_argument(
+        "--scores", default="extract", required=False, type=str,
+        choices=SCORE_SOURCES,
+        help="Scoring of the auc / log_auc columns : Extract.jl (time_and_enrichment.tab) or the OUTDOCKs, for every directory"
+    )
+    p.add_argument(
+        "--serial", action='store_true', required=False,
+        help="process directories in the main process (debugging)"
+    )
+    p.add_argument(
+        "-v", "--verbose", action='store_true', required=False,
+        help="increase verbosity"
+    )
+    args = p.parse_args()
+    return args
+
+def main():
+    args = get_args()
+    sphere_files = parse_sphere_files(args.spheres)
+    for fn in sphere_files.values():
+        if not os.path.isfile(fn):
+            sys.exit("ERROR : {} not found".format(fn))
+    os.makedirs(args.output, exist_ok=True)
+    agg = Aggregator(
+        roots = args.input,
+        output_dir = args.output,
+        receptor = args.receptor,
+        match_type = args.match_type,
+        jobs = args.jobs,
+        serial = args.serial,
+        verbose = args.verbose,
+        bootstrap = args.bootstrap,
+        alpha = args.alpha,
+        cooc_format = args.cooc_format,
+        scores = args.scores,
+        sphere_files = sphere_files,
+        tol = args.tol
+    )
+    if not agg.run():
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+
+def parse_k(cluster_ids):
+    """
+    k of every k{k}_{n} cluster id, parsed once per distinct id
+    """
+    codes, uniques = pd.factorize(cluster_ids)
+    k = pd.Series(uniques).str.extract(r"^k(\d+)_", expand=False).astype(np.int64)
+    return k.values[codes]
+
+def select_sign(frame, change='pc_enrich', value='log_auc', baseline='baseline_logAUC'):
+    """
+    percent change signed by the direction of the LogAUC change
+    """
+    magnitude = np.abs(frame[change])
+    return np.where(frame[baseline] < frame[value], magnitude, -magnitude)
+
+def percent_change(frame, change, value, baseline='baseline_logAUC'):
+    frame[change] = (frame[value] - frame[baseline]) / np.abs(frame[baseline])
+    frame[change] = select_sign(frame, change, value, baseline)
+
+def calculate_enrichment(frame):
+    percent_change(frame, 'pc_enrich', 'log_auc')
+
+    # bootstrap intervals of the OUTDOCK LogAUC (Aggregate.py) bound the
+    # change of the OUTDOCK LogAUC over the OUTDOCK baseline, a change is
+    # significant when its interval excludes the baseline
+    if 'outdock_log_auc' in frame.columns and 'baseline_outdock_logAUC' in frame.columns:
+        for change, value in [
+                ('pc_enrich_outdock', 'outdock_log_auc'),
+                ('pc_enrich_lo', 'log_auc_lo'),
+                ('pc_enrich_hi', 'log_auc_hi')
+                ]:
+            percent_change(frame, change, value, 'baseline_outdock_logAUC')
+            frame[change] = frame[change].where(frame[value].notna())
+        frame['significant'] = (frame.pc_enrich_lo > 0) | (frame.pc_enrich_hi < 0)
+
+    return frame
+
+def calculate_speedup(frame):
+    frame['speedup'] = frame.baseline_time / frame.time
+    return frame
+
+def generate_baseline(frame):
+    stats = dict(
+        baseline_AUC = ('auc', 'mean'),
+        baseline_logAUC = ('log_auc', 'mean'),
+        baseline_time = ('time', 'mean')
+    )
+    if 'outdock_log_auc' in frame.columns:
+        stats['baseline_outdock_logAUC'] = ('outdock_log_auc', 'mean')
+    return frame[frame.k == 1].\
+        groupby(['receptor', 'match_type']).\
+        agg(**stats).\
+        reset_index()
+
+def aggregate_scores(frame):
+    """
+    mean and max enrichment / speedup of every (receptor, k, match_type)
+    in long format for the aggregate box plots
+    """
+    return frame.\
+        groupby(['receptor', 'k', 'match_type']).\
+        agg(
+            AggEnrichMean = ('pc_enrich', 'mean'),
+            AggEnrichMax = ('pc_enrich', 'max'),
+            AggSpeedupMean = ('speedup', 'mean'),
+            AggSpeedupMax = ('speedup', 'max')
+        ).\
+        reset_index().\
+        melt(id_vars = ['k', 'receptor', 'match_type'])
+
+def run_means(frame):
+    """
+    mean enrichment and speedup of every run (over its subclusters),
+    with the enrichment interval bounds when available
+    """
+    stats = dict(
+        pc_enrich = ('pc_enrich', 'mean'),
+        speedup = ('speedup', 'mean')
+    )
+    if 'pc_enrich_lo' in frame.columns:
+        stats['pc_enrich_outdock'] = ('pc_enrich_outdock', 'mean')
+        stats['pc_enrich_lo'] = ('pc_enrich_lo', 'mean')
+        stats['pc_enrich_hi'] = ('pc_enrich_hi', 'mean')
+    return frame.\
+        groupby(['receptor', 'match_type', 'cluster_id', 'k']).\
+        agg(**stats).\
+        reset_index()
+
+def prepare_timescores(time_scores):
+    """
+    k, baseline statistics, enrichment and speedup of a time/score table
+    """
+    # Define K from cluster_id
+    time_scores['k'] = parse_k(time_scores.cluster_id)
+
+    # build baseline statistics frame
+    baseline_frame = generate_baseline(time_scores)
+
+    # merge time/scores with baseline
+    time_scores = time_scores.merge(baseline_frame)
+
+    # calculate logAUC enrichment
+    time_scores = calculate_enrichment(time_scores)
+
+    # calculate speedup
+    time_scores = calculate_speedup(time_scores)
+
+    return time_scores
+
+def load_timescores(fn):
+    return prepare_timescores(pd.read_csv(fn, sep="\t"))
+
+def prepare_msframe(ms_frame):
+    ms_frame['ms_id'] = "sph." + ms_frame.ms_id.astype(str)
+    return ms_frame
+
+def load_msframe(fn):
+    return prepare_msframe(pd.read_csv(fn, sep="\t"))
+
+def load_cooccurrence(fn):
+    return pd.read_csv(fn, sep="\t")
+
+def box_stats(frame, by, value, whisker=1.5):
+    """
+    box plot statistics of value for every group of the by columns
+
+    returns (boxes, outliers) : boxes has one row per group with its
+    count, mean, quartiles and Tukey whisker ends (the most extreme values
+    within whisker * IQR of the quartiles), outliers the rows beyond them
+    """
+    data = frame[by + [value]].dropna(subset=[value]).reset_index(drop=True)
+    grouped = data.groupby(by, sort=True)[value]
+    codes = grouped.ngroup().values
+
+    boxes = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    boxes.columns = ['q1', 'median', 'q3']
+    boxes['count'] = grouped.size()
+    boxes['mean'] = grouped.mean()
+
+    iqr = (boxes.q3 - boxes.q1).values
+    low = boxes.q1.values - whisker * iqr
+    high = boxes.q3.values + whisker * iqr
+    values = data[value].values
+    inside = (values >= low[codes]) & (values <= high[codes])
+
+    within = pd.Series(np.where(inside, values, np.nan))
+    boxes['lowerfence'] = within.groupby(codes).min().values
+    boxes['upperfence'] = within.groupby(codes).max().values
+
+    return boxes.reset_index(), data[~inside]
+
+def sample_rows(frame, max_rows, seed=0):
+    """
+    at most max_rows rows of a frame, sampled without replacement
+    """
+    if frame.shape[0] <= max_rows:
+        return frame
+    return frame.sample(n=max_rows, random_state=seed).sort_index()
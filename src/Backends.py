@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import time
+
+from scipy.cluster.hierarchy import linkage, cut_tree
+from sklearn.cluster import MiniBatchKMeans, DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+from BatchKMeans import BatchKMeans
+
+class Backend:
+    """
+    Base spatial clustering backend :
+        fit returns labels for every (k, seed) pair and records
+        the wall time spent on each step in self.timing,
+        deterministic backends give every seed the same labels
+    """
+
+    name = None
+    deterministic = False
+
+    def __init__(self):
+        self.timing = []
+
+    def record(self, k, num_seeds, seconds, labels):
+        self.timing.append({
+            "backend" : self.name,
+            "k" : k,
+            "num_seeds" : num_seeds,
+            "seconds" : seconds,
+            "n_clusters" : len(np.unique(labels)) if labels is not None else "-"
+        })
+
+    def fit_k(self, X, k, seeds):
+        raise NotImplementedError
+
+    def fit(self, X, k_list, seeds):
+        seeds = list(seeds)
+        labels = {}
+        for k in k_list:
+            start = time.perf_counter()
+            k_labels = self.fit_k(X, k, seeds)
+            self.record(k, len(seeds), time.perf_counter() - start, k_labels[0])
+            for seed, l in zip(seeds, k_labels):
+                labels[(k, seed)] = l
+        return labels
+
+class KMeansBackend(Backend):
+    """
+    full k-means, every seed of a k batched (identical to sklearn KMeans)
+    """
+
+    name = "kmeans"
+
+    def fit_k(self, X, k, seeds):
+        return BatchKMeans(k, seeds).fit_predict(X)
+
+class MiniBatchBackend(Backend):
+    """
+    sklearn MiniBatchKMeans per seed, for large sphere sets
+    """
+
+    name = "minibatch"
+
+    def __init__(self, batch_size=1024):
+        super().__init__()
+        self.batch_size = batch_size
+
+    def fit_k(self, X, k, seeds):
+        return np.array([
+            MiniBatchKMeans(
+                n_clusters=k, random_state=seed, batch_size=self.batch_size
+                ).fit_predict(X)
+            for seed in seeds
+            ])
+
+class WardBackend(Backend):
+    """
+    single Ward linkage tree cut at every requested k, seeds
+    all share the same partition
+    """
+
+    name = "ward"
+    deterministic = True
+
+    def fit(self, X, k_list, seeds):
+        seeds = list(seeds)
+
+        start = time.perf_counter()
+        tree = linkage(X, method="ward")
+        self.record("tree", len(seeds), time.perf_counter() - start, None)
+
+        # one pass over the tree for every k
+        start = time.perf_counter()
+        cuts = cut_tree(tree, n_clusters=list(k_list))
+        self.record("cut", len(seeds), time.perf_counter() - start, None)
+
+        labels = {}
+        for idx, k in enumerate(k_list):
+            for seed in seeds:
+                labels[(k, seed)] = cuts[:, idx]
+        return labels
+
+class DBSCANBackend(Backend):
+    """
+    density based : one DBSCAN sweep over a geometric eps grid shared by
+    every k, each k takes the partition with the closest cluster count
+    and noise spheres are attached to their nearest clustered sphere
+    """
+
+    name = "dbscan"
+    deterministic = True
+
+    def __init__(self, min_samples=3, num_steps=40):
+        super().__init__()
+        self.min_samples = min_samples
+        self.num_steps = num_steps
+
+    def attach_noise(self, X, labels):
+        noise = labels == -1
+        if np.all(noise):
+            return np.zeros_like(labels)
+        if np.any(noise):
+            nn = NearestNeighbors(n_neighbors=1).fit(X[~noise])
+            _, idx = nn.kneighbors(X[noise])
+            labels = labels.copy()
+            labels[noise] = labels[~noise][idx.ravel()]
+        return labels
+
+    def sweep(self, X):
+        """
+        partitions from the nearest neighbour spacing to the full extent
+        """
+        dist, _ = NearestNeighbors(n_neighbors=2).fit(X).kneighbors(X)
+        lo = max(dist[:, 1].min(), 1e-6)
+        hi = max(np.linalg.norm(X.max(axis=0) - X.min(axis=0)), lo * 2)
+
+        partitions = []
+        for eps in np.geomspace(lo, hi, self.num_steps):
+            labels = DBSCAN(eps=eps, min_samples=self.min_samples).fit_predict(X)
+            partitions.append((labels.max() + 1, labels))
+        return partitions
+
+    def fit(self, X, k_list, seeds):
+        seeds = list(seeds)
+
+        start = time.perf_counter()
+        partitions = self.sweep(X)
+        self.record("sweep", len(seeds), time.perf_counter() - start, None)
+
+        labels = {}
+        for k in k_list:
+            start = time.perf_counter()
+            # closest cluster count, largest eps (least noise) on ties
+            idx = min(
+                range(len(partitions)),
+                key=lambda i : (abs(partitions[i][0] - k), -i)
+                )
+            k_labels = self.attach_noise(X, partitions[idx][1])
+            self.record(k, len(seeds), time.perf_counter() - start, k_labels)
+            for seed in seeds:
+                labels[(k, seed)] = k_labels
+        return labels
+
+class GridBackend(Backend):
+    """
+    spatial partitioner : repeatedly splits the largest cell at the median
+    of its widest axis until there are k cells
+    """
+
+    name = "grid"
+    deterministic = True
+
+    def fit_k(self, X, k, seeds):
+        cells = [np.arange(X.shape[0])]
+        while len(cells) < k:
+            c_idx = int(np.argmax([c.size for c in cells]))
+            cell = cells[c_idx]
+            if cell.size < 2:
+                break
+
+            coords = X[cell]
+            axis = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+            order = np.argsort(coords[:, axis], kind="stable")
+            half = cell.size // 2
+
+            cells[c_idx] = cell[order[:half]]
+            cells.insert(c_idx + 1, cell[order[half:]])
+
+        labels = np.zeros(X.shape[0], dtype=np.int32)
+        for idx, cell in enumerate(cells):
+            labels[cell] = idx
+        return np.array([labels for _ in seeds])
+
+BACKENDS = {
+    b.name : b for b in [
+        KMeansBackend, MiniBatchBackend, WardBackend, DBSCANBackend, GridBackend
+        ]
+}
+
+def write_timing(fn, timing):
+    with open(fn, "w+") as f:
+        f.write("backend\tk\tnum_seeds\tseconds\tn_clusters\n")
+        for t in timing:
+            f.write("{backend}\t{k}\t{num_seeds}\t{seconds:.6f}\t{n_clusters}\n".format(**t))
+
+def log_timing(timing):
+    print("Backend Timing :")
+    for t in timing:
+        print(
+            "\t{backend} k={k} seeds={num_seeds} : {seconds:.4f}s ({n_clusters} clusters)".\
+                format(**t)
+            )
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+from sklearn.cluster import KMeans, kmeans_plusplus
+
+def default_n_init():
+    """
+    number of initializations KMeans(n_clusters=k, random_state=seed)
+    runs with the installed sklearn and its default k-means++ init
+    """
+    n_init = KMeans().n_init
+    if n_init == "auto":
+        return 1
+    if n_init == "warn":
+        return 10
+    return n_init
+
+def same_clustering(labels1, labels2, k):
+    """
+    True if two labellings are identical up to a permutation
+    """
+    mapping = np.full(k, -1)
+    for l1, l2 in zip(labels1, labels2):
+        if mapping[l1] == -1:
+            mapping[l1] = l2
+        elif mapping[l1] != l2:
+            return False
+    return True
+
+class BatchKMeans:
+    """
+    Runs k-means for many seeds at once.
+
+    Every seed follows the same steps as KMeans(n_clusters=k, random_state=seed) :
+    k-means++ init from its own RandomState on the mean centered data, then
+    Lloyd iterations with the same strict/tolerance convergence rules. The
+    Lloyd iterations of all seeds are stacked so each step is one batched
+    distance computation. Seeds that hit an empty cluster are handed back
+    to sklearn, which relocates empty clusters.
+    """
+
+    def __init__(self, k, seeds, max_iter=300, tol=1e-4, n_init=None):
+        self.k = k
+        self.seeds = list(seeds)
+        self.max_iter = max_iter
+        self.tol = tol
+        self.n_init = default_n_init() if n_init is None else n_init
+
+        self.labels_ = np.array([])
+        self.inertia_ = np.array([])
+        self.cluster_centers_ = np.array([])
+        self.fallback_seeds = []
+
+    def init_centers(self, X, x_squared_norms):
+        """
+        k-means++ centers for every (seed, init) pair, drawn in the order
+        sklearn draws them from each seed's RandomState
+        """
+        centers = np.zeros((len(self.seeds), self.n_init, self.k, X.shape[1]))
+        for s_idx, seed in enumerate(self.seeds):
+            random_state = np.random.RandomState(seed)
+            for i_idx in range(self.n_init):
+                centers[s_idx, i_idx], _ = kmeans_plusplus(
+                    X, self.k, x_squared_norms=x_squared_norms,
+                    random_state=random_state
+                    )
+        return centers.reshape(-1, self.k, X.shape[1])
+
+    def assign(self, X, centers):
+        """
+        batched E-step : labels of shape (num_runs, num_points)
+        """
+        c_sq = (centers ** 2).sum(axis=2)
+        dist = c_sq[:, None, :] - 2 * np.matmul(X, centers.transpose(0, 2, 1))
+        return np.argmin(dist, axis=2).astype(np.int32)
+
+    def update(self, X, labels):
+        """
+        batched M-step : new centers and cluster sizes for every run
+        """
+        num_runs = labels.shape[0]
+        flat = (labels + self.k * np.arange(num_runs)[:, None]).ravel()
+        counts = np.bincount(flat, minlength=num_runs * self.k)
+
+        sums = np.zeros((num_runs * self.k, X.shape[1]))
+        tiled = np.tile(X, (num_runs, 1))
+        for d in range(X.shape[1]):
+            sums[:, d] = np.bincount(
+                flat, weights=tiled[:, d], minlength=num_runs * self.k
+                )
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centers = sums / counts[:, None]
+
+        return (
+            centers.reshape(num_runs, self.k, X.shape[1]),
+            counts.reshape(num_runs, self.k)
+            )
+
+    def lloyd(self, X, centers, tol):
+        """
+        Lloyd iterations for every run, returns labels, centers and a
+        mask of runs that produced an empty cluster
+        """
+        num_runs = centers.shape[0]
+        labels = np.full((num_runs, X.shape[0]), -1, dtype=np.int32)
+        strict = np.zeros(num_runs, dtype=bool)
+        empty = np.zeros(num_runs, dtype=bool)
+        active = np.arange(num_runs)
+
+        for _ in range(self.max_iter):
+            if active.size == 0:
+                break
+
+            labels_old = labels[active]
+            labels_new = self.assign(X, centers[active])
+            centers_new, counts = self.update(X, labels_new)
+
+            has_empty = np.any(counts == 0, axis=1)
+            empty[active[has_empty]] = True
+
+            shift = ((centers_new - centers[active]) ** 2).sum(axis=(1, 2))
+            labels[active] = labels_new
+            centers[active] = centers_new
+
+            converged_strict = np.all(labels_new == labels_old, axis=1)
+            converged_tol = shift <= tol
+            strict[active[converged_strict]] = True
+
+            done = converged_strict | converged_tol | has_empty
+            active = active[~done]
+
+        # rerun the E-step so labels match the final centers
+        rerun = np.flatnonzero(~strict & ~empty)
+        if rerun.size > 0:
+            labels[rerun] = self.assign(X, centers[rerun])
+
+        return labels, centers, empty
+
+    def inertia(self, X, labels, centers):
+        closest = np.take_along_axis(centers, labels[:, :, None], axis=1)
+        return ((X[None, :, :] - closest) ** 2).sum(axis=(1, 2))
+
+    def fit_predict(self, X):
+        """
+        returns labels of shape (num_seeds, num_points)
+        """
+        X_input = np.asarray(X, dtype=np.float64)
+        X_mean = X_input.mean(axis=0)
+        X = X_input - X_mean
+
+        tol = np.mean(np.var(X, axis=0)) * self.tol
+        x_squared_norms = np.einsum('ij,ij->i', X, X)
+
+        centers = self.init_centers(X, x_squared_norms)
+        labels, centers, empty = self.lloyd(X, centers, tol)
+        inertia = self.inertia(X, labels, centers)
+
+        # pick the best init per seed with the sklearn selection rule
+        shape = (len(self.seeds), self.n_init)
+        labels = labels.reshape(shape + labels.shape[1:])
+        centers = centers.reshape(shape + centers.shape[1:])
+        inertia = inertia.reshape(shape)
+        empty = empty.reshape(shape)
+
+        self.labels_ = np.zeros((len(self.seeds), X.shape[0]), dtype=np.int32)
+        self.inertia_ = np.zeros(len(self.seeds))
+        self.cluster_centers_ = np.zeros((len(self.seeds), self.k, X.shape[1]))
+        self.fallback_seeds = []
+
+        for s_idx, seed in enumerate(self.seeds):
+            if np.any(empty[s_idx]):
+                self.fallback(X_input, s_idx, seed)
+                continue
+
+            best = 0
+            for i_idx in range(1, self.n_init):
+                if inertia[s_idx, i_idx] < inertia[s_idx, best] and \
+                        not same_clustering(
+                            labels[s_idx, i_idx], labels[s_idx, best], self.k
+                            ):
+                    best = i_idx
+
+            self.labels_[s_idx] = labels[s_idx, best]
+            self.inertia_[s_idx] = inertia[s_idx, best]
+            self.cluster_centers_[s_idx] = centers[s_idx, best] + X_mean
+
+        return self.labels_
+
+    def fallback(self, X, s_idx, seed):
+        km = KMeans(
+            n_clusters=self.k, random_state=seed, n_init=self.n_init,
+            max_iter=self.max_iter, tol=self.tol
+            )
+        self.labels_[s_idx] = km.fit_predict(X)
+        self.inertia_[s_idx] = km.inertia_
+        self.cluster_centers_[s_idx] = km.cluster_centers_
+        self.fallback_seeds.append(seed)
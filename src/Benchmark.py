@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from benchmarks import sphere_file, clustering, cluster_spheres, outdock, enrichment, analysis, sphere_usage, mol2_index, hits, local_runner
+
+# modules in the order their subcommands are listed
+MODULES = [
+    sphere_file,
+    clustering,
+    cluster_spheres,
+    outdock,
+    enrichment,
+    analysis,
+    sphere_usage,
+    mol2_index,
+    hits,
+    local_runner,
+]
+
+def get_args():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="bench", required=True)
+    for module in MODULES:
+        module.add_parsers(sub)
+    args = p.parse_args()
+    return args
+
+def main():
+    args = get_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+from scipy.spatial import ConvexHull
+from scipy.spatial.distance import pdist, squareform
+from sklearn.metrics import silhouette_score
+
+METRIC_FIELDS = [
+    "k", "seed", "n_clusters", "min_size", "max_size", "size_cv",
+    "inertia", "silhouette", "min_centroid_dist", "max_diameter", "pruned"
+    ]
+
+def diameter(points):
+    """
+    largest pairwise distance of a point set, the farthest pair is
+    always on the convex hull
+    """
+    if points.shape[0] < 2:
+        return 0.0
+    if points.shape[0] > 16:
+        try:
+            points = points[ConvexHull(points).vertices]
+        except Exception:
+            pass
+    return pdist(points).max()
+
+class ClusterMetrics:
+    """
+    Quality and balance metrics of the partitions of one sphere set
+
+    The pairwise distance matrix of the spheres is computed once and
+    reused by every run when the set is small (silhouette and cluster
+    diameters are then exact lookups), larger sets use a sampled
+    silhouette and convex hull diameters.
+    """
+
+    def __init__(self, X, max_pairwise=4096, sample_size=4096):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.sample_size = sample_size
+        self.pairwise = None
+        if self.X.shape[0] <= max_pairwise:
+            self.pairwise = squareform(pdist(self.X))
+
+    def centroids(self, labels, sizes):
+        sums = np.zeros((sizes.size, self.X.shape[1]))
+        for d in range(self.X.shape[1]):
+            sums[:, d] = np.bincount(labels, weights=self.X[:, d], minlength=sizes.size)
+        return sums / np.maximum(sizes, 1)[:, None]
+
+    def silhouette(self, labels, n_clusters):
+        if n_clusters < 2 or n_clusters >= self.X.shape[0]:
+            return np.nan
+        if self.pairwise is not None:
+            return silhouette_score(self.pairwise, labels, metric="precomputed")
+        return silhouette_score(
+            self.X, labels, sample_size=self.sample_size, random_state=0
+            )
+
+    def max_diameter(self, labels, n_clusters):
+        if self.pairwise is not None:
+            same = labels[:, None] == labels[None, :]
+            return np.where(same, self.pairwise, 0).max()
+        return max(diameter(self.X[labels == i]) for i in range(n_clusters))
+
+    def compute(self, labels):
+        """
+        metrics of a contiguous labelling (0 .. n_clusters - 1)
+        """
+        labels = np.asarray(labels)
+        sizes = np.bincount(labels)
+        n_clusters = sizes.size
+
+        centers = self.centroids(labels, sizes)
+        inertia = ((self.X - centers[labels]) ** 2).sum()
+        min_centroid = pdist(centers).min() if n_clusters > 1 else np.nan
+
+        return {
+            "n_clusters" : n_clusters,
+            "min_size" : int(sizes.min()),
+            "max_size" : int(sizes.max()),
+            "size_cv" : sizes.std() / sizes.mean(),
+            "inertia" : inertia,
+            "silhouette" : self.silhouette(labels, n_clusters),
+            "min_centroid_dist" : min_centroid,
+            "max_diameter" : self.max_diameter(labels, n_clusters)
+        }
+
+def prune_reason(metrics, k=None, min_size=None, max_size_cv=None, min_silhouette=None):
+    """
+    why a run is discarded, empty if it is kept
+    """
+    reasons = []
+    if k is not None and metrics["n_clusters"] != k:
+        reasons.append("k_mismatch")
+    if min_size is not None and metrics["min_size"] < min_size:
+        reasons.append("min_size")
+    if max_size_cv is not None and metrics["size_cv"] > max_size_cv:
+        reasons.append("size_cv")
+    if min_silhouette is not None and not metrics["silhouette"] >= min_silhouette:
+        # an undefined silhouette (a single cluster) is not pruned
+        if not np.isnan(metrics["silhouette"]):
+            reasons.append("silhouette")
+    return ",".join(reasons)
+
+def write_metrics(fn, metrics):
+    with open(fn, "w+") as f:
+        f.write("\t".join(METRIC_FIELDS) + "\n")
+        for m in metrics:
+            f.write(
+                "{k}\t{seed}\t{n_clusters}\t{min_size}\t{max_size}\t{size_cv:.4f}\t"
+                "{inertia:.4f}\t{silhouette:.4f}\t{min_centroid_dist:.4f}\t"
+                "{max_diameter:.4f}\t{pruned}\n".format(**m)
+                )
@@ -1,69 +1,40 @@
 #!/usr/bin/env python3
 
 import numpy as np
-import pandas as pd
 import argparse
 import glob
 import sys
 import os
 import shutil
+import tempfile
+import hashlib
 import re
-from tqdm import tqdm
-from multiprocess import Pool
 
 from sklearn.cluster import KMeans
 
-class SplitSubDir:
-    """
-    A recreation of setup_db2_zinc15_file_number:
-        splits an enrichment_sdi into N evenly split directories
-    """
-
-    def __init__(self, sdi_fn, n=20):
-        self.sdi_fn = sdi_fn
-        self.n = n
-
-        self.split_db = {
-            i : [] for i in range(n)
-        }
-
-    def prepare(self):
-        with open(self.sdi_fn, 'r') as f:
-            for idx, line in enumerate(f):
-                self.split_db[idx%self.n].append(line)
-
-    def write(self, fn, idx):
-        with open(fn, "w+") as f:
-            for l in self.split_db[idx]:
-                f.write(l)
+from SphereFile import SphereSet
+from SplitSDI import SplitSubDir, STRATEGIES
+from Backends import BACKENDS, write_timing, log_timing
+from Indock import IndockTemplate, parse_overrides
+from ClusterMetrics import ClusterMetrics, prune_reason, write_metrics
+from Scheduler import Scheduler, TaskErrors, describe, write_failures, log_failures
 
 class ClusterSPH:
-    def __init__(self, input_fn, output_fn, k, seed, verbose=False, multi_fn=True):
-        self.input_fn = input_fn
+    def __init__(self, spheres, output_fn, k, seed, verbose=False, multi_fn=True, labels=None):
+        self.spheres = spheres
         self.output_fn = output_fn
         self.k = k
         self.seed = seed
         self.verbose = verbose
         self.multi_fn = multi_fn
 
-        self.sph_header = []
-        self.sph_lines = []
-        self.sph_frame = pd.DataFrame()
-        self.sph_matrix = np.array([])
+        self.sph_header = spheres.header
+        self.sph_lines = spheres.lines
+        self.matrix = spheres.coords
+        self.labels = np.array([]) if labels is None else labels
         self.cluster_size = np.array([])
-
-    def read_sph(self):
-        with open(self.input_fn, "r+") as f:
-            while True:
-                try:
-                    line = next(f)
-                    if line[0] != ' ':
-                        self.sph_header.append(line)
-                    else:
-                        self.sph_lines.append(line)
-                except StopIteration:
-                    self.build_frame()
-                    break
+        self.order = np.array([])
+        self.bounds = np.array([])
 
     def write_sph(self):
         if self.multi_fn:
@@ -82,54 +53,50 @@ class ClusterSPH:
             line = line.replace("1", str(idx + 1), 1)
         return line
 
+    def group(self):
+        """
+        one stable sort of the labels : sphere indices ordered by cluster
+        and the bounds of each cluster in that order
+        """
+        self.order = np.argsort(self.labels, kind="stable")
+        self.bounds = np.searchsorted(self.labels[self.order], np.arange(self.k + 1))
+
+    def cluster_lines(self, idx):
+        return join_lines(
+            self.sph_lines[self.order[self.bounds[idx]:self.bounds[idx+1]]]
+            )
+
     def write_subcluster(self, idx):
         ofn = self.output_fn + ".{}.sph"
-        with open(ofn.format(idx), "w+") as f:
-            c_idx = np.where(self.sph_frame.cluster == idx)[0]
+        buffer = [line.encode() for line in self.sph_header[:-1]]
+        buffer.append(self.prepare_final_header(idx).encode())
+        buffer.append(self.cluster_lines(idx))
 
-            final_header = self.prepare_final_header(idx)
-            for line in self.sph_header[:-1]:
-                f.write(line)
+        with open(ofn.format(idx), "wb+") as f:
+            f.write(b"".join(buffer))
 
-            f.write(final_header)
-
-            for line in self.sph_lines[c_idx]:
-                f.write(line)
-
-    def write_single_fn(self):
-        ofn = self.output_fn + ".sph"
-        with open(self.output_fn, "w+") as f:
+    def render_single_fn(self):
+        # color matching header
+        buffer = [line.encode() for line in self.sph_header[:-1]]
 
-            # write color matching header
-            for line in self.sph_header[:-1]:
-                f.write(line)
+        # cluster header followed by its nodes
+        for k_idx in range(self.k):
+            buffer.append(self.prepare_final_header(k_idx, replace_idx=True).encode())
+            buffer.append(self.cluster_lines(k_idx))
 
-            for k_idx in range(self.k):
-                # isolate lines in a cluster
-                c_idx = np.where(self.sph_frame.cluster == k_idx)[0]
+        return b"".join(buffer)
 
-                # write cluster header
-                final_header = self.prepare_final_header(k_idx, replace_idx=True)
-                f.write(final_header)
-
-                # write nodes
-                for line in self.sph_lines[c_idx]:
-                    f.write(line)
-
-    def build_frame(self):
-        self.sph_frame = pd.DataFrame([
-            [_ for _ in l.strip().split(" ") if _ != ""] for l in self.sph_lines
-            ])
-        self.matrix = self.sph_frame.iloc[:, [1,2,3]].values
-        self.sph_lines = np.array(self.sph_lines)
+    def write_single_fn(self):
+        with open(self.output_fn, "wb+") as f:
+            f.write(self.render_single_fn())
 
     def cluster(self):
-        km = KMeans(n_clusters = self.k, random_state=self.seed)
-        names = km.fit_predict(self.matrix)
-        self.sph_frame['cluster'] = names
-        self.cluster_size = np.array([
-            np.sum(names == i) for i in np.arange(self.k)
-            ])
+        # labels may be precomputed for all seeds at once (BatchKMeans)
+        if self.labels.size == 0:
+            km = KMeans(n_clusters = self.k, random_state=self.seed)
+            self.labels = km.fit_predict(self.matrix)
+        self.cluster_size = np.bincount(self.labels, minlength=self.k)[:self.k]
+        self.group()
 
     def log(self):
         print(
@@ -142,24 +109,104 @@ class ClusterSPH:
             )
 
     def run(self):
-        self.read_sph()
         self.cluster()
         self.write_sph()
 
         if self.verbose:
             self.log()
 
+def join_lines(lines):
+    """
+    raw bytes of a selection of sphere lines, fixed width lines are
+    copied out in one block
+    """
+    if lines.dtype.kind == "S":
+        return lines.tobytes()
+    return b"".join(lines)
+
+def write_seed_clusters(spheres, seed, runs):
+    """
+    writes the clustered sphere file of every k of a seed,
+    runs is a list of (output_fn, k, labels)
+    """
+    for output_fn, k, labels in runs:
+        ClusterSPH(
+            spheres, output_fn, k, seed, multi_fn=False, labels=labels
+            ).run()
+
+def partition_hash(labels):
+    """
+    hash of a partition independent of its label numbering : clusters
+    are renumbered by their first member, the same canonical form as the
+    sorted set of member index sets
+    """
+    labels = np.asarray(labels)
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first))
+    canonical = rank[inverse].astype(np.int32)
+    return hashlib.sha1(canonical.tobytes()).hexdigest()
+
+def file_hash(fn):
+    """
+    sha1 of a file's contents
+    """
+    h = hashlib.sha1()
+    with open(fn, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def link(src, dst):
+    """
+    hardlinks dst to src (no new inode), falling back to a
+    symlink where hardlinks are not possible
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+
 class PrepareClusters:
-    def __init__(self, meta_dir, k_list, num_iter=1, scale_match_goal=False, overwrite=False, verbose=False, num_sdi_clusters=20):
+
+    # common store for the shared layout
+    store_dir = "shared"
+
+    # content hashed record of every built run directory
+    build_manifest_fn = "build_manifest.tab"
+    failures_fn = "build_failures.tab"
+    metrics_fn = "cluster_metrics.tab"
+    aliases_fn = "seed_aliases.tab"
+    build_fields = [
+        "dir_name", "k", "seed", "backend", "layout",
+        "sphere_hash", "indock_hash", "sdi_hash", "options_hash"
+        ]
+
+    def __init__(self, meta_dir, k_list, num_iter=1, scale_match_goal=False, overwrite=False, verbose=False, num_sdi_clusters=20, backend="kmeans", layout="classic", incremental=False, sdi_split="roundrobin", sdi_times=None, jobs=None, serial=False, indock_params=None, by_seed=False, prune=None, metrics=False, dedupe=False, runs=None):
         self.meta_dir = meta_dir
         self.k_list = k_list
         self.num_iter = num_iter
+        self.runs = runs
+        self.backend = backend
+        self.layout = layout
+        self.incremental = incremental
         self.scale_match_goal = scale_match_goal
         self.overwrite = overwrite
         self.verbose = verbose
         self.num_sdi_clusters = num_sdi_clusters
+        self.sdi_split = sdi_split
+        self.sdi_times = sdi_times or []
+        self.jobs = jobs
+        self.serial = serial
+        self.indock_params = indock_params or {}
+        self.by_seed = by_seed
+        self.prune = prune or {}
+        self.metrics = metrics or bool(self.prune)
+        self.dedupe = dedupe
         self.pwd = os.getcwd()
 
+        if BACKENDS[self.backend].deterministic:
+            self.collapse_seeds()
+
         self.ms_fn = os.path.join(meta_dir, "dockfiles/matching_spheres.sph")
 
         self.to_symlink = []
@@ -169,11 +216,20 @@ class PrepareClusters:
         if self.verbose:
             self.summarise_input()
 
+        # parse the INDOCK once, runs render their overrides from it
+        self.indock = IndockTemplate.from_file(os.path.join(self.meta_dir, "INDOCK"))
+        if self.layout == "shared":
+            self.indock = self.indock.map_values(self.store_path)
+
+        # parse matching spheres once and share with every worker
+        self.spheres = SphereSet.from_file(self.ms_fn).share()
+
         self.ssd = SplitSubDir(
             os.path.join(self.meta_dir, "enrichment_sdi"),
-            n = self.num_sdi_clusters
+            n = self.num_sdi_clusters,
+            strategy = self.sdi_split,
+            time_patterns = self.sdi_times
             )
-        self.ssd.prepare()
 
     def summarise_input(self):
         print("Given Meta Directory : {}".format(self.meta_dir))
@@ -206,42 +262,214 @@ class PrepareClusters:
             os.path.join(self.meta_dir, "dockfiles/*")
         )
 
-    def prepare_INDOCK(self, input_fn, output_fn, k):
-        lines = []
-        with open(input_fn, "r") as f:
-            while True:
-                try:
-                    line = next(f)
-
-                    # replaces match goal if required
-                    if ("match_goal" in line) and (self.scale_match_goal):
-                        num = int(line.split(' ')[-1])
-                        replace_num = int(num / k)
-                        line = line.replace(str(num), str(replace_num))
-
-                    # adds line to write list
-                    lines.append(line)
-
-                    # appends k_clusters line to INDOCK
-                    if "bump_rigid" in line:
-                        cluster_line = "".join(
-                            ['k_clusters'] + \
-                            [" " for _ in range(20)] + \
-                            [str(k)] + \
-                            ["\n"]
-                            )
-                        lines.append(cluster_line)
-
-                except StopIteration:
-                    break
-
-        with open(output_fn, "w+") as f:
-            for l in lines:
-                f.write(l)
-
-    def create_directory(self, dir_name):
+    def indock_overrides(self, k):
+        """
+        INDOCK values of a run : the extra parameters, k_clusters and
+        the match goal scaled to 1/k if required
+        """
+        overrides = dict(self.indock_params)
+        overrides["k_clusters"] = str(k)
+        if self.scale_match_goal and "match_goal" in self.indock:
+            num = int(overrides.get("match_goal", self.indock.get("match_goal")))
+            overrides["match_goal"] = str(int(num / k))
+        return overrides
+
+    def prepare_INDOCK(self, output_fn, k):
+        self.indock.write(
+            output_fn, self.indock_overrides(k),
+            anchors = {"k_clusters" : "bump_rigid"}
+            )
+
+    def store_path(self, value):
+        """
+        rewrites ../dockfiles/ paths (relative to a subcluster) to the
+        common store, the clustered matching spheres stay in the run
+        """
+        if "../dockfiles/" in value and "matching_spheres.sph" not in value:
+            value = value.replace(
+                "../dockfiles/",
+                "../../{}/dockfiles/".format(self.store_dir)
+                )
+        return value
+
+    def shard_hash(self):
+        """
+        hash of the sdi and of the options deciding how it is split
+        """
+        options = "num_sdi_clusters={};sdi_split={};sdi_times={}".format(
+            self.num_sdi_clusters, self.sdi_split, ",".join(sorted(self.sdi_times))
+            )
+        return hashlib.sha1(
+            (file_hash(os.path.join(self.meta_dir, "enrichment_sdi")) + options).encode()
+            ).hexdigest()
+
+    def use_shards(self):
+        """
+        points the SDI split at the shards of the store, True when they
+        are complete
+        """
+        self.ssd.shard_dir = os.path.join(self.store_dir, "sdi", self.shard_hash()[:12])
+        return os.path.isfile(self.ssd.assignment_fn())
+
+    def prepare_shards(self):
+        """
+        writes the SDI shards of the shared layout once into the store,
+        run directories link them
+
+        Shards live in a directory named by the sdi and split options, so
+        a rebuild with the same inputs reuses them and a changed split is
+        written beside the shards that existing runs link to, nothing in
+        the store is ever removed
+        """
+        if self.use_shards():
+            if self.verbose:
+                print("SDI Split ({}) : reusing {}".format(self.sdi_split, self.ssd.shard_dir))
+            return
+
+        # the assignment is written last, without it the shards are partial
+        shard_dir = self.ssd.shard_dir
+        if os.path.isdir(shard_dir):
+            shutil.rmtree(shard_dir)
+        self.split_sdi(shard_dir)
+
+    def split_sdi(self, shard_dir):
+        self.ssd.prepare(shard_dir)
+
+        if self.verbose:
+            cost = self.ssd.shard_cost
+            print("SDI Split ({}) :".format(self.sdi_split))
+            print("\tmax shard load / mean : {:.3f}".format(
+                cost.max() / max(cost.mean(), 1e-12)
+                ))
+
+    def prepare_store(self):
+        """
+        links the shared dockfiles and meta files once, links already
+        in the store are kept
+        """
+        os.makedirs(os.path.join(self.store_dir, "dockfiles"), exist_ok=True)
+
+        links = [
+            (fn, os.path.join(self.store_dir, os.path.basename(fn)))
+            for fn in self.to_symlink if os.path.basename(fn) != "INDOCK"
+            ]
+        links += [
+            (fn, os.path.join(self.store_dir, "dockfiles", os.path.basename(fn)))
+            for fn in self.to_symlink_dockfiles
+            if os.path.basename(fn) != "matching_spheres.sph"
+            ]
+        for src, dst in links:
+            if not os.path.lexists(dst):
+                os.symlink(os.path.join(self.pwd, src), dst)
+
+    def store_shard(self, idx):
+        return self.ssd.shard_fn(idx)
+
+    def write_manifest(self, dir_name, k, n):
+        """
+        records the shared files a run of the shared layout uses
+        """
+        with open(os.path.join(dir_name, "manifest.tab"), "w+") as f:
+            f.write("key\tvalue\n")
+            f.write("layout\t{}\n".format(self.layout))
+            f.write("k\t{}\n".format(k))
+            f.write("seed\t{}\n".format(n))
+            f.write("backend\t{}\n".format(self.backend))
+            f.write("store\t{}\n".format(os.path.join(self.pwd, self.store_dir)))
+            for fn in self.to_symlink:
+                bn = os.path.basename(fn)
+                if bn != "INDOCK":
+                    f.write("{}\t{}\n".format(bn, os.path.join(self.store_dir, bn)))
+            for i in range(self.num_sdi_clusters):
+                f.write("subcluster{:04d}\t{}\n".format(i, self.store_shard(i)))
+
+    def input_hashes(self):
+        """
+        hashes of the run inputs and every option that changes a run
+        """
+        options = "scale_match_goal={};num_sdi_clusters={};sdi_split={};sdi_times={};indock={}".format(
+            self.scale_match_goal, self.num_sdi_clusters,
+            self.sdi_split, ",".join(sorted(self.sdi_times)),
+            ",".join("{}={}".format(k, v) for k, v in sorted(self.indock_params.items()))
+            )
+        return {
+            "sphere_hash" : file_hash(self.ms_fn),
+            "indock_hash" : file_hash(os.path.join(self.meta_dir, "INDOCK")),
+            "sdi_hash" : file_hash(os.path.join(self.meta_dir, "enrichment_sdi")),
+            "options_hash" : hashlib.sha1(options.encode()).hexdigest()
+        }
+
+    def build_record(self, k, n, hashes):
+        record = {
+            "dir_name" : "k{}_{}".format(k, n),
+            "k" : str(k),
+            "seed" : str(n),
+            "backend" : self.backend,
+            "layout" : self.layout
+        }
+        record.update(hashes)
+        return record
+
+    def read_build_manifest(self):
+        records = {}
+        if not os.path.isfile(self.build_manifest_fn):
+            return records
+        with open(self.build_manifest_fn, "r") as f:
+            header = next(f).rstrip("\n").split("\t")
+            for line in f:
+                record = dict(zip(header, line.rstrip("\n").split("\t")))
+                records[record["dir_name"]] = record
+        return records
+
+    def write_build_manifest(self, records):
+        tmp_fn = self.build_manifest_fn + ".tmp"
+        with open(tmp_fn, "w+") as f:
+            f.write("\t".join(self.build_fields) + "\n")
+            for dir_name in sorted(records):
+                f.write(
+                    "\t".join(records[dir_name][c] for c in self.build_fields) + "\n"
+                    )
+        os.replace(tmp_fn, self.build_manifest_fn)
+
+    def plan_builds(self, runs=None):
+        """
+        returns the (k, n) pairs to build, the pairs whose directory
+        must be replaced and the updated build manifest. In incremental
+        mode directories whose recorded inputs are unchanged are skipped
+        and keep any DOCK outputs.
+        """
+        hashes = self.input_hashes()
+        records = self.read_build_manifest()
+        if runs is None:
+            runs = self.run_pairs()
+
+        to_build = []
+        to_replace = set()
+        for k, n in runs:
+            record = self.build_record(k, n, hashes)
+            dir_name = record["dir_name"]
+            previous = records.get(dir_name)
+
+            if self.incremental and os.path.isdir(dir_name) and previous is not None:
+                if previous == record:
+                    continue
+                # built by a previous run with other inputs
+                to_replace.add((k, n))
+
+            to_build.append((k, n))
+            records[dir_name] = record
+
+        if self.verbose and self.incremental:
+            print("Incremental Build : {} to build ({} changed), {} unchanged".format(
+                len(to_build), len(to_replace),
+                len(runs) - len(to_build)
+                ))
+
+        return to_build, to_replace, records
+
+    def create_directory(self, dir_name, overwrite=False):
         if os.path.isdir(dir_name):
-            if not self.overwrite:
+            if not (self.overwrite or overwrite):
                 sys.exit(
                     "ERROR : Directory exists please delete \n\t{}\n".\
                         format(dir_name)
@@ -253,17 +481,26 @@ class PrepareClusters:
 
         os.makedirs(os.path.join(dir_name, "dockfiles"))
 
-    def populate_directory(self, dir_name, k, n):
+    def populate_directory(self, dir_name, k, n, labels=None, write_spheres=True):
 
         dir_dockfiles = os.path.join(dir_name, "dockfiles")
 
+        # backends may return fewer clusters than requested (dbscan)
+        if labels is not None:
+            k = int(labels.max()) + 1
+
+        if self.layout == "shared":
+            self.prepare_INDOCK(os.path.join(dir_name, "INDOCK"), k)
+            self.write_manifest(dir_name, k, n)
+            if write_spheres:
+                self.write_clusters(dir_dockfiles, k, n, labels)
+            return
+
         # symlink meta files to directory
         for fn in self.to_symlink:
             bn = fn.split("/")[-1]
             if bn == "INDOCK":
-                self.prepare_INDOCK(
-                    fn, os.path.join(dir_name, bn), k
-                    )
+                self.prepare_INDOCK(os.path.join(dir_name, bn), k)
             else:
                 os.symlink(
                     os.path.join(self.pwd, fn),
@@ -282,16 +519,25 @@ class PrepareClusters:
                 os.path.join(dir_dockfiles, bn)
             )
 
+        if write_spheres:
+            self.write_clusters(dir_dockfiles, k, n, labels)
+
+    def write_clusters(self, dir_dockfiles, k, n, labels):
         # overwrite matching spheres with clustered set
         # uses n index as seed for random state
         cl = ClusterSPH(
-            self.ms_fn, os.path.join(dir_dockfiles, "matching_spheres.sph"),
-            k, n, multi_fn=False
+            self.spheres, os.path.join(dir_dockfiles, "matching_spheres.sph"),
+            k, n, multi_fn=False, labels=labels
         )
         cl.run()
 
     def prepare_sdi_subclusters(self, dir_name):
 
+        if self.layout == "shared":
+            self.link_sdi_subclusters(dir_name)
+            self.write_subcluster_dirlist(dir_name)
+            return
+
         # create sdi subcluster directories
         for i in range(self.num_sdi_clusters):
             subdir = os.path.join(dir_name, "subcluster{:04d}".format(i))
@@ -309,6 +555,29 @@ class PrepareClusters:
                 i
             )
 
+        self.write_subcluster_dirlist(dir_name)
+
+    def link_sdi_subclusters(self, dir_name):
+        """
+        subclusters of the shared layout only link the run INDOCK and
+        their shard from the common store, all links made in one pass
+        """
+        subdirs = [
+            os.path.join(dir_name, "subcluster{:04d}".format(i))
+            for i in range(self.num_sdi_clusters)
+            ]
+        for subdir in subdirs:
+            os.mkdir(subdir)
+
+        run_indock = os.path.join(dir_name, "INDOCK")
+        links = []
+        for i, subdir in enumerate(subdirs):
+            links.append((run_indock, os.path.join(subdir, "INDOCK")))
+            links.append((self.store_shard(i), os.path.join(subdir, "split_database_index")))
+        for src, dst in links:
+            link(src, dst)
+
+    def write_subcluster_dirlist(self, dir_name):
         # write subdirectories to dirlist
         with open(os.path.join(dir_name, "dirlist"), "w+") as f:
             for i in range(self.num_sdi_clusters):
@@ -321,21 +590,228 @@ class PrepareClusters:
             for l in glob.glob("k*/subcluster*"):
                 f.write("./{}\n".format(l))
 
-    def prepare_directory(self, k, n):
+    def prepare_directory(self, k, n, labels=None, overwrite=False):
         dir_name = "k{}_{}".format(k, n)
-        self.create_directory(dir_name)
-        self.populate_directory(dir_name, k, n)
+        self.create_directory(dir_name, overwrite)
+        self.populate_directory(dir_name, k, n, labels)
         self.prepare_sdi_subclusters(dir_name)
 
-    def build_clusters(self):
-        set_list = [(k, n) for k in self.k_list for n in range(self.num_iter)]
+    def prepare_seed(self, n, runs):
+        """
+        prepares every k directory of a seed, runs is a list of
+        (k, labels, overwrite). The clustered sphere files are written
+        together once the directories exist.
+        """
+        spheres = []
+        errors = {}
+        for k, labels, overwrite in runs:
+            dir_name = "k{}_{}".format(k, n)
+            try:
+                self.create_directory(dir_name, overwrite)
+                self.populate_directory(dir_name, k, n, labels, write_spheres=False)
+                self.prepare_sdi_subclusters(dir_name)
+            except (Exception, SystemExit) as e:
+                errors[dir_name] = describe(e)
+                continue
+            spheres.append((
+                os.path.join(dir_name, "dockfiles", "matching_spheres.sph"),
+                int(labels.max()) + 1, labels
+                ))
+
+        # a failed write leaves every directory of the batch without its
+        # spheres, each is reported so its manifest record is restored
+        try:
+            write_seed_clusters(self.spheres, n, spheres)
+        except (Exception, SystemExit) as e:
+            for fn, _, _ in spheres:
+                errors[os.path.dirname(os.path.dirname(fn))] = describe(e)
+        if errors:
+            raise TaskErrors(errors)
+
+    def schedule(self, to_build, to_replace, labels):
+        """
+        prepares the directories with one task per run (or per seed),
+        returns the failures keyed by directory name
+        """
+        scheduler = Scheduler(jobs=self.jobs, serial=self.serial)
+
+        if not self.by_seed:
+            return scheduler.run(
+                self, "prepare_directory",
+                [(k, n, labels[(k, n)], (k, n) in to_replace) for k, n in to_build],
+                keys=["k{}_{}".format(k, n) for k, n in to_build]
+                )
 
-        p = Pool()
-        p.starmap(self.prepare_directory, tqdm(set_list))
-        p.close()
+        seeds = {}
+        for k, n in to_build:
+            seeds.setdefault(n, []).append((k, labels[(k, n)], (k, n) in to_replace))
+        return scheduler.run(
+            self, "prepare_seed", list(seeds.items()),
+            keys=["seed{}".format(n) for n in seeds]
+            )
+
+    def build_runs(self, to_build, to_replace, labels):
+        """
+        prepares the planned directories, classic runs copy their SDI
+        shards from a split in a temporary directory of the sweep that is
+        removed once they are built
+        """
+        if self.layout == "shared" or not to_build:
+            return self.schedule(to_build, to_replace, labels)
+
+        shard_dir = tempfile.mkdtemp(prefix=".sdi_split.", dir=".")
+        try:
+            self.split_sdi(shard_dir)
+            return self.schedule(to_build, to_replace, labels)
+        finally:
+            shutil.rmtree(shard_dir)
+
+    def collapse_seeds(self):
+        """
+        deterministic backends give every seed the same partition, only
+        the lowest seed of each k is built
+        """
+        runs = self.run_pairs()
+        lowest = {}
+        for k, n in runs:
+            lowest[k] = min(n, lowest.get(k, n))
+        kept = sorted(lowest.items())
+        if len(kept) < len(runs):
+            print("WARNING : the {} backend gives every seed the same partition, building {} of {} runs".format(
+                self.backend, len(kept), len(runs)
+                ))
+        if self.runs is not None:
+            self.runs = kept
+        self.num_iter = 1
+
+    def run_pairs(self):
+        """
+        (k, seed) pairs to build : the given runs, or every seed of every k
+        """
+        if self.runs is not None:
+            return sorted(self.runs)
+        return [(k, n) for k in self.k_list for n in range(self.num_iter)]
+
+    def cluster_seeds(self):
+        """
+        clusters every (k, seed) pair with the selected backend
+        and writes its timing report
+        """
+        pairs = self.run_pairs()
+        backend = BACKENDS[self.backend]()
+        labels = backend.fit(
+            self.spheres.coords,
+            sorted(set(k for k, _ in pairs)),
+            sorted(set(n for _, n in pairs))
+            )
+        if self.runs is not None:
+            labels = {key : labels[key] for key in pairs}
 
+        write_timing("backend_timing.tab", backend.timing)
+        if self.verbose:
+            log_timing(backend.timing)
+
+        # contiguous cluster indices for writing
+        return {
+            key : np.unique(l, return_inverse=True)[1].astype(np.int32)
+            for key, l in labels.items()
+        }
+
+    def evaluate_runs(self, labels):
+        """
+        returns the pairs whose partition has k clusters and passes the
+        pruning thresholds, the quality metrics of every partition are
+        only computed (and written) when pruning or asked for
+        """
+        cm = ClusterMetrics(self.spheres.coords) if self.metrics else None
+        metrics = []
+        runs = []
+        for k, n in sorted(labels):
+            if cm is not None:
+                m = cm.compute(labels[(k, n)])
+            else:
+                # labels are contiguous
+                m = {"n_clusters" : int(labels[(k, n)].max()) + 1}
+            reason = prune_reason(m, k=k, **self.prune)
+            m.update({"k" : k, "seed" : n, "pruned" : reason or "-"})
+            metrics.append(m)
+            if not reason:
+                runs.append((k, n))
+            elif "k_mismatch" in reason:
+                print("WARNING : {} backend found {} clusters for k{}_{}, run not built".format(
+                    self.backend, m["n_clusters"], k, n
+                    ))
+
+        if cm is not None:
+            write_metrics(self.metrics_fn, metrics)
+        elif os.path.isfile(self.metrics_fn):
+            os.remove(self.metrics_fn)
+        if self.verbose and self.prune:
+            print("Pruned Runs : {} of {}".format(len(labels) - len(runs), len(labels)))
+        return runs
+
+    def dedupe_runs(self, labels, runs):
+        """
+        maps seeds of a k that converged to the same partition onto the
+        lowest seed, writes the alias table and returns the runs to build
+        """
+        canonical = {}
+        aliases = []
+        for k, n in sorted(runs):
+            h = partition_hash(labels[(k, n)])
+            target = canonical.setdefault((k, h), n)
+            aliases.append((k, n, target, h))
+
+        with open(self.aliases_fn, "w+") as f:
+            f.write("k\tseed\tdir_name\trun_dir\tpartition_hash\n")
+            for k, n, target, h in aliases:
+                f.write("{}\t{}\tk{}_{}\tk{}_{}\t{}\n".format(k, n, k, n, k, target, h))
+
+        unique = [(k, n) for k, n, target, _ in aliases if n == target]
+        if self.verbose:
+            print("Unique Partitions : {} of {} runs".format(len(unique), len(runs)))
+        return unique
+
+    def build_clusters(self, build_store=True):
+        """
+        builds the run directories, with build_store=False the store of
+        a previous shared build is used as is and must exist
+        """
+        if self.layout == "shared":
+            if build_store:
+                self.prepare_shards()
+                self.prepare_store()
+            elif not self.use_shards():
+                sys.exit("ERROR : no complete SDI shards in {}, build the store first".format(self.store_dir))
+
+        labels = self.cluster_seeds()
+        runs = self.evaluate_runs(labels)
+        if self.dedupe:
+            runs = self.dedupe_runs(labels, runs)
+
+        to_build, to_replace, records = self.plan_builds(runs)
+        failures = self.build_runs(to_build, to_replace, labels)
+
+        # failed directories keep the record of their previous build
+        previous = self.read_build_manifest()
+        for dir_name in [t.key for t in failures]:
+            if dir_name in previous:
+                records[dir_name] = previous[dir_name]
+            else:
+                records.pop(dir_name, None)
+
+        self.write_build_manifest(records)
         self.write_dirlist()
+
+        if os.path.isfile(self.failures_fn):
+            os.remove(self.failures_fn)
+        if failures:
+            write_failures(self.failures_fn, failures)
+            log_failures(failures, verbose=self.verbose)
+            return False
+
         self.print_face()
+        return True
 
     def print_face(self):
         print("")
@@ -390,7 +866,72 @@ def get_args():
         "-s", "--num_sdi", default=20, required=False, type=int,
         help="Number of clusters to split sdi set into"
     )
+    p.add_argument(
+        "-b", "--backend", default="kmeans", required=False, type=str,
+        choices=sorted(BACKENDS),
+        help="Spatial clustering backend (timings written to backend_timing.tab)"
+    )
+    p.add_argument(
+        "-u", "--incremental", action='store_true', required=False,
+        help="only regenerate directories that are missing or whose inputs changed since the last build (build_manifest.tab)"
+    )
+    p.add_argument(
+        "-l", "--layout", default="classic", required=False, type=str,
+        choices=["classic", "shared"],
+        help="Directory layout : per-run symlinks and SDI files (classic) or a common store referenced by a manifest (shared)"
+    )
+    p.add_argument(
+        "--sdi_split", default="roundrobin", required=False, type=str,
+        choices=STRATEGIES,
+        help="How db2 entries are split across SDI subclusters : round robin, balanced by db2 file size or balanced by DOCK time from previous OUTDOCKs"
+    )
+    p.add_argument(
+        "--sdi_times", nargs="+", required=False, type=str,
+        help="OUTDOCK files or glob patterns from a previous run (used with --sdi_split time)"
+    )
+    p.add_argument(
+        "-j", "--jobs", default=None, required=False, type=int,
+        help="Number of worker processes preparing directories (default: all cores)"
+    )
+    p.add_argument(
+        "--serial", action='store_true', required=False,
+        help="prepare directories one at a time in the main process (debugging)"
+    )
+    p.add_argument(
+        "-p", "--param", nargs="+", required=False, type=str, metavar="KEY=VALUE",
+        help="INDOCK parameters to set in every run (added if missing from the meta INDOCK)"
+    )
+    p.add_argument(
+        "--by_seed", action='store_true', required=False,
+        help="prepare every k directory of a seed in one task, writing their clustered sphere files together"
+    )
+    p.add_argument(
+        "--min_cluster_size", default=None, required=False, type=int,
+        help="skip runs with a cluster smaller than this (metrics in cluster_metrics.tab)"
+    )
+    p.add_argument(
+        "--max_size_cv", default=None, required=False, type=float,
+        help="skip runs whose cluster sizes vary more than this (std / mean)"
+    )
+    p.add_argument(
+        "--min_silhouette", default=None, required=False, type=float,
+        help="skip runs with a lower silhouette score"
+    )
+    p.add_argument(
+        "--metrics", action='store_true', required=False,
+        help="write cluster_metrics.tab without pruning (always written when pruning)"
+    )
+    p.add_argument(
+        "-d", "--dedupe", action='store_true', required=False,
+        help="build one directory per distinct partition of a k, duplicate seeds are listed in seed_aliases.tab"
+    )
     args = p.parse_args()
+    try:
+        args.param = parse_overrides(args.param)
+    except ValueError as e:
+        p.error(str(e))
+    if args.sdi_split == "time" and not args.sdi_times:
+        p.error("--sdi_split time requires --sdi_times")
     return args
 
 def main():
@@ -403,9 +944,28 @@ def main():
         scale_match_goal = args.scale_match_goal,
         overwrite = args.overwrite,
         verbose = args.verbose,
-        num_sdi_clusters = args.num_sdi
+        num_sdi_clusters = args.num_sdi,
+        backend = args.backend,
+        layout = args.layout,
+        incremental = args.incremental,
+        sdi_split = args.sdi_split,
+        sdi_times = args.sdi_times,
+        jobs = args.jobs,
+        serial = args.serial,
+        indock_params = args.param,
+        by_seed = args.by_seed,
+        dedupe = args.dedupe,
+        metrics = args.metrics,
+        prune = {
+            key : value for key, value in [
+                ("min_size", args.min_cluster_size),
+                ("max_size_cv", args.max_size_cv),
+                ("min_silhouette", args.min_silhouette)
+                ] if value is not None
+        }
     )
-    pc.build_clusters()
+    if not pc.build_clusters():
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import os
+
+RUN_FIELDS = ["receptor", "match_type", "cluster_id"]
+
+def store_fns(prefix):
+    return "{}.npy".format(prefix), "{}.index.tab".format(prefix)
+
+class CoocWriter:
+    """
+    Writes the co-occurrence matrices of many runs into one flat .npy
+    (each n x n matrix row major at its offset) and an index table of
+    (receptor, match_type, cluster_id, offset, n_spheres), so every run
+    keeps its own sphere count and no padding is stored.
+    """
+
+    def __init__(self, prefix, sizes, dtype=np.int32):
+        """
+        sizes : sphere count of every run, in the order they are added
+        """
+        self.data_fn, self.index_fn = store_fns(prefix)
+        total = int(sum(n * n for n in sizes))
+        self.data = np.lib.format.open_memmap(
+            self.data_fn + ".tmp.npy", mode="w+", dtype=dtype, shape=(total,)
+            )
+        self.rows = []
+        self.offset = 0
+
+    def add(self, key, mat):
+        n = mat.shape[0]
+        if mat.size and mat.max() > np.iinfo(self.data.dtype).max:
+            raise ValueError("co-occurrence count of {} overflows {}".format(key, self.data.dtype))
+        self.data[self.offset:self.offset + n * n] = mat.ravel()
+        self.rows.append((*key, self.offset, n))
+        self.offset += n * n
+
+    def close(self):
+        self.data.flush()
+        del self.data
+        os.replace(self.data_fn + ".tmp.npy", self.data_fn)
+        with open(self.index_fn + ".tmp", "w+") as f:
+            f.write("\t".join(RUN_FIELDS + ["offset", "n_spheres"]) + "\n")
+            for row in self.rows:
+                f.write("\t".join(map(str, row)) + "\n")
+        os.replace(self.index_fn + ".tmp", self.index_fn)
+
+class CoocStore:
+    """
+    Reads a CoocWriter store : the data is memory mapped and a run is
+    an (n, n) view into it, nothing is copied or parsed until used
+    """
+
+    def __init__(self, prefix):
+        self.data_fn, self.index_fn = store_fns(prefix)
+        self.data = np.load(self.data_fn, mmap_mode="r")
+        self.index = {}
+        with open(self.index_fn, "r") as f:
+            next(f)
+            for line in f:
+                receptor, match_type, cluster_id, offset, n = line.rstrip("\n").split("\t")
+                self.index[(receptor, match_type, cluster_id)] = (int(offset), int(n))
+
+    @staticmethod
+    def exists(prefix):
+        return all(os.path.isfile(fn) for fn in store_fns(prefix))
+
+    def __contains__(self, key):
+        return tuple(key) in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def get(self, key):
+        """
+        co-occurrence matrix of a run (an empty matrix if unknown)
+        """
+        offset, n = self.index.get(tuple(key), (0, 0))
+        return self.data[offset:offset + n * n].reshape(n, n)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import pandas as pd
+import argparse
+import sys
+import os
+
+from Analysis import prepare_timescores, prepare_msframe, aggregate_scores
+from Cooccurrence import CoocStore, store_fns
+
+RUN_KEYS = ['receptor', 'match_type', 'cluster_id']
+
+# table name -> readers tried in order of preference
+FORMATS = [
+    ("parquet", pd.read_parquet),
+    ("feather", pd.read_feather),
+    ("tab", lambda fn : pd.read_csv(fn, sep="\t"))
+    ]
+
+TABLES = {
+    "time_scores" : "merged_time_and_enrichment",
+    "ms_frame" : "sphere_usage",
+    "cooc_frame" : "co-occurrence"
+    }
+
+def find_table(data_dir, name):
+    """
+    path and reader of the preferred available format of a table,
+    converted copies older than the tab separated table are skipped
+    """
+    tab_fn = os.path.join(data_dir, "{}.tab".format(name))
+    tab_time = os.path.getmtime(tab_fn) if os.path.isfile(tab_fn) else 0
+    for ext, reader in FORMATS:
+        fn = os.path.join(data_dir, "{}.{}".format(name, ext))
+        if os.path.isfile(fn) and os.path.getmtime(fn) >= tab_time:
+            return fn, reader
+    raise FileNotFoundError("no {}.{{parquet,feather,tab}} in {}".format(name, data_dir))
+
+class KeyIndex:
+    """
+    rows of a frame grouped by key columns : the frame is sorted by the
+    keys once so every group is a contiguous block, and a key lookup is a
+    dictionary hit followed by a positional slice
+    """
+
+    def __init__(self, frame, keys):
+        self.keys = keys
+        self.frame = frame.sort_values(keys, kind="stable").reset_index(drop=True)
+        self.blocks = {
+            key if len(keys) > 1 else (key,) : (pos[0], pos[-1] + 1)
+            for key, pos in self.frame.groupby(keys, sort=False).indices.items()
+        }
+
+    def __contains__(self, key):
+        return tuple(key) in self.blocks
+
+    def get(self, key):
+        """
+        rows of a key (an empty frame if the key is unknown)
+        """
+        start, stop = self.blocks.get(tuple(key), (0, 0))
+        return self.frame.iloc[start:stop]
+
+class DataStore:
+    """
+    Lazily loaded tables of the dashboard
+
+    Each table is read on first use from {data_dir}/{name}.parquet,
+    .feather or .tab (in that order) and indexed by run keys, so the
+    callbacks slice the rows of a (receptor, match_type, cluster_id)
+    instead of masking the whole table.
+    """
+
+    def __init__(self, data_dir="../data"):
+        self.data_dir = data_dir
+        self.tables = {}
+        self.indices = {}
+
+    def load(self, table):
+        if table not in self.tables:
+            fn, reader = find_table(self.data_dir, TABLES[table])
+            frame = reader(fn)
+            if table == "time_scores":
+                frame = prepare_timescores(frame)
+            elif table == "ms_frame":
+                frame = prepare_msframe(frame)
+            self.tables[table] = frame
+        return self.tables[table]
+
+    def index(self, table, keys):
+        name = (table, tuple(keys))
+        if name not in self.indices:
+            self.indices[name] = KeyIndex(self.load(table), keys)
+        return self.indices[name]
+
+    @property
+    def time_scores(self):
+        return self.load("time_scores")
+
+    @property
+    def agg_scores(self):
+        if "agg_scores" not in self.tables:
+            self.tables["agg_scores"] = aggregate_scores(self.time_scores)
+        return self.tables["agg_scores"]
+
+    def receptors(self):
+        return self.time_scores.receptor.unique()
+
+    def cluster_ids(self):
+        return sorted(self.load("ms_frame").cluster_id.unique())
+
+    def receptor_scores(self, rec):
+        return self.index("time_scores", ['receptor']).get((rec,))
+
+    def sphere_usage(self, rec, mt, ci):
+        return self.index("ms_frame", RUN_KEYS).get((rec, mt, ci))
+
+    def cooc_store(self):
+        """
+        memory mapped co-occurrence store (Aggregate.py -c npy), or None
+        when only an up to date wide co-occurrence table is available
+        """
+        if "cooc_store" not in self.tables:
+            prefix = os.path.join(self.data_dir, TABLES["cooc_frame"])
+            store = None
+            if CoocStore.exists(prefix):
+                tab_fn = prefix + ".tab"
+                if not os.path.isfile(tab_fn) or \
+                        os.path.getmtime(store_fns(prefix)[1]) >= os.path.getmtime(tab_fn):
+                    store = CoocStore(prefix)
+            self.tables["cooc_store"] = store
+        return self.tables["cooc_store"]
+
+    def cooccurrence(self, rec, mt, ci):
+        """
+        co-occurrence matrix of a run, a view into the binary store or
+        the wide table without the padding columns of smaller receptors
+        """
+        store = self.cooc_store()
+        if store is not None:
+            return store.get((rec, mt, ci))
+        sub_frame = self.index("cooc_frame", RUN_KEYS).get((rec, mt, ci))
+        return sub_frame.iloc[:, 3:].dropna(axis=1, how="all").values
+
+def convert(data_dir, fmt="parquet"):
+    """
+    writes every tab separated table of data_dir as parquet or feather
+    """
+    for name in TABLES.values():
+        fn = os.path.join(data_dir, "{}.tab".format(name))
+        if not os.path.isfile(fn):
+            print("WARNING : {} not found".format(fn))
+            continue
+        frame = pd.read_csv(fn, sep="\t")
+        out_fn = os.path.join(data_dir, "{}.{}".format(name, fmt))
+        if fmt == "parquet":
+            frame.to_parquet(out_fn, index=False)
+        else:
+            frame.to_feather(out_fn)
+        print("{} -> {}".format(fn, out_fn))
+
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-d", "--data_dir", default="../data", required=False, type=str,
+        help="Directory of the merged tables"
+    )
+    p.add_argument(
+        "-t", "--format", default="parquet", required=False, type=str,
+        choices=["parquet", "feather"],
+        help="Format to convert the tab separated tables to (needs pyarrow)"
+    )
+    args = p.parse_args()
+    return args
+
+def main():
+    args = get_args()
+    if not os.path.isdir(args.data_dir):
+        sys.exit("ERROR : {} is not a directory".format(args.data_dir))
+    convert(args.data_dir, args.format)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import argparse
+import sys
+import os
+from tqdm import tqdm
+from multiprocess import Pool
+
+from Outdock import parse_directory
+
+# adjusted LogAUC of Mysinger/Shoichet 2010, as in Extract.jl
+LOGAUC_LAMBDA = 0.001
+
+# float64 sized arrays alive per (resample, molecule) cell of a bootstrap
+# block : draws, counts and the weighted ROC arrays of segment_scores
+BOOT_TEMPORARIES = 14
+
+def random_logauc(lam=LOGAUC_LAMBDA):
+    return (1.0 - lam) / np.log(10) / np.log10(1.0 / lam)
+
+def segment_starts(sizes):
+    return np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+
+def shift(values, starts, fill):
+    """
+    previous element along the last axis, fill at every segment start
+    """
+    prev = np.empty_like(values)
+    prev[..., 1:] = values[..., :-1]
+    prev[..., starts] = fill
+    return prev
+
+def first_fpr(num_decoys, lam=LOGAUC_LAMBDA):
+    """
+    first FPR >= lambda of a ROC curve : FPR steps through k / N
+    """
+    n = np.asarray(num_decoys, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        k = np.ceil(lam * n)
+        k = np.where((k - 1) / n >= lam, k - 1, k)
+        return np.where((k <= n) & (n > 0), k / n, np.nan)
+
+def segment_scores(ligand, sizes, lam=LOGAUC_LAMBDA, weights=None):
+    """
+    AUC and adjusted LogAUC of ranked runs laid end to end
+
+    ligand : bool array (..., total) of ranked molecules (best first),
+             True for ligands and False for decoys, runs are consecutive
+             segments of the last axis
+    sizes : number of molecules of every run
+    weights : optional counts of every molecule (bootstrap resamples),
+              a molecule counted c times is one step of c molecules
+
+    returns (auc, log_auc) of shape (..., num_runs)
+
+    The ROC curve of each run starts at (0, 0) and steps through every
+    molecule. LogAUC takes the points from the first FPR >= lambda, maps
+    log10(FPR) onto [0, 1] and subtracts the random LogAUC, the same
+    steps as LogAUC in Extract.jl.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    starts = segment_starts(sizes)
+    lig = np.asarray(ligand, dtype=np.float64)
+    dec = 1.0 - lig
+    if weights is not None:
+        lig = lig * weights
+        dec = dec * weights
+
+    def rates(x):
+        total = np.add.reduceat(x, starts, axis=-1)
+        cum = np.cumsum(x, axis=-1)
+        base = np.repeat(cum[..., starts] - x[..., starts], sizes, axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (cum - base) / np.repeat(total, sizes, axis=-1), total
+
+    tpr, _ = rates(lig)
+    fpr, num_decoys = rates(dec)
+    prev_tpr = shift(tpr, starts, 0.0)
+    prev_fpr = shift(fpr, starts, 0.0)
+
+    auc = np.add.reduceat(
+        (fpr - prev_fpr) * (tpr + prev_tpr) / 2, starts, axis=-1
+        )
+
+    # log scaled x from the first FPR >= lambda to the end of each run,
+    # a weighted decoy step crossing lambda starts its trapezoid there
+    valid = fpr >= lam
+    prev_valid = shift(valid, starts, False)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lo = np.log10(first_fpr(num_decoys, lam))
+        log_x = np.log10(np.where(valid, fpr, 1.0))
+        hi = np.maximum.reduceat(np.where(valid, log_x, -np.inf), starts, axis=-1)
+        scaled = (log_x - np.repeat(lo, sizes, axis=-1)) / \
+            np.repeat(hi - lo, sizes, axis=-1)
+        prev_scaled = np.where(prev_valid, shift(scaled, starts, 0.0), 0.0)
+        trapezoid = (scaled - prev_scaled) * (tpr + prev_tpr) / 2
+
+    log_auc = np.add.reduceat(
+        np.where(valid, trapezoid, 0.0), starts, axis=-1
+        ) - random_logauc(lam)
+
+    # runs without ligands or decoys are undefined
+    undefined = ~np.isfinite(lo) | ~np.isfinite(auc) | ~np.isfinite(hi - lo)
+    log_auc = np.where(undefined, np.nan, log_auc)
+    return auc, log_auc
+
+def rank_runs(runs):
+    """
+    lays runs of (scores, ligand) end to end, each ranked by
+    ascending score (stable, so ties keep their input order)
+
+    returns (ligand, sizes)
+    """
+    sizes = np.array([len(s) for s, _ in runs], dtype=np.int64)
+    ligand = np.zeros(sizes.sum(), dtype=bool)
+    for (scores, lig), start in zip(runs, segment_starts(sizes)):
+        order = np.argsort(np.asarray(scores), kind="stable")
+        ligand[start:start + order.size] = np.asarray(lig, dtype=bool)[order]
+    return ligand, sizes
+
+def score_runs(runs, lam=LOGAUC_LAMBDA):
+    """
+    AUC and adjusted LogAUC for a list of (scores, ligand) runs,
+    lower scores rank first (DOCK Total)
+    """
+    if len(runs) == 0:
+        return np.zeros(0), np.zeros(0)
+    ligand, sizes = rank_runs(runs)
+    return segment_scores(ligand, sizes, lam)
+
+def bootstrap_runs(runs, num_boot=200, alpha=0.05, seed=0, lam=LOGAUC_LAMBDA, max_bytes=256 << 20):
+    """
+    percentile bootstrap intervals of AUC and LogAUC for many runs
+
+    Molecules of every run are resampled with replacement. A resample is
+    the number of times each ranked molecule is drawn, so a block of
+    resamples of all runs is one (resamples, molecules) count matrix
+    scored by a single weighted call to segment_scores, without re-sorting.
+
+    Scoring a block keeps about BOOT_TEMPORARIES float64 arrays of its
+    size alive, so peak memory is 8 * BOOT_TEMPORARIES bytes per
+    resample and molecule (112 MB for 100 resamples of 10^5 molecules).
+    Blocks hold as many resamples as fit in max_bytes, at least one.
+
+    returns dict of arrays (num_runs,) : auc_lo, auc_hi, log_auc_lo, log_auc_hi
+    """
+    names = ["auc_lo", "auc_hi", "log_auc_lo", "log_auc_hi"]
+    if len(runs) == 0 or num_boot == 0:
+        return {n : np.full(len(runs), np.nan) for n in names}
+
+    ligand, sizes = rank_runs(runs)
+    starts = segment_starts(sizes)
+    total = int(sizes.sum())
+    offsets = np.repeat(starts, sizes)
+    lengths = np.repeat(sizes, sizes)
+
+    rng = np.random.RandomState(seed)
+    block = max(1, min(num_boot, max_bytes // (8 * BOOT_TEMPORARIES * max(total, 1))))
+    aucs = []
+    log_aucs = []
+    for b in range(0, num_boot, block):
+        n = min(block, num_boot - b)
+
+        # positions in the ranked layout drawn within each run, counted per row
+        draw = offsets + (rng.random_sample((n, total)) * lengths).astype(np.int64)
+        draw += np.arange(n, dtype=np.int64)[:, None] * total
+        counts = np.bincount(draw.ravel(), minlength=n * total).reshape(n, total)
+
+        auc, log_auc = segment_scores(ligand, sizes, lam, weights=counts)
+        aucs.append(auc)
+        log_aucs.append(log_auc)
+
+    aucs = np.concatenate(aucs)
+    log_aucs = np.concatenate(log_aucs)
+    q = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    with np.errstate(invalid="ignore"):
+        auc_ci = np.nanpercentile(aucs, q, axis=0)
+        log_ci = np.nanpercentile(log_aucs, q, axis=0)
+
+    return {
+        "auc_lo" : auc_ci[0], "auc_hi" : auc_ci[1],
+        "log_auc_lo" : log_ci[0], "log_auc_hi" : log_ci[1]
+    }
+
+def best_scores(names, totals):
+    """
+    best (lowest) Total of every molecule, ordered by (Total, name) as
+    the unique score frame of Extract.jl
+    """
+    names = np.asarray(names)
+    totals = np.asarray(totals, dtype=np.float64)
+    order = np.lexsort((names, totals))
+    _, first = np.unique(names[order], return_index=True)
+    keep = order[np.sort(first)]
+    return names[keep], totals[keep]
+
+def read_names(fn):
+    with open(fn, "r") as f:
+        return set(line.rstrip("\n") for line in f)
+
+def label_scores(names, totals, ligands, decoys):
+    """
+    (scores, ligand) run of the molecules named in the ligand or decoy set
+
+    Extract.jl counts unlabelled molecules as false positives while its
+    FPR divides by the decoys only, they are left out here instead.
+    """
+    is_ligand = np.array([n in ligands for n in names], dtype=bool)
+    is_decoy = np.array([n in decoys for n in names], dtype=bool)
+    keep = is_ligand | is_decoy
+    return np.asarray(totals)[keep], is_ligand[keep]
+
+def directory_run(dir_name):
+    """
+    subcluster timings and the labelled (scores, ligand) run of the
+    OUTDOCKs of a run directory
+    """
+    ligands = read_names(os.path.join(dir_name, "ligands.names"))
+    decoys = read_names(os.path.join(dir_name, "decoys.names"))
+    _, scores, times = parse_directory(dir_name)
+    if not times:
+        raise FileNotFoundError("no subcluster*/OUTDOCK in {}".format(dir_name))
+    names = np.concatenate([s["mol_name"] for s in scores])
+    totals = np.concatenate([s["Total"] for s in scores])
+    keep = ~np.isnan(totals)
+    names, totals = best_scores(names[keep], totals[keep])
+    return times, label_scores(names, totals, ligands, decoys)
+
+def score_directories(directories, num_boot=200, alpha=0.05, seed=0, jobs=None):
+    """
+    AUC, LogAUC and bootstrap intervals of many run directories, all
+    directories are scored and resampled together
+    """
+    p = Pool(jobs)
+    try:
+        results = list(tqdm(p.imap(directory_run, directories), total=len(directories)))
+    finally:
+        p.close()
+        p.join()
+
+    runs = [run for _, run in results]
+    auc, log_auc = score_runs(runs)
+    ci = bootstrap_runs(runs, num_boot=num_boot, alpha=alpha, seed=seed)
+    return auc, log_auc, ci
+
+def write_scores(fn, directories, auc, log_auc, ci):
+    """
+    percent values formatted as the AUC / LogAUC of Extract.jl
+    """
+    with open(fn, "w+") as f:
+        f.write("dir_name\tauc\tlog_auc\tauc_lo\tauc_hi\tlog_auc_lo\tlog_auc_hi\n")
+        for i, d in enumerate(directories):
+            values = [auc[i], log_auc[i], ci["auc_lo"][i], ci["auc_hi"][i],
+                ci["log_auc_lo"][i], ci["log_auc_hi"][i]]
+            f.write("{}\t{}\n".format(d, "\t".join("{:.4f}".format(v * 100) for v in values)))
+
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-i", "--directories", nargs="+", required=True, type=str,
+        help="Run directories to score (subcluster*/OUTDOCK, ligands.names, decoys.names)"
+    )
+    p.add_argument(
+        "-o", "--output", default="enrichment.tab", required=False, type=str,
+        help="Output table"
+    )
+    p.add_argument(
+        "-b", "--bootstrap", default=200, required=False, type=int,
+        help="Number of bootstrap resamples for the confidence intervals (0 to skip)"
+    )
+    p.add_argument(
+        "-a", "--alpha", default=0.05, required=False, type=float,
+        help="Confidence intervals cover 1 - alpha"
+    )
+    p.add_argument(
+        "-s", "--seed", default=0, required=False, type=int,
+        help="Random seed of the resampling"
+    )
+    p.add_argument(
+        "-j", "--jobs", default=None, required=False, type=int,
+        help="Number of worker processes parsing OUTDOCKs (default: all cores)"
+    )
+    args = p.parse_args()
+    return args
+
+def main():
+    args = get_args()
+    directories = [d.rstrip("/") for d in args.directories if os.path.isdir(d)]
+    if len(directories) == 0:
+        sys.exit("ERROR : no run directories found")
+    auc, log_auc, ci = score_directories(
+        directories, num_boot=args.bootstrap, alpha=args.alpha,
+        seed=args.seed, jobs=args.jobs
+        )
+    write_scores(args.output, directories, auc, log_auc, ci)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import argparse
+import heapq
+import sys
+import os
+
+from Outdock import iter_outdock, subcluster_outdocks, to_float
+from Scheduler import Scheduler, write_failures, log_failures
+
+HITS_FN = "hits.tab"
+
+# molecules whose best score is kept exactly before the quantile is
+# estimated from ScoreCounts (about 250 bytes each)
+MAX_MOLECULES = 1 << 21
+
+def iter_records(dir_name):
+    """
+    (mol_name, Total, (sub_idx, cls_idx, mol_idx)) of every scored pose
+    of the subcluster OUTDOCKs of a run directory, read line by line
+    """
+    for fn in subcluster_outdocks(dir_name):
+        sub_idx = os.path.basename(os.path.dirname(fn))
+        for record in iter_outdock(fn):
+            if record[0] != "score":
+                continue
+            _, cls_idx, tokens = record
+            total = to_float(tokens[-1])
+            if np.isnan(total):
+                continue
+            mol_idx = int(tokens[0]) if tokens[0].isdigit() else -1
+            yield tokens[1], total, (sub_idx, cls_idx, mol_idx)
+
+class ScoreCounts:
+    """
+    Number of poses at each Total : OUTDOCK scores are printed with 2
+    decimals, so the table stays small whatever the library size
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.n = 0
+
+    def add(self, total):
+        self.counts[total] = self.counts.get(total, 0) + 1
+        self.n += 1
+
+    def quantile(self, q):
+        """
+        q quantile of the counted scores, as np.quantile of every score
+        """
+        if self.n == 0:
+            return np.nan
+        values = np.array(sorted(self.counts), dtype=np.float64)
+        ends = np.cumsum([self.counts[v] for v in values])
+        pos = q * (self.n - 1)
+        lo, hi = values[np.searchsorted(ends, [np.floor(pos), np.ceil(pos)], side="right")]
+        return lo + (hi - lo) * (pos - np.floor(pos))
+
+class BestScores:
+    """
+    Best (lowest) Total and pose location of every molecule, updated a
+    record at a time : the hash map holds one small tuple per molecule
+    instead of every pose of every subcluster. A pose replaces the best
+    one only when strictly lower, so ties keep the first pose read as the
+    stable sort of Extract.jl does.
+
+    Past max_molecules the map is dropped and only the ScoreCounts of
+    the poses are kept, so memory stops growing with the library. The
+    quantile then counts every pose of a molecule instead of its best
+    one, and select_hits reads the OUTDOCKs again for the hits.
+    """
+
+    def __init__(self, max_molecules=MAX_MOLECULES):
+        self.best = {}
+        self.max_molecules = max_molecules
+        self.counts = None
+
+    def __len__(self):
+        return len(self.best)
+
+    @property
+    def overflowed(self):
+        return self.counts is not None
+
+    def add(self, name, total, location):
+        if self.counts is not None:
+            self.counts.add(total)
+            return
+        current = self.best.get(name)
+        if current is None or total < current[0]:
+            self.best[name] = (total, location)
+            if len(self.best) > self.max_molecules:
+                self.counts = ScoreCounts()
+                for best, _ in self.best.values():
+                    self.counts.add(best)
+                self.best = {}
+
+    def quantile(self, q):
+        """
+        q quantile of the best scores (linear interpolation as quantile!
+        in Julia), found by selection rather than by sorting
+        """
+        if self.counts is not None:
+            return self.counts.quantile(q)
+        totals = np.fromiter((v[0] for v in self.best.values()), dtype=np.float64, count=len(self))
+        return np.quantile(totals, q) if totals.size else np.nan
+
+    def below(self, threshold):
+        return [
+            (name, total, location) for name, (total, location) in self.best.items()
+            if total < threshold
+            ]
+
+class TopScores:
+    """
+    The n molecules with the best Total, in memory bounded by n whatever
+    the library size : a max heap of the current members, and a map of
+    each member's best score. Heap entries made stale by a better pose
+    (or an eviction) are skipped when they reach the top and the heap is
+    compacted when stale entries outnumber the members.
+
+    An evicted molecule scored worse than n others, which can only
+    improve, so it is a hit again only through a better pose.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.members = {}
+        self.heap = []
+        self.count = 0
+
+    def __len__(self):
+        return len(self.members)
+
+    def threshold(self):
+        """
+        worst member score once full, a pose must beat it to enter
+        """
+        while self.heap and self.stale(self.heap[0]):
+            heapq.heappop(self.heap)
+        return -self.heap[0][0] if len(self.members) >= self.n else np.inf
+
+    def stale(self, entry):
+        member = self.members.get(entry[2])
+        return member is None or member[2] != entry[1]
+
+    def add(self, name, total, location):
+        member = self.members.get(name)
+        if member is not None:
+            if total >= member[0]:
+                return
+        elif total >= self.threshold():
+            return
+
+        self.count += 1
+        self.members[name] = (total, location, self.count)
+        heapq.heappush(self.heap, (-total, self.count, name))
+        if len(self.members) > self.n:
+            self.threshold()
+            _, _, evicted = heapq.heappop(self.heap)
+            del self.members[evicted]
+
+        if len(self.heap) > 2 * self.n + 16:
+            self.heap = [e for e in self.heap if not self.stale(e)]
+            heapq.heapify(self.heap)
+
+    def items(self):
+        return [(name, total, location) for name, (total, location, _) in self.members.items()]
+
+def select_hits(dir_name, fraction=0.1, top=None, max_molecules=MAX_MOLECULES):
+    """
+    hit molecules of a run directory as (mol_name, Total, location)
+    ordered by location : the best pose of every molecule below the
+    fraction quantile of the best scores (Extract.jl -q), or the top
+    best molecules when top is given
+    """
+    scores = BestScores(max_molecules) if top is None else TopScores(top)
+    for name, total, location in iter_records(dir_name):
+        scores.add(name, total, location)
+
+    if top is None and scores.overflowed:
+        # second pass : best pose of the molecules below the threshold only
+        threshold = scores.quantile(fraction)
+        scores = BestScores(np.inf)
+        for name, total, location in iter_records(dir_name):
+            if total < threshold:
+                scores.add(name, total, location)
+        hits = scores.below(threshold)
+    elif top is None:
+        hits = scores.below(scores.quantile(fraction))
+    else:
+        hits = scores.items()
+    hits.sort(key=lambda h : h[2])
+    return hits
+
+def write_hits(fn, hits):
+    with open(fn, "w+") as f:
+        f.write("sub_idx\tcls_idx\tmol_idx\tmol_name\tTotal\n")
+        f.writelines(
+            "{}\t{}\t{}\t{}\t{}\n".format(*location, name, total)
+            for name, total, location in hits
+            )
+
+class HitSelector:
+    """
+    writes the hits of a run directory to {dir_name}/hits.tab
+    """
+
+    def __init__(self, fraction=0.1, top=None, output=HITS_FN, max_molecules=MAX_MOLECULES):
+        self.fraction = fraction
+        self.top = top
+        self.output = output
+        self.max_molecules = max_molecules
+
+    def select(self, dir_name):
+        if not subcluster_outdocks(dir_name):
+            raise FileNotFoundError("no subcluster*/OUTDOCK in {}".format(dir_name))
+        hits = select_hits(dir_name, self.fraction, self.top, self.max_molecules)
+        write_hits(os.path.join(dir_name, self.output), hits)
+
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-i", "--directories", nargs="+", required=True, type=str,
+        help="Run directories to select hits from (each with subcluster*/OUTDOCK)"
+    )
+    p.add_argument(
+        "-q", "--quantile", default=0.1, required=False, type=float,
+        help="Hits are the molecules whose best Total is below this quantile (as Extract.jl -q)"
+    )
+    p.add_argument(
+        "-n", "--top", default=None, required=False, type=int,
+        help="Keep the N best molecules instead of a quantile (memory bounded by N)"
+    )
+    p.add_argument(
+        "-m", "--max_molecules", default=MAX_MOLECULES, required=False, type=int,
+        help="Molecules kept in memory for the exact quantile, larger runs count the scores of every pose and are read twice"
+    )
+    p.add_argument(
+        "-o", "--output", default=HITS_FN, required=False, type=str,
+        help="Name of the hit table written in each run directory"
+    )
+    p.add_argument(
+        "-j", "--jobs", default=None, required=False, type=int,
+        help="Number of worker processes (default: all cores)"
+    )
+    p.add_argument(
+        "--serial", action='store_true', required=False,
+        help="select in the main process (debugging)"
+    )
+    p.add_argument(
+        "-v", "--verbose", action='store_true', required=False,
+        help="increase verbosity"
+    )
+    args = p.parse_args()
+    return args
+
+def main():
+    args = get_args()
+    directories = [d.rstrip("/") for d in args.directories if os.path.isdir(d)]
+    if len(directories) == 0:
+        sys.exit("ERROR : no run directories found")
+
+    scheduler = Scheduler(jobs=args.jobs, serial=args.serial)
+    failures = scheduler.run(
+        HitSelector(args.quantile, args.top, args.output, args.max_molecules), "select",
+        [(d,) for d in directories], keys=directories
+        )
+    if failures:
+        write_failures("hits_failures.tab", failures)
+        log_failures(failures, verbose=args.verbose)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import re
+
+# key, spacing, value, trailing whitespace of a parameter line
+re_param = re.compile(r"^(\S+)([ \t]+)(\S.*?)?([ \t]*\r?\n?)$")
+
+# DOCK pads parameter names to this column
+KEY_WIDTH = 30
+
+class IndockTemplate:
+    """
+    An INDOCK parsed once into ordered entries :
+        parameter lines are kept as (key, prefix, value, suffix) so a
+        rendered INDOCK only differs in the values it overrides, comments
+        and blank lines are kept verbatim
+
+    render(overrides) writes a per-run variant, keys missing from the
+    template are inserted after an anchor key or appended at the end.
+    """
+
+    def __init__(self, lines):
+        self.entries = []
+        self.index = {}
+        for line in lines:
+            match = re_param.match(line) if not line.startswith("#") else None
+            if match is None or match.group(3) is None:
+                self.entries.append((None, line, None, ""))
+                continue
+
+            key, spacing, value, suffix = match.groups()
+            self.index.setdefault(key, []).append(len(self.entries))
+            self.entries.append((key, key + spacing, value, suffix))
+
+    @classmethod
+    def from_file(cls, input_fn):
+        with open(input_fn, "r") as f:
+            return cls(f.readlines())
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def get(self, key):
+        """
+        value of the first occurrence of key
+        """
+        _, _, value, _ = self.entries[self.index[key][0]]
+        return value
+
+    def map_values(self, func):
+        """
+        returns a template with func applied to every value
+        """
+        template = IndockTemplate([])
+        template.index = self.index
+        template.entries = [
+            (key, prefix, func(value) if key is not None else value, suffix)
+            for key, prefix, value, suffix in self.entries
+            ]
+        return template
+
+    def format_line(self, key, value):
+        return "{}{}\n".format(key.ljust(KEY_WIDTH), value)
+
+    def render(self, overrides=None, anchors=None):
+        """
+        INDOCK text with the values of overrides, anchors maps a new key
+        to the key it follows
+        """
+        overrides = overrides or {}
+        anchors = anchors or {}
+
+        inserts = {}
+        trailing = []
+        for key, value in overrides.items():
+            if key in self.index:
+                continue
+            anchor = anchors.get(key)
+            if anchor in self.index:
+                inserts.setdefault(self.index[anchor][-1], []).append(key)
+            else:
+                trailing.append(key)
+
+        lines = []
+        for idx, (key, prefix, value, suffix) in enumerate(self.entries):
+            if key is None:
+                lines.append(prefix)
+            else:
+                value = overrides.get(key, value)
+                lines.append("{}{}{}".format(prefix, value, suffix))
+            for new_key in inserts.get(idx, []):
+                lines.append(self.format_line(new_key, overrides[new_key]))
+
+        if trailing and lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        for new_key in trailing:
+            lines.append(self.format_line(new_key, overrides[new_key]))
+
+        return "".join(lines)
+
+    def write(self, output_fn, overrides=None, anchors=None):
+        with open(output_fn, "w+") as f:
+            f.write(self.render(overrides, anchors))
+
+def parse_overrides(pairs):
+    """
+    KEY=VALUE strings from the command line as an ordered dict
+    """
+    overrides = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep or not key.strip():
+            raise ValueError("expected KEY=VALUE, got {}".format(pair))
+        overrides[key.strip()] = value.strip()
+    return overrides
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+import argparse
+import subprocess
+import socket
+import shlex
+import time
+import sys
+import os
+
+from Outdock import outdock_elapsed
+from Scheduler import Scheduler, TaskFailure, write_failures, log_failures
+
+LOG_FN = "local_runs.tab"
+LOG_FIELDS = ["entry", "status", "seconds", "host", "stderr"]
+
+def read_dirlist(fn):
+    with open(fn, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def previous_times(log_fn, entries):
+    """
+    seconds of every entry in a previous runner log, entries missing from
+    it fall back to the elapsed time of their OUTDOCK
+    """
+    times = {}
+    if os.path.isfile(log_fn):
+        with open(log_fn, "r") as f:
+            header = next(f).rstrip("\n").split("\t")
+            for line in f:
+                row = dict(zip(header, line.rstrip("\n").split("\t")))
+                if row.get("status") == "0":
+                    times[row["entry"]] = float(row["seconds"])
+    for entry in entries:
+        if entry not in times:
+            elapsed = outdock_elapsed(os.path.join(entry, "OUTDOCK"))
+            if elapsed is not None:
+                times[entry] = elapsed
+    return times
+
+def longest_first(entries, times):
+    """
+    entries by decreasing previous time, entries without one go first
+    (as long as the longest known) in dirlist order
+    """
+    longest = max(times.values()) if times else 0.0
+    return sorted(entries, key=lambda e : -times.get(e, longest))
+
+def stderr_tail(fn, num_lines=3):
+    """
+    last lines of a stderr file on a single line, without the header
+    """
+    if not os.path.isfile(fn):
+        return "-"
+    with open(fn, "r", errors="replace") as f:
+        lines = [
+            line.strip() for line in f
+            if line.strip() and not line.startswith(("HOST:", "DOCK:"))
+            ]
+    return " | ".join(lines[-num_lines:]).replace("\t", " ") or "-"
+
+def run_entry(entry, command):
+    """
+    runs the command in one dirlist entry as rundock.csh does (output
+    written to {entry}/stderr after a HOST / DOCK header), returns
+    (entry, exit status, wall seconds, host, stderr tail)
+    """
+    host = socket.gethostname()
+    stderr_fn = os.path.join(entry, "stderr")
+    start = time.perf_counter()
+    try:
+        with open(stderr_fn, "w+") as f:
+            f.write("HOST: {}\n".format(host))
+            f.write("DOCK: {}\n".format(command[0]))
+            f.flush()
+            status = subprocess.run(command, cwd=entry, stdout=f, stderr=subprocess.STDOUT).returncode
+    except OSError as e:
+        # the stderr file itself may be what failed
+        status = -1
+        tail = "{}: {}".format(type(e).__name__, e).replace("\t", " ")
+    else:
+        tail = stderr_tail(stderr_fn)
+    seconds = time.perf_counter() - start
+    return entry, status, seconds, host, tail
+
+def dock_command(command):
+    """
+    command split into arguments, a relative executable that exists is
+    made absolute since every task runs in its own entry directory
+    """
+    args = shlex.split(command)
+    if os.path.isfile(args[0]):
+        args[0] = os.path.abspath(args[0])
+    return args
+
+class LocalRunner:
+    """
+    Runs the dock command of every dirlist entry on this machine, a
+    local stand in for the SGE array job of subdock.csh / rundock.csh
+
+    At most jobs commands run at once in the Scheduler workers (jobs=1
+    runs them one after the other in this process). Every task's exit
+    status, wall time and the tail of its stderr are appended to
+    local_runs.tab as it finishes, and failed entries are listed in
+    local_failures.tab.
+    With longest_first the entries start by decreasing time of their
+    previous run (that log or their OUTDOCK) so long tasks do not end
+    up alone at the end of the run. Dirlist entries that are not a
+    directory are not run and reported as failures.
+    """
+
+    failures_fn = "local_failures.tab"
+
+    def __init__(self, dirlist_fn, command, jobs=None, longest_first=False, log_fn=LOG_FN, verbose=False):
+        self.dirlist_fn = dirlist_fn
+        self.command = dock_command(command)
+        self.jobs = jobs
+        self.longest_first = longest_first
+        self.log_fn = log_fn
+        self.verbose = verbose
+
+    def run_entry(self, entry):
+        return run_entry(entry, self.command)
+
+    def entries(self):
+        """
+        entry directories to run and the dirlist entries that are not
+        a directory
+        """
+        entries = []
+        missing = []
+        for e in read_dirlist(self.dirlist_fn):
+            (entries if os.path.isdir(e) else missing).append(e)
+        if self.longest_first:
+            entries = longest_first(entries, previous_times(self.log_fn, entries))
+        return entries, missing
+
+    def run(self):
+        entries, missing = self.entries()
+        if len(entries) + len(missing) == 0:
+            sys.exit("ERROR : no dirlist entries found")
+
+        failures = [TaskFailure(e, "not a directory", None) for e in missing]
+        start = time.perf_counter()
+        work = []
+
+        with open(self.log_fn, "w+") as log:
+            log.write("\t".join(LOG_FIELDS) + "\n")
+
+            def record(key, result):
+                entry, status, seconds, host, tail = result
+                log.write("{}\t{}\t{:.3f}\t{}\t{}\n".format(entry, status, seconds, host, tail))
+                log.flush()
+                work.append(seconds)
+                if status != 0:
+                    failures.append(TaskFailure(
+                        entry, "exit status {} : {}".format(status, tail), None
+                        ))
+
+            # one command per worker, submitted in the order of entries
+            scheduler = Scheduler(jobs=self.jobs)
+            failures += scheduler.run(
+                self, "run_entry", [(e,) for e in entries], keys=entries, callback=record
+                )
+        wall = time.perf_counter() - start
+        total = sum(work)
+
+        if self.verbose:
+            print("LocalRunner : {} tasks, {:.1f}s of work in {:.1f}s".format(len(entries), total, wall))
+
+        if os.path.isfile(self.failures_fn):
+            os.remove(self.failures_fn)
+        if failures:
+            failures.sort(key=lambda f : f.key)
+            write_failures(self.failures_fn, failures)
+            log_failures(failures)
+            return False
+        return True
+
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-i", "--dirlist", default="dirlist", required=False, type=str,
+        help="dirlist of the entries to run (written by ClusterSpheres.py)"
+    )
+    p.add_argument(
+        "-c", "--command", default="dock64 INDOCK", required=False, type=str,
+        help="Command run in every entry directory (a stub for tests, e.g. \"sleep 1\")"
+    )
+    p.add_argument(
+        "-j", "--jobs", default=None, required=False, type=int,
+        help="Number of commands running at once (default: all cores)"
+    )
+    p.add_argument(
+        "-l", "--longest_first", action='store_true', required=False,
+        help="start entries by decreasing time of their previous run (local_runs.tab or OUTDOCK)"
+    )
+    p.add_argument(
+        "-o", "--log", default=LOG_FN, required=False, type=str,
+        help="Table of exit status, wall time and stderr tail of every entry"
+    )
+    p.add_argument(
+        "-v", "--verbose", action='store_true', required=False,
+        help="increase verbosity"
+    )
+    args = p.parse_args()
+    return args
+
+def main():
+    args = get_args()
+    if not os.path.isfile(args.dirlist):
+        sys.exit("ERROR : cannot find {}".format(args.dirlist))
+    runner = LocalRunner(
+        dirlist_fn = args.dirlist,
+        command = args.command,
+        jobs = args.jobs,
+        longest_first = args.longest_first,
+        log_fn = args.log,
+        verbose = args.verbose
+    )
+    if not runner.run():
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
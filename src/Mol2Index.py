@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import argparse
+import glob
+import zlib
+import sys
+import re
+import os
+
+from Scheduler import Scheduler, write_failures, log_failures
+
+# header lines of a DOCK pose, as read by ParseMol2 in Extract.jl
+re_header = re.compile(rb"^#+ +(Name|Number|OXR|Total Energy):? *(.*?) *$", re.M)
+
+INDEX_FN = "mol2_index.npz"
+CHUNK_SIZE = 1 << 20
+
+# suffix of the checkpointed copies written by -c
+RECHUNKED = ".rechunked.mol2.gz"
+
+def mol2_files(subdir):
+    """
+    mol2.gz files written by DOCK in a subcluster directory
+    """
+    return sorted(
+        fn for fn in glob.glob(os.path.join(subdir, "test.*.mol2.gz"))
+        if not fn.endswith(RECHUNKED)
+        )
+
+def rechunked_fn(fn):
+    return fn[:-len(".mol2.gz")] + RECHUNKED
+
+def file_signature(fn):
+    st = os.stat(fn)
+    return "{}:{}".format(st.st_size, st.st_mtime_ns)
+
+def iter_members(f, chunk_size=CHUNK_SIZE):
+    """
+    decompressed blocks of a (multi member) gzip stream from the current
+    position of f, as (compressed offset of the member, block)
+    """
+    coffset = f.tell()
+    consumed = coffset
+    d = zlib.decompressobj(31)
+    fresh = True
+    pending = b""
+    while True:
+        data = pending or f.read(chunk_size)
+        pending = b""
+        # zero padding after the last member is not a member
+        if not data or (fresh and not data.strip(b"\0")):
+            return
+        fresh = False
+        out = d.decompress(data)
+        if out:
+            yield coffset, out
+        if d.eof:
+            rest = d.unused_data
+            consumed += len(data) - len(rest)
+            coffset = consumed
+            d = zlib.decompressobj(31)
+            fresh = True
+            pending = rest
+        else:
+            consumed += len(data)
+
+class PoseScanner:
+    """
+    Collects the poses of a decompressed mol2 stream fed in blocks :
+    stream offset of every Name line, molecule number, Total energy and
+    the first 4 OXR sphere coordinates
+    """
+
+    def __init__(self):
+        self.tail = b""
+        self.base = 0
+        self.offsets = []
+        self.names = []
+        self.numbers = []
+        self.totals = []
+        self.oxr = []
+
+    def feed(self, block, final=False):
+        data = self.tail + block
+        end = len(data) if final else data.rfind(b"\n") + 1
+        for m in re_header.finditer(data, 0, end):
+            field, value = m.group(1), m.group(2)
+            if field == b"Name":
+                self.offsets.append(self.base + m.start())
+                self.names.append(value.decode())
+                self.numbers.append(-1)
+                self.totals.append(np.nan)
+                self.oxr.append([])
+            elif not self.offsets:
+                continue
+            elif field == b"Number":
+                self.numbers[-1] = int(value)
+            elif field == b"Total Energy":
+                self.totals[-1] = float(value)
+            elif len(self.oxr[-1]) < 4:
+                self.oxr[-1].append([float(v) for v in value.split()[:3]])
+        self.tail = data[end:]
+        self.base += end
+
+    def coordinates(self):
+        oxr = np.full((len(self.oxr), 4, 3), np.nan)
+        for i, spheres in enumerate(self.oxr):
+            if spheres:
+                oxr[i, :len(spheres)] = spheres
+        return oxr
+
+def scan_file(fn, checkpoint=None, in_place=False):
+    """
+    poses and gzip members of a mol2.gz, with checkpoint (bytes) a copy
+    test.*.rechunked.mol2.gz is written with a new member every
+    checkpoint uncompressed bytes at pose boundaries (the decompressed
+    content is unchanged), or fn itself is rewritten with in_place
+
+    returns (scanner, members, indexed_fn) where members is (compressed
+    offset, stream offset) of every member start of indexed_fn, the file
+    the poses are read from
+    """
+    scanner = PoseScanner()
+    members = []
+    with open(fn, "rb") as f:
+        for coffset, block in iter_members(f):
+            if not members or members[-1][0] != coffset:
+                members.append((coffset, scanner.base + len(scanner.tail)))
+            scanner.feed(block)
+        scanner.feed(b"", final=True)
+
+    indexed_fn = fn
+    if checkpoint:
+        indexed_fn = fn if in_place else rechunked_fn(fn)
+        members = rechunk(fn, scanner.offsets, scanner.base, checkpoint, indexed_fn)
+    return scanner, np.array(members, dtype=np.int64).reshape(-1, 2), indexed_fn
+
+def stream_checksum(fn):
+    """
+    (length, crc32) of the decompressed stream of a mol2.gz
+    """
+    length = 0
+    crc = 0
+    with open(fn, "rb") as f:
+        for _, block in iter_members(f):
+            length += len(block)
+            crc = zlib.crc32(block, crc)
+    return length, crc
+
+def rechunk(fn, offsets, length, checkpoint, out_fn=None):
+    """
+    writes fn to out_fn (fn itself by default) as gzip members starting
+    at pose offsets about every checkpoint bytes, returns the new member
+    table
+
+    The new file is decompressed again and only moved to out_fn when its
+    length and crc32 match the original stream, otherwise out_fn is left
+    untouched.
+    """
+    out_fn = out_fn or fn
+    cuts = [0]
+    for off in offsets:
+        if off - cuts[-1] >= checkpoint:
+            cuts.append(off)
+    cuts.append(length)
+
+    members = []
+    tmp_fn = out_fn + ".tmp"
+    src_length = 0
+    src_crc = 0
+    try:
+        with open(fn, "rb") as src, open(tmp_fn, "wb") as dst:
+            stream = iter_members(src)
+            buf = b""
+            for start, stop in zip(cuts[:-1], cuts[1:]):
+                while len(buf) < stop - start:
+                    buf += next(stream)[1]
+                chunk = buf[:stop - start]
+                members.append((dst.tell(), start))
+                c = zlib.compressobj(6, zlib.DEFLATED, 31)
+                dst.write(c.compress(chunk) + c.flush())
+                src_length += len(chunk)
+                src_crc = zlib.crc32(chunk, src_crc)
+                buf = buf[stop - start:]
+            # anything past the scanned length is part of the original too
+            for _, block in stream:
+                buf += block
+            src_length += len(buf)
+            src_crc = zlib.crc32(buf, src_crc)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        if stream_checksum(tmp_fn) != (src_length, src_crc):
+            raise RuntimeError("rechunked {} does not match the original, {} left unchanged".format(fn, out_fn))
+    except BaseException:
+        if os.path.isfile(tmp_fn):
+            os.remove(tmp_fn)
+        raise
+    os.replace(tmp_fn, out_fn)
+    return members
+
+class Mol2Index:
+    """
+    Persistent pose index of the mol2.gz files of a subcluster directory
+
+    Every pose is located by (file, gzip member, offset and length within
+    the member stream) next to its name, number, Total energy and OXR
+    sphere coordinates. Fetching a pose decompresses from the start of
+    its member only, so files rewritten with checkpoints (-c) are read a
+    few blocks per pose instead of from the start of the file. Poses are
+    read from files (the rechunked copies with -c) and the index is kept
+    current against sources, the DOCK outputs.
+    """
+
+    def __init__(self, subdir, arrays):
+        self.subdir = subdir
+        self.arrays = arrays
+        self.files = list(arrays["files"])
+        self.sources = list(arrays["sources"])
+
+        # name -> rows of its poses
+        names = arrays["name"]
+        order = np.argsort(names, kind="stable")
+        uniques, starts = np.unique(names[order], return_index=True)
+        self.rows = dict(zip(uniques.tolist(), np.split(order, starts[1:])))
+
+    @staticmethod
+    def index_fn(subdir):
+        return os.path.join(subdir, INDEX_FN)
+
+    @classmethod
+    def load(cls, subdir):
+        with np.load(cls.index_fn(subdir)) as data:
+            return cls(subdir, {name : data[name] for name in data.files})
+
+    @classmethod
+    def is_current(cls, subdir, checkpoint=None):
+        """
+        index exists, was built with the given checkpoint (any without
+        one) and every mol2.gz it reads or indexes is unchanged since
+        """
+        fn = cls.index_fn(subdir)
+        if not os.path.isfile(fn):
+            return False
+        with np.load(fn) as data:
+            if "sources" not in data.files:
+                return False
+            sources = [os.path.join(subdir, f) for f in data["sources"]]
+            files = [os.path.join(subdir, f) for f in data["files"]]
+            signatures = list(data["signatures"]) + list(data["file_signatures"])
+            built = int(data["checkpoint"])
+        if checkpoint and built != checkpoint:
+            return False
+        if sources != mol2_files(subdir) or not all(os.path.isfile(f) for f in files):
+            return False
+        return signatures == [file_signature(f) for f in sources + files]
+
+    @classmethod
+    def build(cls, subdir, checkpoint=None, in_place=False):
+        columns = {n : [] for n in ["file_idx", "offset", "length", "name", "number", "total", "oxr"]}
+        sources = mol2_files(subdir)
+        files = []
+        member_tables = []
+        for i, fn in enumerate(sources):
+            scanner, members, indexed_fn = scan_file(fn, checkpoint, in_place)
+            files.append(indexed_fn)
+            offsets = np.array(scanner.offsets, dtype=np.int64)
+            columns["file_idx"].append(np.full(offsets.size, i, dtype=np.int32))
+            columns["offset"].append(offsets)
+            columns["length"].append(np.diff(np.append(offsets, scanner.base)))
+            columns["name"].append(np.array(scanner.names, dtype=str))
+            columns["number"].append(np.array(scanner.numbers, dtype=np.int64))
+            columns["total"].append(np.array(scanner.totals, dtype=np.float64))
+            columns["oxr"].append(scanner.coordinates())
+            member_tables.append(np.column_stack([np.full(members.shape[0], i), members]))
+
+        arrays = {
+            n : np.concatenate(v) if v else np.zeros(0) for n, v in columns.items()
+        }
+        if not sources:
+            arrays["oxr"] = np.zeros((0, 4, 3))
+            arrays["name"] = np.zeros(0, dtype=str)
+        arrays["members"] = np.concatenate(member_tables) if member_tables \
+            else np.zeros((0, 3), dtype=np.int64)
+        arrays["files"] = np.array([os.path.basename(f) for f in files], dtype=str)
+        arrays["sources"] = np.array([os.path.basename(f) for f in sources], dtype=str)
+        arrays["signatures"] = np.array([file_signature(f) for f in sources], dtype=str)
+        arrays["file_signatures"] = np.array([file_signature(f) for f in files], dtype=str)
+        arrays["checkpoint"] = np.int64(checkpoint or 0)
+
+        tmp_fn = cls.index_fn(subdir) + ".tmp.npz"
+        np.savez(tmp_fn, **arrays)
+        os.replace(tmp_fn, cls.index_fn(subdir))
+        return cls(subdir, arrays)
+
+    def __len__(self):
+        return self.arrays["offset"].size
+
+    def lookup(self, name=None, number=None, file=None):
+        """
+        rows of the poses matching every given field, file is the name
+        of the DOCK output or of its rechunked copy
+        """
+        if name is not None:
+            rows = self.rows.get(name, np.zeros(0, dtype=np.int64))
+        else:
+            rows = np.arange(len(self))
+        if number is not None:
+            rows = rows[self.arrays["number"][rows] == number]
+        if file is not None:
+            file_idx = self.sources.index(file) if file in self.sources else self.files.index(file)
+            rows = rows[self.arrays["file_idx"][rows] == file_idx]
+        return rows
+
+    def member(self, row):
+        """
+        (compressed offset, stream offset) of the member holding a pose
+        """
+        members = self.arrays["members"]
+        own = members[members[:, 0] == self.arrays["file_idx"][row]]
+        i = np.searchsorted(own[:, 2], self.arrays["offset"][row], side="right") - 1
+        return own[i, 1], own[i, 2]
+
+    def fetch(self, rows):
+        """
+        mol2 text of the poses at rows, poses sharing a member are read
+        with a single decompression
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        poses = [None] * rows.size
+        plan = {}
+        for i, row in enumerate(rows):
+            coffset, ustart = self.member(row)
+            plan.setdefault((self.arrays["file_idx"][row], coffset, ustart), []).append((i, row))
+
+        for (file_idx, coffset, ustart), wanted in sorted(plan.items()):
+            stop = max(self.arrays["offset"][r] + self.arrays["length"][r] for _, r in wanted) - ustart
+            buf = bytearray()
+            with open(os.path.join(self.subdir, self.files[file_idx]), "rb") as f:
+                f.seek(coffset)
+                for _, block in iter_members(f):
+                    buf += block
+                    if len(buf) >= stop:
+                        break
+            for i, row in wanted:
+                start = self.arrays["offset"][row] - ustart
+                poses[i] = bytes(buf[start:start + self.arrays["length"][row]]).decode()
+        return poses
+
+class Mol2Indexer:
+    """
+    builds the pose index of every subcluster directory of the given
+    run directories, one task per subcluster
+    """
+
+    def __init__(self, checkpoint=None, force=False, in_place=False):
+        self.checkpoint = checkpoint
+        self.force = force
+        self.in_place = in_place
+
+    def index(self, subdir):
+        if self.force or not Mol2Index.is_current(subdir, self.checkpoint):
+            Mol2Index.build(subdir, self.checkpoint, self.in_place)
+
+def subcluster_dirs(directories):
+    return [
+        s for d in directories
+        for s in sorted(glob.glob(os.path.join(d, "subcluster*")))
+        if os.path.isdir(s)
+        ]
+
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-i", "--directories", nargs="+", required=True, type=str,
+        help="Run directories to index (each with subcluster*/test.*.mol2.gz)"
+    )
+    p.add_argument(
+        "-c", "--checkpoint", default=None, required=False, type=int,
+        help="Write a copy test.*.rechunked.mol2.gz of each mol2.gz with a gzip member every CHECKPOINT "
+             "uncompressed bytes (at pose boundaries, content unchanged and verified by length and crc32) "
+             "and index it, so poses are read without decompressing from the start"
+    )
+    p.add_argument(
+        "--in_place", action='store_true', required=False,
+        help="with -c, replace each DOCK mol2.gz by its verified rechunked file instead of writing a copy"
+    )
+    p.add_argument(
+        "-f", "--force", action='store_true', required=False,
+        help="rebuild indices that are up to date"
+    )
+    p.add_argument(
+        "-j", "--jobs", default=None, required=False, type=int,
+        help="Number of worker processes (default: all cores)"
+    )
+    p.add_argument(
+        "--serial", action='store_true', required=False,
+        help="index in the main process (debugging)"
+    )
+    p.add_argument(
+        "-v", "--verbose", action='store_true', required=False,
+        help="increase verbosity"
+    )
+    args = p.parse_args()
+    return args
+
+def main():
+    args = get_args()
+    if args.in_place and not args.checkpoint:
+        sys.exit("ERROR : --in_place needs -c")
+    subdirs = subcluster_dirs([d.rstrip("/") for d in args.directories if os.path.isdir(d)])
+    if len(subdirs) == 0:
+        sys.exit("ERROR : no subcluster directories found")
+
+    scheduler = Scheduler(jobs=args.jobs, serial=args.serial)
+    failures = scheduler.run(
+        Mol2Indexer(args.checkpoint, args.force, args.in_place), "index",
+        [(s,) for s in subdirs], keys=subdirs
+        )
+    if failures:
+        write_failures("mol2_index_failures.tab", failures)
+        log_failures(failures, verbose=args.verbose)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import argparse
+import glob
+import sys
+import re
+import os
+from operator import itemgetter
+from tqdm import tqdm
+from multiprocess import Pool
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# same line rules as ParseOUTDOCK in Extract.jl
+re_header = re.compile(r"mol#")
+re_elapsed = re.compile(r"elapsed")
+re_values = re.compile(r"^ +[0-9]")
+IGNORE_WORDS = ("colors", "skip_size", "poses", "<", ">", "no_match", "bump", "clashes")
+re_seconds = re.compile(r"elapsed.+\(sec\): +([0-9.eE+-]+)")
+
+# OUTDOCK score line columns : (name, dtype), text columns are fixed
+# width unicode arrays so worker results pickle as flat buffers
+SCORE_FIELDS = [
+    ("mol_idx", np.int64),
+    ("mol_name", str),
+    ("flex_code", str),
+    ("matched", np.int64),
+    ("nscored", np.int64),
+    ("time", np.float64),
+    ("hac", np.int64),
+    ("setnum", np.int64),
+    ("matnum", np.int64),
+    ("rank", np.int64),
+    ("cloud", np.int64),
+    ("elect", np.float64),
+    ("gist", np.float64),
+    ("vdW", np.float64),
+    ("psol", np.float64),
+    ("asol", np.float64),
+    ("inter", np.float64),
+    ("rec_e", np.float64),
+    ("rec_d", np.float64),
+    ("r_hyd", np.float64),
+    ("Total", np.float64)
+]
+NUM_FIELDS = len(SCORE_FIELDS)
+NUMERIC_IDX = [i for i, (_, dtype) in enumerate(SCORE_FIELDS) if dtype is not str]
+TEXT_IDX = [i for i, (_, dtype) in enumerate(SCORE_FIELDS) if dtype is str]
+
+# score lines are converted to typed columns this many at a time
+CHUNK_ROWS = 1 << 16
+
+def ignored(line):
+    """
+    lines ParseOUTDOCK ignores, as plain substring tests since a regex
+    alternation costs more than the rest of the parse
+    """
+    for word in IGNORE_WORDS:
+        if word in line:
+            return True
+    return line.startswith(" 9")
+
+def iter_outdock(fn):
+    """
+    yields ("score", group, tokens) for every score line and
+    ("elapsed", seconds) for the final timing line, score lines without
+    NUM_FIELDS columns are skipped with a warning
+    """
+    group = 0
+    skipped = 0
+    with open(fn, "r", errors="replace") as f:
+        for line in f:
+            # score lines first, they are nearly every line
+            if re_values.match(line):
+                if ignored(line):
+                    continue
+                tokens = line.split()
+                if len(tokens) == NUM_FIELDS:
+                    yield "score", group, tokens
+                else:
+                    skipped += 1
+            elif re_header.search(line):
+                group += 1
+            elif re_elapsed.search(line):
+                match = re_seconds.search(line)
+                if match:
+                    yield "elapsed", float(match.group(1))
+    if skipped:
+        print("WARNING : {} score lines of {} do not have {} columns and were skipped".format(
+            skipped, fn, NUM_FIELDS
+            ))
+
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+def as_numeric(tokens):
+    """
+    float64 array of string tokens, values that do not parse (fortran
+    ***** overflows) are nan
+    """
+    try:
+        return np.array(tokens, dtype=np.float64)
+    except ValueError:
+        return np.array([to_float(v) for v in tokens], dtype=np.float64)
+
+class ScoreBuffer:
+    """
+    per-column buffers of the score lines of one chunk : the numeric
+    tokens of every line go to one flat list and the text tokens to one
+    list per column, flush converts them to typed columns and empties
+    the buffer
+    """
+
+    def __init__(self):
+        self.numeric_tokens = itemgetter(*NUMERIC_IDX)
+        self.clear()
+
+    def clear(self):
+        self.groups = []
+        self.numeric = []
+        self.text = [[] for _ in TEXT_IDX]
+
+    def __len__(self):
+        return len(self.groups)
+
+    def add(self, group, tokens):
+        self.groups.append(group)
+        self.numeric.extend(self.numeric_tokens(tokens))
+        for column, idx in zip(self.text, TEXT_IDX):
+            column.append(tokens[idx])
+
+    def flush(self):
+        """
+        typed columns of the buffered lines, cls_idx and every
+        SCORE_FIELDS name in order, unparsed integers are -1
+        """
+        numeric = as_numeric(self.numeric).reshape(len(self.groups), len(NUMERIC_IDX))
+        values = {}
+        for col, idx in enumerate(NUMERIC_IDX):
+            name, dtype = SCORE_FIELDS[idx]
+            column = numeric[:, col]
+            if dtype is not np.float64:
+                column = np.where(np.isnan(column), -1, column)
+            values[name] = column.astype(dtype)
+        for column, idx in zip(self.text, TEXT_IDX):
+            values[SCORE_FIELDS[idx][0]] = np.array(column, dtype=str)
+
+        columns = {"cls_idx" : np.array(self.groups, dtype=np.int32)}
+        for name, _ in SCORE_FIELDS:
+            columns[name] = values[name]
+        self.clear()
+        return columns
+
+def empty_columns():
+    columns = {"cls_idx" : np.zeros(0, dtype=np.int32)}
+    for name, dtype in SCORE_FIELDS:
+        columns[name] = np.zeros(0, dtype=dtype)
+    return columns
+
+def iter_chunks(fn, chunk_rows=CHUNK_ROWS):
+    """
+    yields ("scores", columns) for every chunk_rows score lines of an
+    OUTDOCK (typed columns, see ScoreBuffer.flush) and ("elapsed",
+    seconds) for the final timing line
+    """
+    buffer = ScoreBuffer()
+    for record in iter_outdock(fn):
+        if record[0] == "score":
+            buffer.add(record[1], record[2])
+            if len(buffer) == chunk_rows:
+                yield "scores", buffer.flush()
+        else:
+            if len(buffer):
+                yield "scores", buffer.flush()
+            yield record
+    if len(buffer):
+        yield "scores", buffer.flush()
+
+def parse_outdock(fn, chunk_rows=CHUNK_ROWS):
+    """
+    parses one OUTDOCK into typed columns
+
+    returns (columns, elapsed) where columns maps cls_idx and every
+    SCORE_FIELDS name to an array and elapsed is the run time in seconds
+    (nan if the run did not finish). Only one chunk of score lines is
+    held as strings.
+    """
+    chunks = []
+    elapsed = np.nan
+    for record in iter_chunks(fn, chunk_rows):
+        if record[0] == "scores":
+            chunks.append(record[1])
+        else:
+            elapsed = record[1]
+
+    if not chunks:
+        return empty_columns(), elapsed
+    if len(chunks) == 1:
+        return chunks[0], elapsed
+    return {name : np.concatenate([c[name] for c in chunks]) for name in chunks[0]}, elapsed
+
+def outdock_elapsed(fn, tail=4096):
+    """
+    elapsed seconds of a finished OUTDOCK (read from its last bytes), or None
+    """
+    if not os.path.isfile(fn):
+        return None
+    with open(fn, "rb") as f:
+        f.seek(max(0, os.path.getsize(fn) - tail))
+        text = f.read().decode(errors="replace")
+    match = re_seconds.search(text)
+    return float(match.group(1)) if match else None
+
+def subcluster_outdocks(dir_name):
+    return sorted(glob.glob(os.path.join(dir_name, "subcluster*", "OUTDOCK")))
+
+def parse_directory(dir_name):
+    """
+    scores and timings of every subcluster OUTDOCK of a run directory
+    """
+    scores = []
+    times = []
+    for fn in subcluster_outdocks(dir_name):
+        sub_idx = os.path.basename(os.path.dirname(fn))
+        columns, elapsed = parse_outdock(fn)
+        n = columns["cls_idx"].size
+        columns["dir_name"] = np.full(n, dir_name)
+        columns["sub_idx"] = np.full(n, sub_idx)
+        scores.append(columns)
+        times.append((dir_name, sub_idx, elapsed))
+    return dir_name, scores, times
+
+class ColumnWriter:
+    """
+    appends column blocks to a Parquet file (strings dictionary encoded),
+    or to a tab separated file when pyarrow is not installed
+    """
+
+    def __init__(self, fn, fmt="parquet"):
+        self.fn = fn
+        self.fmt = fmt
+        self.writer = None
+        self.handle = None
+
+    def table(self, columns):
+        return pa.table({
+            name : pa.array(values, type=pa.string()).dictionary_encode()
+                if values.dtype.kind in "OU" else pa.array(values)
+            for name, values in columns.items()
+        })
+
+    def write(self, columns):
+        if self.fmt == "parquet":
+            table = self.table(columns)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.fn, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+            return
+
+        names = list(columns)
+        if self.handle is None:
+            self.handle = open(self.fn, "w+")
+            self.handle.write("\t".join(names) + "\n")
+        self.handle.writelines(
+            "\t".join(map(str, row)) + "\n" for row in zip(*columns.values())
+            )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.handle is not None:
+            self.handle.close()
+
+def output_format(fmt):
+    if fmt == "parquet" and pa is None:
+        print("WARNING : pyarrow is not installed, writing tab separated files")
+        return "tab"
+    return fmt
+
+def parse_subcluster(fn):
+    """
+    typed score chunks and elapsed seconds of one subcluster OUTDOCK,
+    labelled with its run directory and subcluster
+    """
+    dir_name = os.path.dirname(os.path.dirname(fn))
+    sub_idx = os.path.basename(os.path.dirname(fn))
+    chunks = []
+    elapsed = np.nan
+    for record in iter_chunks(fn):
+        if record[0] == "scores":
+            n = record[1]["cls_idx"].size
+            columns = {
+                "dir_name" : np.full(n, dir_name),
+                "sub_idx" : np.full(n, sub_idx)
+            }
+            columns.update(record[1])
+            chunks.append(columns)
+        else:
+            elapsed = record[1]
+    return (dir_name, sub_idx, elapsed), chunks
+
+def extract(directories, prefix, fmt="parquet", jobs=None):
+    """
+    streams the OUTDOCKs of every run directory into
+    {prefix}.scores and {prefix}.time, each OUTDOCK is parsed in a
+    worker and its score chunks are written one at a time
+    """
+    fmt = output_format(fmt)
+    ext = "parquet" if fmt == "parquet" else "tab"
+    score_writer = ColumnWriter("{}.scores.{}".format(prefix, ext), fmt)
+    time_writer = ColumnWriter("{}.time.{}".format(prefix, ext), fmt)
+
+    outdocks = [fn for d in directories for fn in subcluster_outdocks(d)]
+    times = []
+    p = Pool(jobs)
+    try:
+        for t, chunks in tqdm(p.imap(parse_subcluster, outdocks), total=len(outdocks)):
+            for columns in chunks:
+                score_writer.write(columns)
+            times.append(t)
+        if times:
+            time_writer.write({
+                "dir_name" : np.array([t[0] for t in times], dtype=str),
+                "sub_idx" : np.array([t[1] for t in times], dtype=str),
+                "elapsed" : np.array([t[2] for t in times], dtype=np.float64)
+            })
+    finally:
+        p.close()
+        p.join()
+        score_writer.close()
+        time_writer.close()
+
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-i", "--directories", nargs="+", required=True, type=str,
+        help="Run directories to extract (each with subcluster*/OUTDOCK)"
+    )
+    p.add_argument(
+        "-o", "--output", default="outdock", required=False, type=str,
+        help="Output prefix, writes PREFIX.scores.parquet and PREFIX.time.parquet"
+    )
+    p.add_argument(
+        "-t", "--format", default="parquet", required=False, type=str,
+        choices=["parquet", "tab"],
+        help="Output format (tab is used if pyarrow is not installed)"
+    )
+    p.add_argument(
+        "-j", "--jobs", default=None, required=False, type=int,
+        help="Number of worker processes (default: all cores)"
+    )
+    args = p.parse_args()
+    return args
+
+def main():
+    args = get_args()
+    directories = [d.rstrip("/") for d in args.directories if os.path.isdir(d)]
+    if len(directories) == 0:
+        sys.exit("ERROR : no run directories found")
+    extract(directories, args.output, fmt=args.format, jobs=args.jobs)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 
 
-import numpy as np
-import pandas as pd
+import argparse
+import time
+from functools import lru_cache, wraps
 
 
 import plotly.express as px
@@ -16,51 +17,36 @@ import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output
 
-pio.templates.default = "plotly_white"
-
-def select_sign(x):
-
-    # PC change must be greater than 0
-    if x.baseline_logAUC < x.log_auc:
-
-        if x.pc_enrich < 0:
-            return x.pc_enrich * -1
+from Analysis import run_means, box_stats, sample_rows
+from DataStore import DataStore
 
-        else:
-            return x.pc_enrich
-
-    # PC Change must be less than 0
-    else:
-        if x.pc_enrich > 0:
-            return x.pc_enrich * -1
-        else:
-            return x.pc_enrich
-
-def calculate_enrichment(frame):
-    frame['pc_enrich'] = (frame.log_auc - frame.baseline_logAUC) / np.abs(frame.baseline_logAUC)
-    frame['pc_enrich'] = frame.apply(
-        lambda x : select_sign(x),
-        axis = 1
-    )
+pio.templates.default = "plotly_white"
 
-    return frame
-
-def calculate_speedup(frame):
-    frame['speedup'] = frame.baseline_time / frame.time
-    return frame
-
-def generate_baseline(frame):
-    baseline_frame = frame[frame.k == 1].\
-        groupby(['receptor', 'match_type']).\
-        apply(
-            lambda x : pd.Series({
-                "baseline_AUC" : x.auc.mean(),
-                "baseline_logAUC" : x.log_auc.mean(),
-                "baseline_time" : x.time.mean()
-            })
-        ).\
-        reset_index()
-    return baseline_frame
+# rendered figures kept per callback, keyed by the callback inputs
+FIGURE_CACHE = 128
+
+# outlier points drawn per summary figure
+MAX_OUTLIERS = 5000
+
+# print the render time and JSON size of every figure (set in main)
+REPORT = False
+
+def report_figure(func):
+    """
+    reports render latency and payload size of a figure callback
+    """
+    @wraps(func)
+    def wrapper(*args):
+        start = time.perf_counter()
+        fig = func(*args)
+        if REPORT:
+            render = time.perf_counter() - start
+            payload = len(fig.to_json())
+            print("{}{} : {:.3f}s, {:.1f} KB".format(
+                func.__name__, args, render, payload / 1024
+                ))
+        return fig
+    return wrapper
 
 def make_box(subframe, x_val, y_val, rec, match_type, v = False, showlegend=False):
     d = {
@@ -84,49 +70,10 @@ def make_box(subframe, x_val, y_val, rec, match_type, v = False, showlegend=Fals
 
     return trace
 
-def load_timescores(fn):
-    # Load in time/enrichment data
-    time_scores = pd.read_csv(fn, sep="\t")
-
-    # Define K from cluster_id
-    time_scores['k'] = time_scores.cluster_id.apply(lambda x : int(x.split("_")[0][1:]))
-
-    # build baseline statistics frame
-    baseline_frame = generate_baseline(time_scores)
-
-    # merge time/scores with baseline
-    time_scores = time_scores.merge(baseline_frame)
-
-    # calculate logAUC enrichment
-    time_scores = calculate_enrichment(time_scores)
-
-    # calculate speedup
-    time_scores = calculate_speedup(time_scores)
-
-    return time_scores
-
-def load_msframe(fn):
-    ms_frame = pd.read_csv(fn, sep="\t")
-    ms_frame['ms_id'] = ms_frame.ms_id.apply(lambda x : "sph.{}".format(x))
-    return ms_frame
-
-def load_cooccurrence(fn):
-    cooc_frame = pd.read_csv(fn, sep="\t")
-    return cooc_frame
-
 app = dash.Dash(__name__)
 
-
-time_scores = load_timescores("../data/merged_time_and_enrichment.tab")
-ms_frame = load_msframe("../data/sphere_usage.tab")
-cooc_frame = load_cooccurrence("../data/co-occurrence.tab")
-
-# unique receptors
-receptors = time_scores.receptor.unique()
-
-# cluster ids
-cluster_ids = sorted(ms_frame.cluster_id.unique())
-
+# tables are read on first use, the data directory is set in main
+store = DataStore("../data")
 
 
 app.layout = html.Div([
@@ -144,13 +91,19 @@ app.layout = html.Div([
 )
 def render_content(tab):
 
+    # unique receptors
+    receptors = store.receptors() if tab != 'tab-1' else []
+
+    # cluster ids
+    cluster_ids = store.cluster_ids() if tab == 'tab-3' else []
+
     t1 = html.Div([
         html.Div([
             html.Div([
                 dcc.RadioItems(
                     id = "Aggregate",
-                    options = [{'label' : m, 'value' : m} for m in ["Aggregate", "All"]],
-                    value = "All",
+                    options = [{'label' : m, 'value' : m} for m in ["Aggregate", "Summary", "All"]],
+                    value = "Summary",
                     style={'float' : 'left', "width" : "100%", 'display' : 'block'}
                 )
             ])
@@ -240,23 +193,51 @@ def render_content(tab):
 # Global Enrichment and Timing Statistics #
 ###########################################
 
-agg_scores = time_scores.\
-    groupby(['receptor','k', 'match_type']).\
-    apply(
-        lambda x : pd.Series({
-            "AggEnrichMean" : x.pc_enrich.mean(),
-            "AggEnrichMax" : x.pc_enrich.max(),
-            "AggSpeedupMean" : x.speedup.mean(),
-            "AggSpeedupMax" : x.speedup.max()
-        })
-    ).reset_index().\
-    melt(id_vars = ['k', 'receptor', 'match_type'])
+def summary_box(frame, y_val):
+    """
+    box plot of y_val per k, receptor and match type from statistics
+    computed here : the browser gets one box per group and the outliers
+    (downsampled to MAX_OUTLIERS) as a WebGL scatter, not every row
+    """
+    boxes, outliers = box_stats(frame, ['match_type', 'receptor', 'k'], y_val)
+    outliers = sample_rows(outliers, MAX_OUTLIERS)
+    match_types = sorted(boxes.match_type.unique())
+    receptors = sorted(boxes.receptor.unique())
+    colors = px.colors.qualitative.Plotly
+
+    fig = make_subplots(
+        rows = max(len(match_types), 1), cols = 1, shared_xaxes = True,
+        row_titles = ["match_type={}".format(m) for m in match_types]
+    )
+    for row, mt in enumerate(match_types, 1):
+        for i, rec in enumerate(receptors):
+            color = colors[i % len(colors)]
+            b = boxes[(boxes.match_type == mt) & (boxes.receptor == rec)]
+            o = outliers[(outliers.match_type == mt) & (outliers.receptor == rec)]
+            fig.add_trace(go.Box(
+                x = b.k, q1 = b.q1, median = b['median'], q3 = b.q3,
+                lowerfence = b.lowerfence, upperfence = b.upperfence,
+                mean = b['mean'], name = rec, legendgroup = rec,
+                marker_color = color, showlegend = row == 1
+            ), row = row, col = 1)
+            fig.add_trace(go.Scattergl(
+                x = o.k, y = o[y_val], mode = 'markers', name = rec,
+                legendgroup = rec, marker = dict(color = color, size = 4),
+                showlegend = False
+            ), row = row, col = 1)
+
+    fig.update_layout(boxmode = 'group')
+    return fig
 
 @app.callback(
     Output("Global_PercentChange", "figure"),
     Input("Aggregate", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def Global_PercentChange(agg):
+    time_scores = store.time_scores
+    agg_scores = store.agg_scores
     if agg == "Aggregate":
         fig = px.box(
             agg_scores[agg_scores.variable.str.contains("Enrich")],
@@ -264,6 +245,8 @@ def Global_PercentChange(agg):
             color = 'match_type', hover_name = 'receptor',
             facet_col = 'variable'
         )
+    elif agg == "Summary":
+        fig = summary_box(time_scores, 'pc_enrich')
     else:
         fig = px.box(
             time_scores, x = 'k', y = 'pc_enrich',
@@ -278,7 +261,11 @@ def Global_PercentChange(agg):
     Output("Global_Speedup", "figure"),
     Input("Aggregate", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def Global_PercentChange(agg):
+    time_scores = store.time_scores
+    agg_scores = store.agg_scores
     if agg == "Aggregate":
         fig = px.box(
             agg_scores[agg_scores.variable.str.contains("Speedup")],
@@ -286,6 +273,8 @@ def Global_PercentChange(agg):
             color = 'match_type', hover_name = 'receptor',
             facet_col = 'variable'
         )
+    elif agg == "Summary":
+        fig = summary_box(time_scores, 'speedup')
     else:
         fig = px.box(
             time_scores, x = 'k', y = 'speedup',
@@ -303,9 +292,11 @@ def Global_PercentChange(agg):
     Output("LogAUC", "figure"),
     Input("Receptor", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def update_logAUC(rec):
     fig = px.box(
-        time_scores[time_scores.receptor == rec],
+        store.receptor_scores(rec),
         x = 'k', y = 'log_auc', points='outliers',
         color = "match_type", hover_name='cluster_id',
         color_discrete_sequence=['#7C80A3', '#B05B67']
@@ -318,9 +309,11 @@ def update_logAUC(rec):
     Output("Enrichment", "figure"),
     Input("Receptor", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def update_Enrichment(rec):
     fig = px.box(
-        time_scores[time_scores.receptor == rec],
+        store.receptor_scores(rec),
         x = 'k', y = 'pc_enrich',
         color = "match_type",
         color_discrete_sequence=['#7C80A3', '#B05B67']
@@ -333,9 +326,11 @@ def update_Enrichment(rec):
     Output("Speedup", "figure"),
     Input("Receptor", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def update_Speedup(rec):
     fig = px.box(
-        time_scores[time_scores.receptor == rec],
+        store.receptor_scores(rec),
         x = 'k', y = 'speedup', points='outliers',
         color = "match_type", hover_name = 'cluster_id',
         color_discrete_sequence=['#7C80A3', '#B05B67']
@@ -348,24 +343,28 @@ def update_Speedup(rec):
     Output("Correlation", "figure"),
     Input("Receptor", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def update_Correlation(rec):
-    sub_frame = time_scores[time_scores.receptor == rec]
-    plot_frame = sub_frame.\
-        groupby(['receptor', 'match_type', 'cluster_id', 'k']).\
-        apply(
-            lambda x : pd.Series({
-                'pc_enrich' : x.pc_enrich.mean(),
-                'speedup' : x.speedup.mean()
-            })
-        ).reset_index()
+    sub_frame = store.receptor_scores(rec)
+    plot_frame = run_means(sub_frame)
     plot_frame['k'] = plot_frame['k'].astype(str)
 
+    # bootstrap intervals of the LogAUC change (Aggregate.py with OUTDOCKs),
+    # their width around the change of the OUTDOCK scores they resample
+    errors = {}
+    if 'pc_enrich_lo' in plot_frame.columns and plot_frame.pc_enrich_lo.notna().any():
+        plot_frame['error_hi'] = plot_frame.pc_enrich_hi - plot_frame.pc_enrich_outdock
+        plot_frame['error_lo'] = plot_frame.pc_enrich_outdock - plot_frame.pc_enrich_lo
+        errors = dict(error_y = 'error_hi', error_y_minus = 'error_lo')
+
     fig = px.scatter(
         plot_frame,
         x = 'speedup', y = 'pc_enrich',
         color = "k", hover_name = 'cluster_id',
         color_discrete_sequence = px.colors.sequential.Plasma_r,
-        symbol = 'match_type'
+        symbol = 'match_type',
+        **errors
     )
 
     fig.update_xaxes(title = "Fold Speedup")
@@ -384,12 +383,10 @@ def update_Correlation(rec):
     Input("MatchType", "value"),
     Input("Cluster ID", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def update_sphere_usage(rec, mt, ci):
-    sub_frame = ms_frame[
-        (ms_frame.match_type == mt) &
-        (ms_frame.receptor == rec) &
-        (ms_frame.cluster_id == ci)
-    ]
+    sub_frame = store.sphere_usage(rec, mt, ci)
 
     fig = px.scatter_3d(
         sub_frame, x = 'x', y = 'y', z = 'z',
@@ -406,12 +403,10 @@ def update_sphere_usage(rec, mt, ci):
     Input("MatchType", "value"),
     Input("Cluster ID", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def update_ligand_usage(rec, mt, ci):
-    sub_frame = ms_frame[
-        (ms_frame.match_type == mt) &
-        (ms_frame.receptor == rec) &
-        (ms_frame.cluster_id == ci)
-    ]
+    sub_frame = store.sphere_usage(rec, mt, ci)
 
     fig = px.scatter(
         sub_frame, x = 'Ligand_Usage', y = "Decoy_Usage",
@@ -428,12 +423,10 @@ def update_ligand_usage(rec, mt, ci):
     Input("MatchType", "value"),
     Input("Cluster ID", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def update_ligand_usage(rec, mt, ci):
-    sub_frame = ms_frame[
-        (ms_frame.match_type == mt) &
-        (ms_frame.receptor == rec) &
-        (ms_frame.cluster_id == ci)
-    ].sort_values("ms_id")
+    sub_frame = store.sphere_usage(rec, mt, ci).sort_values("ms_id")
     total_usage = sub_frame.Usage.sum()
     sub_frame['fractional_usage'] = sub_frame.Usage / total_usage
 
@@ -451,14 +444,10 @@ def update_ligand_usage(rec, mt, ci):
     Input("MatchType", "value"),
     Input("Cluster ID", "value")
 )
+@lru_cache(maxsize=FIGURE_CACHE)
+@report_figure
 def update_cooccurrence(rec, mt, ci):
-    sub_frame = cooc_frame[
-        (cooc_frame.match_type == mt) &
-        (cooc_frame.receptor == rec) &
-        (cooc_frame.cluster_id == ci)
-    ]
-
-    mat = sub_frame.iloc[:, 3:].values
+    mat = store.cooccurrence(rec, mt, ci)
 
     fig = go.Figure()
     trace = go.Heatmap(
@@ -472,5 +461,21 @@ def update_cooccurrence(rec, mt, ci):
     fig.update_layout(title = "Matching Sphere Co-Occurrence")
     return fig
 
+def get_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "-d", "--data_dir", default="../data", required=False, type=str,
+        help="Directory of the merged tables (.parquet, .feather or .tab)"
+    )
+    p.add_argument(
+        "-r", "--report", action='store_true', required=False,
+        help="print render time and payload size of every figure"
+    )
+    args = p.parse_args()
+    return args
+
 if __name__ == '__main__':
+    args = get_args()
+    store.data_dir = args.data_dir
+    REPORT = args.report
     app.run_server(debug=False)
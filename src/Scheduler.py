@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import traceback
+import os
+from tqdm import tqdm
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# state shipped to each worker once by the pool initializer
+_STATE = {}
+
+def _init_worker(state):
+    _STATE["state"] = state
+
+def _run_task(item):
+    """
+    runs one task on the worker state, any failure (including a
+    sys.exit) is returned instead of raised
+    """
+    idx, method, args = item
+    try:
+        return idx, getattr(_STATE["state"], method)(*args), []
+    except TaskErrors as e:
+        tb = traceback.format_exc()
+        return idx, None, [(key, error, tb) for key, error in e.errors.items()]
+    except (Exception, SystemExit) as e:
+        return idx, None, [(None, describe(e), traceback.format_exc())]
+
+def describe(e):
+    if isinstance(e, SystemExit):
+        return " ".join(str(e.code).split())
+    return "{}: {}".format(type(e).__name__, " ".join(str(e).split()))
+
+class TaskErrors(Exception):
+    """
+    raised by a task made of several parts, errors maps the key of
+    each failed part to its error
+    """
+
+    def __init__(self, errors):
+        super().__init__(" ; ".join("{} : {}".format(k, e) for k, e in errors.items()))
+        self.errors = errors
+
+class TaskFailure:
+    """
+    a task that raised, with the task key and its traceback
+    """
+
+    def __init__(self, key, error, tb):
+        self.key = key
+        self.error = error
+        self.traceback = tb
+
+class Scheduler:
+    """
+    Runs methods of a state object over a list of tasks :
+        the state is sent to each worker once at pool start, tasks only
+        carry their arguments. Progress counts completed tasks and every
+        failure is collected in self.failures instead of stopping the run.
+
+    A worker that dies (e.g. killed by the OOM killer) breaks the pool,
+    the tasks that had not returned are reported as failures instead of
+    waited for.
+
+    jobs=None uses every core, serial=True runs the tasks in this process
+    (no pickling, so breakpoints and tracebacks behave as usual)
+    """
+
+    def __init__(self, jobs=None, serial=False, progress=True):
+        self.jobs = jobs
+        self.serial = serial or jobs == 1
+        self.progress = progress
+        self.failures = []
+
+    def num_workers(self, num_tasks):
+        jobs = self.jobs if self.jobs else os.cpu_count() or 1
+        return max(1, min(jobs, num_tasks))
+
+    def results(self, state, items):
+        if self.serial:
+            _init_worker(state)
+            for item in items:
+                yield _run_task(item)
+            return
+
+        # forked workers inherit the state and shared sphere sets
+        executor = ProcessPoolExecutor(
+            self.num_workers(len(items)), mp_context=get_context("fork"),
+            initializer=_init_worker, initargs=(state,)
+            )
+        try:
+            futures = {executor.submit(_run_task, item) : item[0] for item in items}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except BrokenProcessPool as e:
+                    yield futures[future], None, [(
+                        None, "worker process died before the task finished (killed or out of memory)",
+                        "".join(traceback.format_exception(e))
+                        )]
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, state, method, tasks, keys=None, callback=None):
+        """
+        calls state.method(*args) for every args in tasks, returns the
+        list of failures keyed by keys (defaults to the task arguments)
+        or by the part keys of a TaskErrors
+
+        callback(key, result) is called in this process with the return
+        value of every task that did not fail, as the tasks complete
+        """
+        tasks = list(tasks)
+        keys = list(keys) if keys is not None else tasks
+        items = [(idx, method, args) for idx, args in enumerate(tasks)]
+
+        self.failures = []
+        progress = tqdm(total=len(items), disable=not self.progress)
+        for idx, result, failures in self.results(state, items):
+            for key, error, tb in failures:
+                self.failures.append(TaskFailure(
+                    keys[idx] if key is None else key, error, tb
+                    ))
+            if callback is not None and not failures:
+                callback(keys[idx], result)
+            progress.update(1)
+        progress.close()
+
+        self.failures.sort(key=lambda f : str(f.key))
+        return self.failures
+
+def write_failures(fn, failures):
+    with open(fn, "w+") as f:
+        f.write("task\terror\n")
+        for t in failures:
+            f.write("{}\t{}\n".format(t.key, t.error))
+
+def log_failures(failures, verbose=False):
+    print("{} Failed Tasks :".format(len(failures)))
+    for t in failures:
+        print("\t{} : {}".format(t.key, t.error))
+        if verbose:
+            print(t.traceback)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+import io
+import numpy as np
+
+# DOCK sphere record : (i5, 3f10.5, f8.3, i5, i2, i3)
+# (name, dtype, width, decimals)
+SPH_FIELDS = [
+    ("id", np.int32, 5, 0),
+    ("x", np.float64, 10, 5),
+    ("y", np.float64, 10, 5),
+    ("z", np.float64, 10, 5),
+    ("radius", np.float64, 8, 3),
+    ("atom_id", np.int32, 5, 0),
+    ("critical", np.int32, 2, 0),
+    ("color", np.int32, 3, 0)
+]
+SPH_DTYPE = np.dtype([(name, dtype) for name, dtype, _, _ in SPH_FIELDS])
+SPH_WIDTH = sum(w for _, _, w, _ in SPH_FIELDS)
+
+# registry of sphere sets shared with forked workers
+_SHARED = {}
+
+def _load_shared(token, input_fn):
+    """
+    Resolves a shared sphere set inside a worker process. Forked workers
+    find it in the inherited registry, anything else parses the file once
+    and caches it for the remaining tasks.
+    """
+    if token not in _SHARED:
+        _SHARED[token] = SphereSet.from_file(input_fn, token=token)
+    return _SHARED[token]
+
+def fixed_weights():
+    """
+    Builds the (SPH_WIDTH, num_fields) place value matrix, the field
+    start columns and dot column positions of the DOCK sphere layout
+    """
+    weights = np.zeros((SPH_WIDTH, len(SPH_FIELDS)), dtype=np.float64)
+    starts = []
+    dots = []
+
+    start = 0
+    for idx, (_, _, w, decimals) in enumerate(SPH_FIELDS):
+        end = start + w
+        starts.append(start)
+        place = 0
+        for col in range(end - 1, start - 1, -1):
+            if decimals > 0 and col == end - decimals - 1:
+                dots.append(col)
+                continue
+            weights[col, idx] = 10 ** place
+            place += 1
+        start = end
+
+    return weights, np.array(starts), np.array(dots)
+
+SPH_WEIGHTS, SPH_STARTS, SPH_DOTS = fixed_weights()
+
+# byte lookup tables : digit value and characters allowed in a number
+DIGIT_VALUE = np.zeros(256, dtype=np.float64)
+DIGIT_VALUE[ord("0"):ord("9")+1] = np.arange(10)
+NUMERIC_CHAR = np.zeros(256, dtype=bool)
+NUMERIC_CHAR[[ord(c) for c in "0123456789- "]] = True
+
+def parse_cast(buf):
+    """
+    Parses fixed width sphere records by casting every byte column
+    slice as a string
+    """
+    records = np.zeros(buf.shape[0], dtype=SPH_DTYPE)
+    start = 0
+    for name, dtype, w, _ in SPH_FIELDS:
+        field = np.ascontiguousarray(buf[:, start:start+w])
+        records[name] = field.view("S{}".format(w)).ravel().astype(dtype)
+        start += w
+
+    return records
+
+def parse_fixed(buf):
+    """
+    Parses fixed width sphere records from a (num_spheres, line_width)
+    byte matrix. Digits are weighted by their place value and summed for
+    all fields in one matrix product, anything that does not look like
+    right justified fixed point numbers goes through parse_cast.
+    """
+    buf = buf[:, :SPH_WIDTH]
+
+    allowed = NUMERIC_CHAR[buf]
+    allowed[:, SPH_DOTS] = buf[:, SPH_DOTS] == ord(".")
+    if not np.all(allowed):
+        return parse_cast(buf)
+
+    values = DIGIT_VALUE[buf] @ SPH_WEIGHTS
+    negative = np.logical_or.reduceat(buf == ord("-"), SPH_STARTS, axis=1)
+    values[negative] *= -1
+
+    records = np.zeros(buf.shape[0], dtype=SPH_DTYPE)
+    for idx, (name, _, _, decimals) in enumerate(SPH_FIELDS):
+        if decimals > 0:
+            records[name] = values[:, idx] / 10 ** decimals
+        else:
+            records[name] = values[:, idx]
+
+    return records
+
+def validate_fixed(records, line):
+    """
+    guards against uniform lines that are not in the DOCK layout,
+    fields that run together are only readable by position
+    """
+    try:
+        expected = [float(v) for v in line.split()[1:4]]
+    except ValueError:
+        return True
+    if len(expected) != 3:
+        return True
+
+    return np.allclose(
+        [records[0][n] for n in ('x', 'y', 'z')], expected
+        )
+
+def parse_whitespace(lines):
+    """
+    Parses whitespace delimited sphere records through a bulk loadtxt,
+    trailing columns missing from any record are left as zero
+    """
+    num_cols = min(len(l.split()) for l in lines)
+    usecols = range(min(num_cols, len(SPH_FIELDS)))
+    columns = np.loadtxt(
+        io.BytesIO(b"".join(lines)), dtype=np.float64,
+        usecols=usecols, ndmin=2
+        )
+
+    records = np.zeros(columns.shape[0], dtype=SPH_DTYPE)
+    for idx in usecols:
+        name = SPH_FIELDS[idx][0]
+        records[name] = columns[:, idx]
+
+    return records
+
+def parse_records(lines):
+    """
+    Parses sphere lines into a structured array, taking the fixed width
+    path when every record has the same length and falling back to a
+    whitespace split otherwise
+    """
+    if len(lines) == 0:
+        return np.zeros(0, dtype=SPH_DTYPE)
+
+    width = len(lines[0])
+    if width > SPH_WIDTH and all(len(l) == width for l in lines):
+        buf = np.frombuffer(b"".join(lines), dtype=np.uint8).reshape(-1, width)
+        try:
+            records = parse_fixed(buf)
+            if validate_fixed(records, lines[0]):
+                return records
+        except ValueError:
+            pass
+
+    return parse_whitespace(lines)
+
+def read_sph(input_fn):
+    """
+    Reads a sphere file in a single bulk read
+
+    returns header lines, raw sphere line bytes and typed records
+
+    When the sphere records form one block of equal width lines (the
+    usual matching_spheres.sph layout) the raw lines are a zero-copy
+    fixed width bytes view of the file buffer, otherwise an object array.
+    """
+    with open(input_fn, "rb") as f:
+        data = f.read()
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord("\n")) + 1
+    if buf.size > 0 and (ends.size == 0 or ends[-1] != buf.size):
+        ends = np.append(ends, buf.size)
+    starts = np.concatenate([[0], ends[:-1]]).astype(ends.dtype)
+
+    # records start with the right justified sphere id (space or digit)
+    first = buf[starts]
+    is_sphere = (first == ord(" ")) | ((first >= ord("0")) & (first <= ord("9")))
+    header = [
+        data[s:e].decode() for s, e in zip(starts[~is_sphere], ends[~is_sphere])
+        ]
+
+    sph_starts = starts[is_sphere]
+    sph_ends = ends[is_sphere]
+    widths = sph_ends - sph_starts
+
+    # fast path : one contiguous block of fixed width records
+    if sph_starts.size > 0 and \
+            np.all(widths == widths[0]) and \
+            widths[0] > SPH_WIDTH and \
+            sph_ends[-1] - sph_starts[0] == widths.sum():
+        width = int(widths[0])
+        block = buf[sph_starts[0]:sph_ends[-1]].reshape(-1, width)
+        try:
+            records = parse_fixed(block)
+            if validate_fixed(records, data[sph_starts[0]:sph_ends[0]]):
+                lines = block.view("S{}".format(width)).ravel()
+                return header, lines, records
+        except ValueError:
+            pass
+
+    lines = [data[s:e] for s, e in zip(sph_starts, sph_ends)]
+    records = parse_records(lines)
+    return header, np.array(lines, dtype=object), records
+
+class SphereSet:
+    """
+    Immutable parsed matching sphere set :
+        header lines, raw sphere line bytes, typed records
+        and float64 coordinates
+
+    Parsed once per run and shared by every clustering task.
+    """
+
+    def __init__(self, input_fn, header, lines, records, token=None):
+        self.input_fn = input_fn
+        self.header = tuple(header)
+        self.lines = lines
+        self.records = records
+        self.token = token
+
+        self.coords = np.column_stack([
+            records['x'], records['y'], records['z']
+            ])
+
+        self.lines.setflags(write=False)
+        self.records.setflags(write=False)
+        self.coords.setflags(write=False)
+
+    @classmethod
+    def from_file(cls, input_fn, token=None):
+        header, lines, records = read_sph(input_fn)
+        return cls(input_fn, header, lines, records, token=token)
+
+    def __len__(self):
+        return self.coords.shape[0]
+
+    def share(self):
+        """
+        registers the sphere set so workers forked afterwards reuse
+        the parent copy instead of receiving it per task
+        """
+        if self.token is None:
+            self.token = "{}:{}".format(self.input_fn, id(self))
+        _SHARED[self.token] = self
+        return self
+
+    def __reduce__(self):
+        if self.token is not None:
+            return (_load_shared, (self.token, self.input_fn))
+        return (
+            self.__class__,
+            (self.input_fn, self.header, self.lines, self.records)
+            )
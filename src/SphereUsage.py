@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+
+from scipy.spatial import cKDTree
+
+from SphereFile import SphereSet
+
+OXR_FIELDS = ["OXR_{}{}".format(a, i) for i in range(1, 5) for a in "XYZ"]
+
+class SphereIndex:
+    """
+    Maps pose coordinates to matching sphere ids (0 based rows of the
+    sphere file) : the nearest sphere within tol angstroms, -1 otherwise.
+    Mol2 and sphere files print coordinates with different precision, so
+    spheres are matched by distance instead of by their text.
+    """
+
+    def __init__(self, coords, tol=0.01):
+        self.coords = np.asarray(coords, dtype=np.float64)
+        self.tol = tol
+        self.tree = cKDTree(self.coords)
+
+    def __len__(self):
+        return self.coords.shape[0]
+
+    def lookup(self, xyz):
+        _, idx = self.tree.query(xyz, distance_upper_bound=self.tol)
+        return np.where(idx < len(self), idx, -1)
+
+class SphereAccumulator:
+    """
+    Usage (all / ligand / decoy) and ordered pair co-occurrence counts of
+    the spheres of one run, updated a batch of poses at a time
+    """
+
+    def __init__(self, num_spheres):
+        self.n = num_spheres
+        self.usage = np.zeros((num_spheres, 3), dtype=np.int64)
+        self.cooc = np.zeros((num_spheres, num_spheres), dtype=np.int64)
+        self.unmatched = 0
+
+    def add(self, idx, ligand):
+        """
+        idx : (poses, 4) sphere ids of the matched spheres (-1 unmatched)
+        ligand : (poses,) True for ligand poses
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        matched = idx >= 0
+        self.unmatched += int((~matched).sum())
+
+        lig = np.broadcast_to(np.asarray(ligand, dtype=bool)[:, None], idx.shape)
+        used = idx[matched]
+        self.usage[:, 0] += np.bincount(used, minlength=self.n)
+        self.usage[:, 1] += np.bincount(idx[matched & lig], minlength=self.n)
+        self.usage[:, 2] += np.bincount(idx[matched & ~lig], minlength=self.n)
+
+        # every ordered pair of distinct matched spheres within a pose
+        i = np.repeat(idx, 4, axis=1).ravel()
+        j = np.tile(idx, (1, 4)).ravel()
+        keep = (i >= 0) & (j >= 0) & (i != j)
+        pairs = i[keep] * self.n + j[keep]
+
+        # dense counts when the batch is large next to the matrix
+        if pairs.size * 4 >= self.cooc.size:
+            self.cooc += np.bincount(pairs, minlength=self.cooc.size).reshape(self.n, self.n)
+        else:
+            np.add.at(self.cooc.ravel(), pairs, 1)
+
+def read_poses(coords_fn, chunksize=1000000):
+    """
+    batches of (oxr coordinates (poses, 4, 3), ligand flags) of a coords.tab
+    """
+    header = pd.read_csv(coords_fn, sep="\t", nrows=0).columns
+    usecols = OXR_FIELDS + (["Type"] if "Type" in header else [])
+    reader = pd.read_csv(
+        coords_fn, sep="\t", usecols=usecols, chunksize=chunksize,
+        dtype={c : np.float64 for c in OXR_FIELDS}
+        )
+    for chunk in reader:
+        oxr = chunk[OXR_FIELDS].values.reshape(-1, 4, 3)
+        ligand = (chunk["Type"] == "ligand").values if "Type" in chunk \
+            else np.zeros(oxr.shape[0], dtype=bool)
+        yield oxr, ligand
+
+def accumulate(coords_fn, index, chunksize=1000000):
+    acc = SphereAccumulator(len(index))
+    for oxr, ligand in read_poses(coords_fn, chunksize):
+        idx = index.lookup(oxr.reshape(-1, 3)).reshape(-1, 4)
+        acc.add(idx, ligand)
+    return acc
+
+def parse_sphere_files(values):
+    """
+    RECEPTOR=path pairs, or a single path used for every receptor (key None)
+    """
+    files = {}
+    for value in values:
+        if "=" in value:
+            receptor, fn = value.split("=", 1)
+            files[receptor] = fn
+        else:
+            files[None] = value
+    return files
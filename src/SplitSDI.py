@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import heapq
+import shutil
+import glob
+import re
+import os
+
+STRATEGIES = ["roundrobin", "size", "time"]
+
+re_open = re.compile(r"open the file: *(\S+)")
+re_values = re.compile(r"^ +[0-9]")
+
+def outdock_times(patterns):
+    """
+    total DOCK time spent on each db2 file across previous OUTDOCKs,
+    per molecule times are summed under the last opened file
+    """
+    times = {}
+    for pattern in patterns:
+        for fn in glob.glob(pattern):
+            current = None
+            with open(fn, "r", errors="replace") as f:
+                for line in f:
+                    match = re_open.search(line)
+                    if match:
+                        current = match.group(1)
+                    elif current is not None and re_values.match(line):
+                        values = line.split()
+                        try:
+                            t = float(values[5])
+                        except (IndexError, ValueError):
+                            continue
+                        times[current] = times.get(current, 0.0) + t
+    return times
+
+def balance(costs, n):
+    """
+    greedy longest-processing-time packing : the most expensive entries
+    go first, each to the shard with the least work so far
+    """
+    assignment = np.zeros(costs.size, dtype=np.uint16)
+    heap = [(0.0, i) for i in range(n)]
+    for idx in np.argsort(-costs, kind="stable"):
+        load, shard = heap[0]
+        assignment[idx] = shard
+        heapq.heapreplace(heap, (load + costs[idx], shard))
+    return assignment
+
+class SplitSubDir:
+    """
+    A recreation of setup_db2_zinc15_file_number:
+        splits an enrichment_sdi into N shards
+
+    The sdi is streamed in blocks and every shard is written through a
+    buffered writer, nothing holds the full list of db2 paths. A compact
+    offset index (line start offsets of the sdi and the shard of every
+    line) lets shard i be re-read from the original file.
+
+    strategies :
+        roundrobin : line idx goes to shard idx % n (blastermaster)
+        size : balances the total db2 file size of each shard
+        time : balances the DOCK time of each shard, from previous OUTDOCKs
+    """
+
+    block_size = 1 << 22
+
+    def __init__(self, sdi_fn, n=20, strategy="roundrobin", time_patterns=None):
+        self.sdi_fn = sdi_fn
+        self.n = n
+        self.strategy = strategy
+        self.time_patterns = time_patterns or []
+        self.shard_dir = None
+        self.shard_cost = np.array([])
+
+    def shard_fn(self, idx):
+        return os.path.join(
+            self.shard_dir, "split_database_index.{:04d}".format(idx)
+            )
+
+    def offsets_fn(self):
+        return os.path.join(self.shard_dir, "sdi_offsets.npy")
+
+    def assignment_fn(self):
+        return os.path.join(self.shard_dir, "sdi_assignment.npy")
+
+    def read_lines(self):
+        """
+        yields blocks of complete lines from the sdi
+        """
+        with open(self.sdi_fn, "rb") as f:
+            remainder = b""
+            while True:
+                block = f.read(self.block_size)
+                if not block:
+                    break
+                block = remainder + block
+                end = block.rfind(b"\n") + 1
+                remainder = block[end:]
+                if end > 0:
+                    yield block[:end].splitlines(keepends=True)
+            if remainder:
+                yield [remainder]
+
+    def line_costs(self):
+        """
+        cost of every sdi entry for the balanced strategies, entries
+        without a cost get the median of the known ones
+        """
+        if self.strategy == "time":
+            times = outdock_times(self.time_patterns)
+            lookup = lambda path : times.get(path, np.nan)
+        else:
+            base = os.path.dirname(os.path.abspath(self.sdi_fn))
+            def lookup(path):
+                try:
+                    return os.path.getsize(os.path.join(base, path))
+                except OSError:
+                    return np.nan
+
+        costs = []
+        for lines in self.read_lines():
+            costs.append(np.array(
+                [lookup(l.strip().decode()) for l in lines], dtype=np.float64
+                ))
+        costs = np.concatenate(costs) if costs else np.zeros(0)
+
+        known = ~np.isnan(costs)
+        fill = np.median(costs[known]) if np.any(known) else 1.0
+        costs[~known] = fill
+        return costs
+
+    def assign(self):
+        """
+        shard of every sdi line for the balanced strategies, None for
+        roundrobin where the shard of a line is known while streaming
+        """
+        if self.strategy == "roundrobin":
+            return None
+        costs = self.line_costs()
+        assignment = balance(costs, self.n)
+        self.shard_cost = np.bincount(assignment, weights=costs, minlength=self.n)
+        return assignment
+
+    def prepare(self, shard_dir):
+        """
+        writes the N shards and the offset index, streaming the sdi
+        once (twice for the balanced strategies)
+
+        the assignment is saved last and marks the shards as complete
+        """
+        self.shard_dir = shard_dir
+        os.makedirs(shard_dir, exist_ok=True)
+
+        assignment = self.assign()
+
+        writers = [
+            open(self.shard_fn(i), "wb", buffering=1 << 20) for i in range(self.n)
+            ]
+        offsets = [np.zeros(1, dtype=np.uint64)]
+        blocks = []
+        num_lines = 0
+        try:
+            for lines in self.read_lines():
+                if assignment is None:
+                    block = (np.arange(num_lines, num_lines + len(lines)) % self.n).astype(np.uint16)
+                else:
+                    block = assignment[num_lines:num_lines + len(lines)]
+                blocks.append(block)
+                order = np.argsort(block, kind="stable")
+                bounds = np.searchsorted(block[order], np.arange(self.n + 1))
+                for i in range(self.n):
+                    writers[i].write(b"".join(
+                        [lines[j] for j in order[bounds[i]:bounds[i+1]]]
+                        ))
+
+                lengths = np.fromiter(map(len, lines), dtype=np.uint64, count=len(lines))
+                offsets.append(offsets[-1][-1] + np.cumsum(lengths))
+                num_lines += len(lines)
+        finally:
+            for w in writers:
+                w.close()
+
+        if assignment is None:
+            assignment = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.uint16)
+            self.shard_cost = np.bincount(assignment, minlength=self.n).astype(np.float64)
+
+        np.save(self.offsets_fn(), np.concatenate(offsets))
+        np.save(self.assignment_fn(), assignment)
+
+    def write(self, fn, idx):
+        shutil.copyfile(self.shard_fn(idx), fn)
+
+    def read(self, idx):
+        """
+        yields the lines of shard idx from the original sdi
+        """
+        offsets = np.load(self.offsets_fn(), mmap_mode="r")
+        lines = np.flatnonzero(np.load(self.assignment_fn(), mmap_mode="r") == idx)
+        starts = offsets[lines]
+        ends = offsets[lines + 1]
+        with open(self.sdi_fn, "rb") as f:
+            for s, e in zip(starts, ends):
+                f.seek(int(s))
+                yield f.read(int(e - s)).decode()
@@ -0,0 +1,4 @@
+"""
+benchmarks of the src modules, one module per benchmarked module, each
+registering its subcommands of Benchmark.py with add_parsers
+"""
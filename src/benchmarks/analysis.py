@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import tempfile
+import time
+import os
+
+from Analysis import load_timescores, aggregate_scores
+
+from benchmarks.synthetic import write_synthetic_timescores
+
+def legacy_load_timescores(fn):
+    """
+    row wise startup of Performance.py before the Analysis module
+    """
+    def select_sign(x):
+        if x.baseline_logAUC < x.log_auc:
+            return x.pc_enrich * -1 if x.pc_enrich < 0 else x.pc_enrich
+        return x.pc_enrich * -1 if x.pc_enrich > 0 else x.pc_enrich
+
+    time_scores = pd.read_csv(fn, sep="\t")
+    time_scores['k'] = time_scores.cluster_id.apply(lambda x : int(x.split("_")[0][1:]))
+    baseline_frame = time_scores[time_scores.k == 1].\
+        groupby(['receptor', 'match_type']).\
+        apply(
+            lambda x : pd.Series({
+                "baseline_AUC" : x.auc.mean(),
+                "baseline_logAUC" : x.log_auc.mean(),
+                "baseline_time" : x.time.mean()
+            })
+        ).\
+        reset_index()
+    time_scores = time_scores.merge(baseline_frame)
+    time_scores['pc_enrich'] = (time_scores.log_auc - time_scores.baseline_logAUC) / \
+        np.abs(time_scores.baseline_logAUC)
+    time_scores['pc_enrich'] = time_scores.apply(lambda x : select_sign(x), axis = 1)
+    time_scores['speedup'] = time_scores.baseline_time / time_scores.time
+
+    agg_scores = time_scores.\
+        groupby(['receptor','k', 'match_type']).\
+        apply(
+            lambda x : pd.Series({
+                "AggEnrichMean" : x.pc_enrich.mean(),
+                "AggEnrichMax" : x.pc_enrich.max(),
+                "AggSpeedupMean" : x.speedup.mean(),
+                "AggSpeedupMax" : x.speedup.max()
+            })
+        ).reset_index().\
+        melt(id_vars = ['k', 'receptor', 'match_type'])
+    return time_scores, agg_scores
+
+def bench_startup(args):
+    print("rows\tread_s\tlegacy_s\tvector_s\tspeedup\tidentical")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            fn = os.path.join(tmp, "merged_time_and_enrichment.tab")
+            write_synthetic_timescores(fn, n)
+
+            start = time.perf_counter()
+            pd.read_csv(fn, sep="\t")
+            t_read = time.perf_counter() - start
+
+            start = time.perf_counter()
+            time_scores = load_timescores(fn)
+            agg_scores = aggregate_scores(time_scores)
+            t_vector = time.perf_counter() - start
+
+            t_legacy = np.nan
+            identical = "-"
+            if n <= args.max_legacy:
+                start = time.perf_counter()
+                legacy_scores, legacy_agg = legacy_load_timescores(fn)
+                t_legacy = time.perf_counter() - start
+                identical = (
+                    np.allclose(legacy_scores.pc_enrich, time_scores.pc_enrich, equal_nan=True) and
+                    np.allclose(legacy_agg.value, agg_scores.value, equal_nan=True)
+                    )
+
+            print("{}\t{:.3f}\t{:.3f}\t{:.3f}\t{:.1f}\t{}".format(
+                n, t_read, t_legacy, t_vector, t_legacy / t_vector, identical
+                ))
+
+def add_parsers(sub):
+    p_startup = sub.add_parser(
+        "startup", help="dashboard startup : row wise apply vs Analysis module on a time/score table"
+    )
+    p_startup.add_argument(
+        "-n", "--sizes", nargs="+", default=[100000, 1000000], type=int,
+        help="Number of rows of the synthetic merged_time_and_enrichment.tab"
+    )
+    p_startup.add_argument(
+        "--max_legacy", default=1000000, type=int,
+        help="Largest table timed with the row wise version"
+    )
+    p_startup.set_defaults(func=bench_startup)
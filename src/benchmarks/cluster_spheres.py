@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import tempfile
+import time
+import sys
+import os
+
+from ClusterSpheres import PrepareClusters
+
+from benchmarks.synthetic import write_synthetic_meta
+
+class AuditCounter:
+    """
+    counts filesystem calls through python audit events
+    """
+
+    events = [
+        "open", "os.mkdir", "os.symlink", "os.link", "os.remove",
+        "os.rename", "os.rmdir", "shutil.copyfile", "shutil.rmtree"
+        ]
+
+    def __init__(self):
+        self.active = False
+        self.counts = {e : 0 for e in self.events}
+        sys.addaudithook(self.hook)
+
+    def hook(self, event, args):
+        if self.active and event in self.counts:
+            self.counts[event] += 1
+
+    def reset(self):
+        self.counts = {e : 0 for e in self.events}
+
+def count_inodes(path):
+    """
+    number of distinct inodes and directory entries below path
+    """
+    inodes = set()
+    entries = 0
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            inodes.add(os.lstat(os.path.join(root, name)).st_ino)
+            entries += 1
+    return len(inodes), entries
+
+def bench_layout(args):
+    counter = AuditCounter()
+    print("layout\tdirectories\tfs_calls\tinodes\tentries\tseconds\tcalls_by_type")
+    with tempfile.TemporaryDirectory() as tmp:
+        meta_dir = os.path.join(tmp, "meta")
+        write_synthetic_meta(meta_dir, args.num_spheres, args.num_sdi_lines)
+
+        for layout in ["classic", "shared"]:
+            work_dir = os.path.join(tmp, layout)
+            os.makedirs(work_dir)
+            os.chdir(work_dir)
+
+            # serial so the audit hook sees every call
+            pc = PrepareClusters(
+                meta_dir, args.num_clusters, num_iter=args.num_iter,
+                num_sdi_clusters=args.num_sdi, layout=layout, serial=True
+                )
+            labels = pc.cluster_seeds()
+
+            counter.reset()
+            counter.active = True
+            start = time.perf_counter()
+            if layout == "shared":
+                pc.prepare_shards()
+                pc.prepare_store()
+            pc.build_runs(sorted(labels), set(), labels)
+            seconds = time.perf_counter() - start
+            counter.active = False
+
+            inodes, entries = count_inodes(work_dir)
+            print("{}\t{}\t{}\t{}\t{}\t{:.3f}\t{}".format(
+                layout, len(labels), sum(counter.counts.values()),
+                inodes, entries, seconds,
+                ",".join("{}={}".format(e, c) for e, c in counter.counts.items() if c > 0)
+                ))
+            os.chdir(tmp)
+
+def add_parsers(sub):
+    p_layout = sub.add_parser(
+        "layout", help="directory layouts : filesystem calls and inodes, classic vs shared"
+    )
+    p_layout.add_argument(
+        "-k", "--num_clusters", nargs="+", default=list(range(1, 11)), type=int,
+        help="Number of clusters"
+    )
+    p_layout.add_argument(
+        "-n", "--num_iter", default=5, type=int,
+        help="Number of seeds per k"
+    )
+    p_layout.add_argument(
+        "-s", "--num_sdi", default=20, type=int,
+        help="Number of SDI subclusters per run"
+    )
+    p_layout.add_argument(
+        "--num_spheres", default=45, type=int,
+        help="Number of spheres in the synthetic sphere set"
+    )
+    p_layout.add_argument(
+        "--num_sdi_lines", default=10000, type=int,
+        help="Number of db2 entries in the synthetic enrichment_sdi"
+    )
+    p_layout.set_defaults(func=bench_layout)
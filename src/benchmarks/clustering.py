@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import tempfile
+import time
+import os
+
+from sklearn.cluster import KMeans
+
+from SphereFile import SphereSet
+from BatchKMeans import BatchKMeans
+from Backends import BACKENDS
+
+from benchmarks.synthetic import write_synthetic_sph
+
+def bench_kmeans(args):
+    print("num_spheres\tk\tseeds\tsklearn_s\tbatched_s\tidentical")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            fn = os.path.join(tmp, "spheres.{}.sph".format(n))
+            write_synthetic_sph(fn, n)
+            X = SphereSet.from_file(fn).coords
+
+            for k in args.num_clusters:
+                start = time.perf_counter()
+                reference = np.array([
+                    KMeans(n_clusters=k, random_state=seed).fit_predict(X)
+                    for seed in range(args.num_iter)
+                    ])
+                t_sklearn = time.perf_counter() - start
+
+                start = time.perf_counter()
+                batched = BatchKMeans(k, range(args.num_iter)).fit_predict(X)
+                t_batched = time.perf_counter() - start
+
+                identical = np.all(reference == batched, axis=1).sum()
+                print("{}\t{}\t{}\t{:.4f}\t{:.4f}\t{}/{}".format(
+                    n, k, args.num_iter, t_sklearn, t_batched,
+                    identical, args.num_iter
+                    ))
+
+def bench_backends(args):
+    print("num_spheres\tbackend\tnum_k\tseeds\ttotal_s")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            fn = os.path.join(tmp, "spheres.{}.sph".format(n))
+            write_synthetic_sph(fn, n)
+            X = SphereSet.from_file(fn).coords
+
+            for name in args.backends:
+                backend = BACKENDS[name]()
+                backend.fit(X, args.num_clusters, range(args.num_iter))
+                total = sum(t["seconds"] for t in backend.timing)
+                print("{}\t{}\t{}\t{}\t{:.4f}".format(
+                    n, name, len(args.num_clusters), args.num_iter, total
+                    ))
+
+def add_parsers(sub):
+    p_kmeans = sub.add_parser(
+        "kmeans", help="multi-seed k-means : per-seed sklearn vs BatchKMeans"
+    )
+    p_kmeans.add_argument(
+        "-n", "--sizes", nargs="+", default=[45, 1000], type=int,
+        help="Number of spheres in each synthetic sphere set"
+    )
+    p_kmeans.add_argument(
+        "-k", "--num_clusters", nargs="+", default=[2, 4, 8], type=int,
+        help="Number of clusters"
+    )
+    p_kmeans.add_argument(
+        "-s", "--num_iter", default=50, type=int,
+        help="Number of seeds per k"
+    )
+    p_kmeans.set_defaults(func=bench_kmeans)
+
+    p_backends = sub.add_parser(
+        "backends", help="clustering backends : total time for a k sweep"
+    )
+    p_backends.add_argument(
+        "-n", "--sizes", nargs="+", default=[45, 5000], type=int,
+        help="Number of spheres in each synthetic sphere set"
+    )
+    p_backends.add_argument(
+        "-b", "--backends", nargs="+", default=sorted(BACKENDS),
+        choices=sorted(BACKENDS),
+        help="Backends to compare"
+    )
+    p_backends.add_argument(
+        "-k", "--num_clusters", nargs="+", default=list(range(1, 13)), type=int,
+        help="Number of clusters"
+    )
+    p_backends.add_argument(
+        "-s", "--num_iter", default=10, type=int,
+        help="Number of seeds per k"
+    )
+    p_backends.set_defaults(func=bench_backends)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import time
+
+from Enrichment import score_runs, bootstrap_runs, random_logauc
+
+from benchmarks.synthetic import synthetic_runs
+
+def legacy_roc_scores(scores, ligand, lam=0.001):
+    """
+    per molecule loops of ROC, AUC and LogAUC in Extract.jl
+    """
+    fpr, tpr = [0.0], [0.0]
+    fp, tp = 0, 0
+    num_lig = ligand.sum()
+    num_dec = ligand.size - num_lig
+    for is_lig in ligand[np.argsort(scores, kind="stable")]:
+        if is_lig:
+            tp += 1
+        else:
+            fp += 1
+        fpr.append(fp / num_dec)
+        tpr.append(tp / num_lig)
+
+    def auc(x, y):
+        return sum((x[i + 1] - x[i]) * (y[i] + y[i + 1]) / 2 for i in range(len(x) - 1))
+
+    start = next(i for i, x in enumerate(fpr) if x >= lam)
+    log_x = np.log10(fpr[start:])
+    log_x = log_x + abs(log_x.min())
+    log_x = log_x / log_x.max()
+    return auc(fpr, tpr), auc(log_x, tpr[start:]) - random_logauc(lam)
+
+def bench_enrichment(args):
+    print("runs\tmolecules\tlegacy_s\tvector_s\tspeedup\tmax_diff\tbootstrap\tbootstrap_s")
+    for n in args.sizes:
+        runs = synthetic_runs(args.num_runs, n)
+
+        t_legacy = np.nan
+        max_diff = np.nan
+        if n <= args.max_legacy:
+            start = time.perf_counter()
+            legacy = np.array([legacy_roc_scores(*r) for r in runs])
+            t_legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        auc, log_auc = score_runs(runs)
+        t_vector = time.perf_counter() - start
+        if n <= args.max_legacy:
+            max_diff = np.abs(legacy - np.column_stack([auc, log_auc])).max()
+
+        start = time.perf_counter()
+        bootstrap_runs(runs, num_boot=args.bootstrap)
+        t_boot = time.perf_counter() - start
+
+        print("{}\t{}\t{:.3f}\t{:.3f}\t{:.1f}\t{:.2e}\t{}\t{:.3f}".format(
+            args.num_runs, n, t_legacy, t_vector, t_legacy / t_vector,
+            max_diff, args.bootstrap, t_boot
+            ))
+
+def add_parsers(sub):
+    p_enrichment = sub.add_parser(
+        "enrichment", help="AUC / LogAUC : per molecule loops vs vectorized runs, bootstrap time"
+    )
+    p_enrichment.add_argument(
+        "-n", "--sizes", nargs="+", default=[10000, 100000, 1000000], type=int,
+        help="Number of ranked molecules per run"
+    )
+    p_enrichment.add_argument(
+        "-r", "--num_runs", default=10, type=int,
+        help="Number of runs scored together"
+    )
+    p_enrichment.add_argument(
+        "-b", "--bootstrap", default=100, type=int,
+        help="Number of bootstrap resamples"
+    )
+    p_enrichment.add_argument(
+        "--max_legacy", default=100000, type=int,
+        help="Largest run size timed with the per molecule loops"
+    )
+    p_enrichment.set_defaults(func=bench_enrichment)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import tempfile
+import os
+
+from Outdock import parse_directory
+from Hits import select_hits
+
+from benchmarks.synthetic import peak_memory, write_synthetic_outdock
+
+def legacy_hits(dir_name, q):
+    """
+    sort of every pose, unique molecules and quantile filter as ProcessDir in Extract.jl
+    """
+    _, scores, _ = parse_directory(dir_name)
+    frame = pd.DataFrame({
+        name : np.concatenate([s[name] for s in scores])
+        for name in ["sub_idx", "cls_idx", "mol_idx", "mol_name", "Total"]
+        })
+    frame = frame.sort_values(["Total", "mol_name"], kind="stable")
+    unique = frame.drop_duplicates("mol_name")
+    pc = unique.Total.quantile(q)
+    return unique[unique.Total < pc].sort_values(["sub_idx", "cls_idx", "mol_idx"])
+
+def bench_hits(args):
+    print("subclusters\tposes\tlegacy_s\tlegacy_mb\tstream_s\tstream_mb\tbounded_s\tbounded_mb\ttop_s\ttop_mb\thits\tidentical")
+    for num_mols in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            dir_name = os.path.join(tmp, "k2_0")
+            for i in range(args.num_sdi):
+                subdir = os.path.join(dir_name, "subcluster{:04d}".format(i))
+                os.makedirs(subdir)
+                write_synthetic_outdock(os.path.join(subdir, "OUTDOCK"), num_mols, seed=i)
+
+            legacy, t_legacy, m_legacy = peak_memory(legacy_hits, dir_name, args.quantile)
+            hits, t_stream, m_stream = peak_memory(select_hits, dir_name, args.quantile)
+            _, t_bounded, m_bounded = peak_memory(
+                select_hits, dir_name, args.quantile, None, args.max_molecules
+                )
+            top, t_top, m_top = peak_memory(select_hits, dir_name, args.quantile, len(hits))
+
+            expected = list(zip(legacy.mol_name, legacy.Total))
+            identical = [(h[0], h[1]) for h in hits] == expected and \
+                sorted(h[1] for h in top) == sorted(legacy.Total)
+            print("{}\t{}\t{:.3f}\t{:.1f}\t{:.3f}\t{:.1f}\t{:.3f}\t{:.1f}\t{:.3f}\t{:.1f}\t{}\t{}".format(
+                args.num_sdi, args.num_sdi * num_mols, t_legacy, m_legacy,
+                t_stream, m_stream, t_bounded, m_bounded, t_top, m_top, len(hits), identical
+                ))
+
+def add_parsers(sub):
+    p_hits = sub.add_parser(
+        "hits", help="hit selection : full sort vs streaming best score map, bounded quantile and bounded heap"
+    )
+    p_hits.add_argument(
+        "-n", "--sizes", nargs="+", default=[10000, 100000], type=int,
+        help="Number of molecules per subcluster OUTDOCK"
+    )
+    p_hits.add_argument(
+        "-s", "--num_sdi", default=10, type=int,
+        help="Number of subclusters"
+    )
+    p_hits.add_argument(
+        "-q", "--quantile", default=0.1, type=float,
+        help="Hit quantile"
+    )
+    p_hits.add_argument(
+        "-m", "--max_molecules", default=10000, type=int,
+        help="Molecules kept exactly by the bounded quantile selection"
+    )
+    p_hits.set_defaults(func=bench_hits)
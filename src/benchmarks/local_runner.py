@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import tempfile
+import time
+import os
+
+from LocalRunner import LocalRunner
+
+def bench_runner(args):
+    print("tasks\tjobs\twork_s\tbound_s\tdirlist_order_s\tlongest_first_s\tfailures")
+    rng = np.random.RandomState(0)
+    durations = np.round(rng.lognormal(0, 1, args.num_tasks) * args.scale, 3)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            with open("dirlist", "w+") as f:
+                for i, d in enumerate(durations):
+                    entry = "k2_0/subcluster{:04d}".format(i)
+                    os.makedirs(entry)
+                    with open(os.path.join(entry, "duration"), "w+") as g:
+                        g.write("{}\n".format(d))
+                    f.write("./{}\n".format(entry))
+
+            walls = []
+            for longest_first in [False, True]:
+                runner = LocalRunner("dirlist", "sh -c 'sleep $(cat duration)'", args.jobs, longest_first)
+                start = time.perf_counter()
+                runner.run()
+                walls.append(time.perf_counter() - start)
+
+            with open("local_runs.tab") as f:
+                failures = sum(line.split("\t")[1] != "0" for line in list(f)[1:])
+        finally:
+            os.chdir(cwd)
+
+    bound = max(durations.sum() / args.jobs, durations.max())
+    print("{}\t{}\t{:.2f}\t{:.2f}\t{:.2f}\t{:.2f}\t{}".format(
+        args.num_tasks, args.jobs, durations.sum(), bound, walls[0], walls[1], failures
+        ))
+
+def add_parsers(sub):
+    p_runner = sub.add_parser(
+        "runner", help="local runner : dirlist order vs longest first makespan of sleep tasks"
+    )
+    p_runner.add_argument(
+        "-n", "--num_tasks", default=32, type=int,
+        help="Number of dirlist entries"
+    )
+    p_runner.add_argument(
+        "-j", "--jobs", default=4, type=int,
+        help="Number of tasks running at once"
+    )
+    p_runner.add_argument(
+        "--scale", default=0.3, type=float,
+        help="Median task duration (seconds, lognormal)"
+    )
+    p_runner.set_defaults(func=bench_runner)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import tempfile
+import gzip
+import time
+import os
+
+from Mol2Index import Mol2Index
+
+from benchmarks.synthetic import write_synthetic_mol2
+
+def rescan_poses(fn, numbers):
+    """
+    pose text by reading the whole file, as ParseMol2 in Extract.jl
+    """
+    poses = {}
+    current = None
+    with gzip.open(fn, "rt") as f:
+        for line in f:
+            if line.startswith("##########                 Name:"):
+                current = []
+            elif line.startswith("##########               Number:"):
+                number = int(line.split()[-1])
+                if number in numbers:
+                    poses[number] = current
+            if current is not None:
+                current.append(line)
+    return {n : "".join(p) for n, p in poses.items()}
+
+def bench_mol2(args):
+    print("poses\tcheckpoint\tindex_s\tfetched\trescan_s\tfetch_s\tidentical")
+    rng = np.random.RandomState(0)
+    for n in args.sizes:
+        for checkpoint in [None, args.checkpoint]:
+            with tempfile.TemporaryDirectory() as tmp:
+                fn = os.path.join(tmp, "test.0001.mol2.gz")
+                write_synthetic_mol2(fn, n)
+                numbers = set(rng.choice(n, args.num_fetch, replace=False) + 1)
+
+                start = time.perf_counter()
+                index = Mol2Index.build(tmp, checkpoint)
+                t_index = time.perf_counter() - start
+
+                start = time.perf_counter()
+                expected = rescan_poses(fn, numbers)
+                t_rescan = time.perf_counter() - start
+
+                start = time.perf_counter()
+                rows = np.flatnonzero(np.isin(index.arrays["number"], list(numbers)))
+                poses = index.fetch(rows)
+                t_fetch = time.perf_counter() - start
+
+                identical = all(
+                    expected[number] == pose
+                    for number, pose in zip(index.arrays["number"][rows], poses)
+                    )
+                print("{}\t{}\t{:.3f}\t{}\t{:.3f}\t{:.4f}\t{}".format(
+                    n, checkpoint or "-", t_index, len(poses), t_rescan, t_fetch, identical
+                    ))
+
+def add_parsers(sub):
+    p_mol2 = sub.add_parser(
+        "mol2", help="pose extraction : rescanning a mol2.gz vs the pose index, with and without checkpoints"
+    )
+    p_mol2.add_argument(
+        "-n", "--sizes", nargs="+", default=[10000, 50000], type=int,
+        help="Number of poses in the synthetic mol2.gz"
+    )
+    p_mol2.add_argument(
+        "-f", "--num_fetch", default=20, type=int,
+        help="Number of poses fetched"
+    )
+    p_mol2.add_argument(
+        "-c", "--checkpoint", default=1000000, type=int,
+        help="Uncompressed bytes between gzip members of the rewritten file"
+    )
+    p_mol2.set_defaults(func=bench_mol2)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import pandas as pd
+import tempfile
+import time
+import os
+
+from Outdock import extract
+
+from benchmarks.synthetic import write_synthetic_outdock
+
+def bench_outdock(args):
+    print("directories\tsubclusters\trows\textract_s\trows_per_s\tload_s")
+    with tempfile.TemporaryDirectory() as tmp:
+        directories = []
+        for d in range(args.num_dirs):
+            dir_name = os.path.join(tmp, "k2_{}".format(d))
+            for i in range(args.num_sdi):
+                subdir = os.path.join(dir_name, "subcluster{:04d}".format(i))
+                os.makedirs(subdir)
+                write_synthetic_outdock(
+                    os.path.join(subdir, "OUTDOCK"), args.num_mols, seed=d * args.num_sdi + i
+                    )
+            directories.append(dir_name)
+
+        prefix = os.path.join(tmp, "outdock")
+        start = time.perf_counter()
+        extract(directories, prefix, jobs=args.jobs)
+        t_extract = time.perf_counter() - start
+
+        fn = prefix + ".scores.parquet"
+        if not os.path.isfile(fn):
+            fn = prefix + ".scores.tab"
+        start = time.perf_counter()
+        frame = pd.read_parquet(fn) if fn.endswith("parquet") else pd.read_csv(fn, sep="\t")
+        t_load = time.perf_counter() - start
+
+        print("{}\t{}\t{}\t{:.3f}\t{:.0f}\t{:.3f}".format(
+            args.num_dirs, args.num_sdi, frame.shape[0], t_extract,
+            frame.shape[0] / t_extract, t_load
+            ))
+
+def add_parsers(sub):
+    p_outdock = sub.add_parser(
+        "outdock", help="OUTDOCK extraction : rows parsed per second and columnar load time"
+    )
+    p_outdock.add_argument(
+        "-d", "--num_dirs", default=20, type=int,
+        help="Number of run directories"
+    )
+    p_outdock.add_argument(
+        "-s", "--num_sdi", default=20, type=int,
+        help="Number of subclusters per run directory"
+    )
+    p_outdock.add_argument(
+        "-m", "--num_mols", default=1000, type=int,
+        help="Number of scored molecules per OUTDOCK"
+    )
+    p_outdock.add_argument(
+        "-j", "--jobs", default=None, type=int,
+        help="Number of worker processes"
+    )
+    p_outdock.set_defaults(func=bench_outdock)
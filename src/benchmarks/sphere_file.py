@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import tempfile
+import os
+
+from SphereFile import read_sph, SphereSet
+from ClusterSpheres import write_seed_clusters
+
+from benchmarks.synthetic import timeit, write_synthetic_sph
+
+def legacy_read_sph(input_fn):
+    """
+    the split-per-line DataFrame build previously used by ClusterSPH,
+    with the same header rule as read_sph so both parse every record
+    """
+    sph_header = []
+    sph_lines = []
+    with open(input_fn, "r+") as f:
+        for line in f:
+            if line[0] != ' ' and not line[0].isdigit():
+                sph_header.append(line)
+            else:
+                sph_lines.append(line)
+
+    sph_frame = pd.DataFrame([
+        [_ for _ in l.strip().split(" ") if _ != ""] for l in sph_lines
+        ])
+    matrix = sph_frame.iloc[:, [1,2,3]].values
+    sph_lines = np.array(sph_lines)
+    return matrix
+
+def legacy_write_single(spheres, output_fn, k, labels):
+    """
+    the per cluster np.where and line by line writes previously
+    used by ClusterSPH.write_single_fn
+    """
+    cluster_size = [np.sum(labels == i) for i in range(k)]
+    with open(output_fn, "wb+") as f:
+        for line in spheres.header[:-1]:
+            f.write(line.encode())
+        for k_idx in range(k):
+            c_idx = np.where(labels == k_idx)[0]
+            line = spheres.header[-1].split(' ')
+            line[-1] = "{}\n".format(cluster_size[k_idx])
+            f.write(" ".join(line).replace("1", str(k_idx + 1), 1).encode())
+            for line in spheres.lines[c_idx]:
+                f.write(line)
+
+def bench_parse(args):
+    print("num_spheres\tlegacy_s\tvectorized_s\tspeedup")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            fn = os.path.join(tmp, "spheres.{}.sph".format(n))
+            write_synthetic_sph(fn, n)
+
+            t_legacy = timeit(legacy_read_sph, fn, repeat=args.repeat)
+            t_new = timeit(read_sph, fn, repeat=args.repeat)
+            print("{}\t{:.4f}\t{:.4f}\t{:.1f}".format(
+                n, t_legacy, t_new, t_legacy / t_new
+                ))
+
+def bench_writer(args):
+    print("num_spheres\tnum_k\tlegacy_s\tbuffered_s\tspeedup\tidentical")
+    rng = np.random.RandomState(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            fn = os.path.join(tmp, "spheres.{}.sph".format(n))
+            write_synthetic_sph(fn, n)
+            spheres = SphereSet.from_file(fn)
+
+            runs = [
+                (k, rng.randint(0, k, size=n).astype(np.int32))
+                for k in args.num_clusters
+                ]
+            legacy_fns = [os.path.join(tmp, "legacy.{}.sph".format(k)) for k, _ in runs]
+            new_fns = [os.path.join(tmp, "buffered.{}.sph".format(k)) for k, _ in runs]
+
+            def legacy():
+                for (k, labels), out in zip(runs, legacy_fns):
+                    legacy_write_single(spheres, out, k, labels)
+
+            def buffered():
+                write_seed_clusters(
+                    spheres, 0,
+                    [(out, k, labels) for (k, labels), out in zip(runs, new_fns)]
+                    )
+
+            t_legacy = timeit(legacy, repeat=args.repeat)
+            t_new = timeit(buffered, repeat=args.repeat)
+
+            identical = all(
+                open(a, "rb").read() == open(b, "rb").read()
+                for a, b in zip(legacy_fns, new_fns)
+                )
+            print("{}\t{}\t{:.4f}\t{:.4f}\t{:.1f}\t{}".format(
+                n, len(runs), t_legacy, t_new, t_legacy / t_new, identical
+                ))
+
+def add_parsers(sub):
+    p_parse = sub.add_parser(
+        "parse", help="sphere file parsing : legacy DataFrame build vs vectorized reader"
+    )
+    p_parse.add_argument(
+        "-n", "--sizes", nargs="+", default=[1000, 10000, 100000], type=int,
+        help="Number of spheres in each synthetic sphere set"
+    )
+    p_parse.add_argument(
+        "-r", "--repeat", default=3, type=int,
+        help="Number of repeats (best time is reported)"
+    )
+    p_parse.set_defaults(func=bench_parse)
+
+    p_writer = sub.add_parser(
+        "writer", help="clustered sphere files : per cluster line writes vs buffered writer"
+    )
+    p_writer.add_argument(
+        "-n", "--sizes", nargs="+", default=[1000, 100000], type=int,
+        help="Number of spheres in each synthetic sphere set"
+    )
+    p_writer.add_argument(
+        "-k", "--num_clusters", nargs="+", default=list(range(1, 51)), type=int,
+        help="Number of clusters (one file per k, written for a single seed)"
+    )
+    p_writer.add_argument(
+        "-r", "--repeat", default=3, type=int,
+        help="Number of repeats (best time is reported)"
+    )
+    p_writer.set_defaults(func=bench_writer)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import time
+
+from SphereUsage import SphereIndex, SphereAccumulator
+
+def legacy_sphere_usage(rows, num_spheres):
+    """
+    SphereUsage.jl : string coordinate keys in a dict and a double loop
+    over the 4 spheres of every pose
+    """
+    ms_ids = {}
+    usage = {}
+    cooc = np.zeros((num_spheres, num_spheres))
+    for values, is_ligand in rows:
+        spheres = []
+        for i in range(4):
+            coords = tuple(values[3 * i:3 * i + 3])
+            if coords not in ms_ids:
+                ms_ids[coords] = len(ms_ids)
+            spheres.append(ms_ids[coords])
+        for s in spheres:
+            counts = usage.setdefault(s, [0, 0, 0])
+            counts[0] += 1
+            counts[1 if is_ligand else 2] += 1
+        for s_i in spheres:
+            for s_j in spheres:
+                if s_i != s_j:
+                    cooc[s_i, s_j] += 1
+    return usage, cooc
+
+def bench_usage(args):
+    print("spheres\tposes\tlegacy_s\tvector_s\tposes_per_s\tidentical")
+    rng = np.random.RandomState(0)
+    for n in args.num_spheres:
+        coords = np.round(rng.normal(scale=10, size=(n, 3)), 3)
+        index = SphereIndex(coords)
+        for num_poses in args.sizes:
+            idx = np.argsort(rng.random_sample((num_poses, n)), axis=1)[:, :4] if n <= 64 else \
+                rng.randint(0, n, (num_poses, 4))
+            ligand = rng.random_sample(num_poses) < 0.1
+            oxr = coords[idx] + rng.uniform(-0.004, 0.004, (num_poses, 4, 3))
+
+            start = time.perf_counter()
+            acc = SphereAccumulator(n)
+            for b in range(0, num_poses, args.batch):
+                found = index.lookup(oxr[b:b + args.batch].reshape(-1, 3)).reshape(-1, 4)
+                acc.add(found, ligand[b:b + args.batch])
+            t_vector = time.perf_counter() - start
+
+            t_legacy = np.nan
+            identical = "-"
+            if num_poses <= args.max_legacy:
+                text = np.char.mod("%.3f", coords[idx]).reshape(num_poses, 12)
+                start = time.perf_counter()
+                _, cooc = legacy_sphere_usage(zip(text.tolist(), ligand), n)
+                t_legacy = time.perf_counter() - start
+
+                # legacy ids follow first appearance, compare on sphere rows
+                first = pd.unique(idx.ravel())
+                identical = np.array_equal(cooc[:first.size, :first.size], acc.cooc[np.ix_(first, first)])
+
+            print("{}\t{}\t{:.3f}\t{:.3f}\t{:.0f}\t{}".format(
+                n, num_poses, t_legacy, t_vector, num_poses / t_vector, identical
+                ))
+
+def add_parsers(sub):
+    p_usage = sub.add_parser(
+        "usage", help="sphere usage / co-occurrence : dict and double loop vs KD-tree accumulator"
+    )
+    p_usage.add_argument(
+        "-n", "--sizes", nargs="+", default=[100000, 1000000], type=int,
+        help="Number of poses"
+    )
+    p_usage.add_argument(
+        "-s", "--num_spheres", nargs="+", default=[45, 500], type=int,
+        help="Number of matching spheres"
+    )
+    p_usage.add_argument(
+        "-b", "--batch", default=1000000, type=int,
+        help="Poses per accumulator batch"
+    )
+    p_usage.add_argument(
+        "--max_legacy", default=100000, type=int,
+        help="Largest pose count timed with the double loop"
+    )
+    p_usage.set_defaults(func=bench_usage)
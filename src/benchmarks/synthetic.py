@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+import tracemalloc
+import gzip
+import time
+import os
+
+def timeit(func, *args, repeat=3):
+    """
+    returns the best wall time of repeated calls
+    """
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peak_memory(func, *args):
+    """
+    result, wall time and peak traced allocation (MB) of a call
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+def write_synthetic_sph(fn, num_spheres, seed=0):
+    """
+    writes a synthetic whole pocket sphere set in the DOCK layout
+    """
+    rng = np.random.RandomState(seed)
+    xyz = rng.normal(scale=15, size=(num_spheres, 3))
+    with open(fn, "w+") as f:
+        f.write("DOCK spheres within 10 ang of ligands \n")
+        f.write(
+            "cluster     1   number of spheres in cluster {:5d}\n".\
+                format(num_spheres)
+            )
+        for i, (x, y, z) in enumerate(xyz):
+            f.write(
+                "%5d%10.5f%10.5f%10.5f%8.3f%5d%2d%3d\n" % \
+                    ((i % 99999) + 1, x, y, z, 0.8, i % 99999, 0, 0)
+                )
+
+OUTDOCK_HEADER = (
+    "  mol#           id_num     flexiblecode  matched    nscored  time hac"
+    "    setnum    matnum   rank charge    elect +  gist +   vdW + psol +"
+    "  asol + inter + rec_e + rec_d + r_hyd =    Total\n"
+    )
+
+def write_synthetic_outdock(fn, num_mols, seed=0):
+    """
+    writes a synthetic OUTDOCK with score lines in the DOCK 3.7 layout
+    """
+    rng = np.random.RandomState(seed)
+    vdw = rng.normal(-30, 8, size=num_mols)
+    with open(fn, "w+") as f:
+        f.write(" open the file: /db/mol.db2.gz\n")
+        f.write(OUTDOCK_HEADER)
+        for i in range(num_mols):
+            f.write(
+                "%7d  ZINC%012d %6d %7d %7d %6.2f %2d %8d %9d %6d %7.2f"
+                "%9.2f%9.2f%9.2f%9.2f%9.2f%9.2f%9.2f%9.2f%9.2f%9.2f\n" % (
+                    i + 1, rng.randint(0, 10 ** 6), 0, rng.randint(1, 5000),
+                    rng.randint(1, 900), rng.rand(), 25, 10, 300, 1, 0.0,
+                    -10.0, 0.0, vdw[i], 1.0, -2.0, 0.0, 0.0, 0.0, 0.0, vdw[i] - 11
+                    ))
+            if i % 100 == 0:
+                f.write("      0  ZINC000000000009   no_match\n")
+        f.write("elapsed time (sec):   %.4f (hour):     %.4f\n" % (100.0, 0.0278))
+
+def synthetic_runs(num_runs, num_mols, seed=0):
+    """
+    (scores, ligand mask) of runs with about 2% ligands scored 6 lower
+    """
+    rng = np.random.RandomState(seed)
+    runs = []
+    for _ in range(num_runs):
+        ligand = rng.random_sample(num_mols) < 0.02
+        scores = rng.normal(-30, 8, num_mols) - 6 * ligand
+        runs.append((scores, ligand))
+    return runs
+
+def write_synthetic_timescores(fn, num_rows, seed=0):
+    """
+    merged_time_and_enrichment.tab of 4 receptors x 2 match types with
+    20 subclusters per run and as many k / seed runs as needed
+    """
+    rng = np.random.RandomState(seed)
+    receptors = np.array(["AA2AR", "EGFR", "AMPC", "DRD4"])
+    match_types = np.array(["c_match", "s_match"])
+    run = np.arange(num_rows) // 20
+    cluster = run // (receptors.size * match_types.size)
+    frame = pd.DataFrame({
+        "receptor" : receptors[run % receptors.size],
+        "match_type" : match_types[(run // receptors.size) % match_types.size],
+        "cluster_id" : ["k{}_{}".format(c % 12 + 1, c // 12) for c in cluster],
+        "subcluster" : ["subcluster{:04d}".format(i % 20) for i in range(num_rows)],
+        "time" : rng.random_sample(num_rows) * 100,
+        "auc" : rng.random_sample(num_rows) * 100,
+        "log_auc" : rng.normal(20, 10, num_rows)
+    })
+    frame.to_csv(fn, sep="\t", index=False)
+
+def write_synthetic_mol2(fn, num_poses, seed=0):
+    """
+    writes a mol2.gz of DOCK poses with the headers read by ParseMol2
+    """
+    rng = np.random.RandomState(seed)
+    with gzip.open(fn, "wt") as f:
+        for m in range(num_poses):
+            lines = [
+                "##########                 Name:     ZINC{:012d}".format(rng.randint(0, 10 ** 6)),
+                "##########               Number:     {}".format(m + 1)
+                ]
+            lines += [
+                "##########                  OXR     {:8.4f} {:8.4f} {:8.4f}".format(*c)
+                for c in rng.random_sample((4, 3)) * 10
+                ]
+            lines += ["##########         Total Energy:     {:.6f}".format(rng.normal(-30, 5))]
+            lines += ["@<TRIPOS>MOLECULE"]
+            lines += ["{:7d} C {:10.4f} {:10.4f} {:10.4f} C.3".format(i, *rng.random_sample(3)) for i in range(40)]
+            f.write("\n".join(lines) + "\n")
+
+def write_synthetic_meta(meta_dir, num_spheres, num_sdi_lines):
+    """
+    writes a minimal meta directory accepted by PrepareClusters
+    """
+    os.makedirs(os.path.join(meta_dir, "dockfiles"))
+    write_synthetic_sph(
+        os.path.join(meta_dir, "dockfiles", "matching_spheres.sph"), num_spheres
+        )
+    for fn in [
+            "vdw.vdw", "vdw.bmp", "trim.electrostatics.phi", "vdw.parms.amb.mindock",
+            "ligand.desolv.heavy", "ligand.desolv.hydrogen"
+            ]:
+        with open(os.path.join(meta_dir, "dockfiles", fn), "w+") as f:
+            f.write("\n")
+
+    with open(os.path.join(meta_dir, "INDOCK"), "w+") as f:
+        f.write("ligand_atom_file              split_database_index\n")
+        f.write("match_goal                    1000\n")
+        f.write("bump_rigid                    50.0\n")
+        f.write("receptor_sphere_file          ../dockfiles/matching_spheres.sph\n")
+        f.write("vdw_parameter_file            ../dockfiles/vdw.parms.amb.mindock\n")
+    for fn in ["ligands.names", "decoys.names"]:
+        with open(os.path.join(meta_dir, fn), "w+") as f:
+            f.write("mol\n")
+    with open(os.path.join(meta_dir, "enrichment_sdi"), "w+") as f:
+        for i in range(num_sdi_lines):
+            f.write("/db/mol{:08d}.db2.gz\n".format(i))
@@ -0,0 +1,5 @@
+import sys
+import os
+
+# the modules are scripts importing each other from src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from AdaptiveSweep import AdaptiveSweep, SuccessiveHalving, SimulatedScorer, has_results
+
+from benchmarks.synthetic import write_synthetic_meta
+
+def test_seeds_grow_by_eta_up_to_max_seeds():
+    search = SuccessiveHalving([1, 2, 4, 8], min_seeds=2, eta=3, max_seeds=20)
+    assert search.k_list == [2, 4, 8]
+    assert [search.seeds(r) for r in range(4)] == [2, 6, 18, 20]
+
+def test_keep_the_best_fraction():
+    search = SuccessiveHalving([2, 3, 4, 5, 6], eta=2)
+    scores = {2 : 0.1, 3 : np.nan, 4 : 0.5, 5 : 0.5, 6 : -0.2}
+    assert search.rank(scores) == [4, 5, 2, 6, 3]
+    assert search.keep(scores) == [2, 4, 5]
+    assert search.keep({7 : 1.0}) == [7]
+
+@pytest.fixture
+def sweep(tmp_path, monkeypatch):
+    meta_dir = str(tmp_path / "meta")
+    write_synthetic_meta(meta_dir, 45, 100)
+    os.makedirs(tmp_path / "sweep")
+    monkeypatch.chdir(tmp_path / "sweep")
+
+    def make(scorer=None, plateau=None, k_list=(2, 4, 6, 8)):
+        return AdaptiveSweep(
+            search = SuccessiveHalving(k_list, min_seeds=1, eta=2, max_seeds=8),
+            prepare_options = {"meta_dir" : meta_dir, "num_sdi_clusters" : 2},
+            plateau = plateau,
+            scorer = scorer,
+            serial = True
+            )
+    return make
+
+def read_state(fn="adaptive_sweep.tab"):
+    return pd.read_csv(fn, sep="\t")
+
+def test_simulated_search_halves_k_and_doubles_seeds(sweep):
+    assert sweep(SimulatedScorer(best_k=6, noise=0.1)).run()
+    state = read_state()
+
+    # 4 k values with 1 seed, then the best half with 2 seeds until one is left
+    assert state.groupby("round").k.apply(list).tolist() == [[2, 4, 6, 8], [6, 8]]
+    assert state.groupby("round").seeds.first().tolist() == [1, 2]
+    assert state.status.tolist() == ["dropped", "dropped", "kept", "kept", "best", "dropped"]
+
+    # only the runs of kept k values get new seeds
+    built = sorted(d for d in os.listdir(".") if d.startswith("k"))
+    assert built == ["k1_0", "k2_0", "k4_0", "k6_0", "k6_1", "k8_0", "k8_1"]
+
+def test_step_waits_for_every_run(sweep):
+    search = sweep()
+    assert not search.step()
+    assert read_state().status.unique().tolist() == ["pending"]
+    assert not has_results("k2_0")
+
+    # results of all but one run
+    scorer = SimulatedScorer()
+    for k in [1, 2, 4, 6]:
+        scorer.write(k, 0, 2)
+    assert not search.step()
+    assert read_state().status.unique().tolist() == ["pending"]
+
+    scorer.write(8, 0, 2)
+    assert not search.step()
+    state = read_state()
+    assert state[state["round"] == 0].status.isin(["kept", "dropped"]).all()
+    assert (state["round"] == 1).sum() == 2
+
+def test_plateau_stops_the_search(sweep):
+    # a flat LogAUC : the best score only moves by the seed noise
+    assert sweep(SimulatedScorer(gain=0.0, noise=0.0), plateau=1.0).run()
+    state = read_state()
+    assert state["round"].max() == 1
+    assert (state.status == "best").sum() == 1
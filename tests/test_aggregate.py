@@ -0,0 +1,233 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Aggregate import Aggregator
+from Cooccurrence import CoocStore
+from SphereUsage import OXR_FIELDS
+from Enrichment import directory_run, score_runs
+from Outdock import parse_outdock
+
+from benchmarks.synthetic import write_synthetic_outdock
+
+# rows of the receptor matching_spheres.sph, the last one is never hit
+SPHERES = [
+    ("1.000", "2.000", "3.000"), ("4.000", "5.000", "6.000"),
+    ("7.000", "8.000", "9.000"), ("0.500", "0.500", "0.500"),
+    ("2.500", "2.500", "2.500"), ("9.000", "9.000", "9.000")
+    ]
+
+def write_spheres(fn):
+    with open(fn, "w+") as f:
+        f.write("DOCK spheres within 10 ang of ligands \n")
+        f.write("cluster     1   number of spheres in cluster {:5d}\n".format(len(SPHERES)))
+        for i, xyz in enumerate(SPHERES):
+            f.write("%5d%10.5f%10.5f%10.5f%8.3f%5d%2d%3d\n" % (i + 1, *map(float, xyz), 0.8, i, 0, 0))
+
+def write_run(run_dir, times, hits):
+    """
+    the time_and_enrichment.tab and coords.tab Extract.jl writes, hits
+    is a list of (sphere indices, type)
+    """
+    os.makedirs(run_dir)
+    with open(os.path.join(run_dir, "time_and_enrichment.tab"), "w+") as f:
+        for sub, (t, auc, log_auc) in enumerate(times):
+            f.write("{}/subcluster{:04d}\t{}\t{}\t{}\n".format(run_dir, sub, t, auc, log_auc))
+    with open(os.path.join(run_dir, "coords.tab"), "w+") as f:
+        f.write("\t".join(["sub_idx", "cls_idx", "mol_name", "mol_idx", "mol_total"] + OXR_FIELDS + ["Type"]) + "\n")
+        for i, (spheres, kind) in enumerate(hits):
+            oxr = [c for s in spheres for c in SPHERES[s]]
+            f.write("\t".join(["subcluster0000", "1", "ZINC{}".format(i), str(i), "-40.0"] + oxr + [kind]) + "\n")
+
+def write_outdocks(run_dir, num_subclusters, seed=0):
+    """
+    synthetic subcluster OUTDOCKs of a run with one molecule in 20 a
+    ligand and the rest decoys
+    """
+    names = []
+    for sub in range(num_subclusters):
+        os.makedirs(os.path.join(run_dir, "subcluster{:04d}".format(sub)))
+        fn = os.path.join(run_dir, "subcluster{:04d}".format(sub), "OUTDOCK")
+        write_synthetic_outdock(fn, 300, seed=seed + sub)
+        names.extend(parse_outdock(fn)[0]["mol_name"].tolist())
+    names = sorted(set(names))
+    with open(os.path.join(run_dir, "ligands.names"), "w+") as f:
+        f.write("".join(n + "\n" for n in names[::20]))
+    with open(os.path.join(run_dir, "decoys.names"), "w+") as f:
+        f.write("".join(n + "\n" for i, n in enumerate(names) if i % 20))
+
+@pytest.fixture
+def experiment(tmp_path):
+    sweep = tmp_path / "experiment" / "AA2AR" / "ms"
+    os.makedirs(sweep)
+    with open(sweep / "dirlist", "w+") as f:
+        for run in ["k1_0", "k2_0"]:
+            f.write("./{}/subcluster0000\n./{}/subcluster0001\n".format(run, run))
+    write_run(str(sweep / "k1_0"), [(100.0, 70.0, 20.0), (120.0, 70.0, 20.0)], [
+        ([0, 1, 2, 3], "ligand"), ([0, 1, 2, 4], "decoy")
+        ])
+    write_run(str(sweep / "k2_0"), [(40.0, 72.0, 25.0), (30.0, 72.0, 25.0)], [
+        ([4, 3, 1, 0], "decoy")
+        ])
+    write_spheres(str(tmp_path / "matching_spheres.sph"))
+    return str(tmp_path / "experiment")
+
+def sphere_files(experiment):
+    return {None : os.path.join(os.path.dirname(experiment), "matching_spheres.sph")}
+
+def aggregate(experiment, output, **kwargs):
+    kwargs.setdefault("sphere_files", sphere_files(experiment))
+    agg = Aggregator([experiment], output, serial=True, **kwargs)
+    assert agg.run()
+    return agg
+
+def test_merged_time_and_enrichment(experiment, tmp_path):
+    aggregate(experiment, str(tmp_path / "data"))
+    frame = pd.read_csv(tmp_path / "data" / "merged_time_and_enrichment.tab", sep="\t")
+    assert frame[["receptor", "match_type", "cluster_id", "subcluster"]].values.tolist() == [
+        ["AA2AR", "ms", "k1_0", "subcluster0000"], ["AA2AR", "ms", "k1_0", "subcluster0001"],
+        ["AA2AR", "ms", "k2_0", "subcluster0000"], ["AA2AR", "ms", "k2_0", "subcluster0001"]
+        ]
+    assert frame.time.tolist() == [100.0, 120.0, 40.0, 30.0]
+    assert frame.log_auc.tolist() == [20.0, 20.0, 25.0, 25.0]
+    assert frame.score_source.unique().tolist() == ["extract"]
+    assert frame.log_auc_lo.isna().all()
+
+def test_sphere_usage_and_cooccurrence(experiment, tmp_path):
+    aggregate(experiment, str(tmp_path / "data"))
+    usage = pd.read_csv(tmp_path / "data" / "sphere_usage.tab", sep="\t")
+
+    k1 = usage[usage.cluster_id == "k1_0"].set_index("ms_id")
+    assert k1.Usage.to_dict() == {1 : 2, 2 : 2, 3 : 2, 4 : 1, 5 : 1}
+    assert k1.Ligand_Usage.to_dict() == {1 : 1, 2 : 1, 3 : 1, 4 : 1, 5 : 0}
+    assert (k1.Usage == k1.Ligand_Usage + k1.Decoy_Usage).all()
+    assert k1.loc[4, ["x", "y", "z"]].tolist() == [0.5, 0.5, 0.5]
+    # ids are the sphere file rows, shared by every run of the receptor
+    k2 = usage[usage.cluster_id == "k2_0"]
+    assert sorted(k2.ms_id) == [1, 2, 4, 5]
+
+    store = CoocStore(str(tmp_path / "data" / "co-occurrence"))
+    mat = np.asarray(store.get(("AA2AR", "ms", "k1_0")))
+    assert mat.shape == (len(SPHERES), len(SPHERES))
+    np.testing.assert_array_equal(mat, mat.T)
+    assert mat[0, 1] == 2 and mat[0, 3] == 1 and mat[3, 4] == 0
+    assert np.diag(mat).sum() == 0
+    assert np.asarray(store.get(("AA2AR", "ms", "k2_0")))[3, 4] == 1
+
+def test_wide_cooccurrence_table(experiment, tmp_path):
+    aggregate(experiment, str(tmp_path / "data"), cooc_format="tab")
+    frame = pd.read_csv(tmp_path / "data" / "co-occurrence.tab", sep="\t")
+    assert frame.shape == (2 * len(SPHERES), 3 + len(SPHERES))
+    store_rows = frame[frame.cluster_id == "k1_0"].iloc[:, 3:].values
+    np.testing.assert_array_equal(store_rows, store_rows.T)
+
+class RecordingAggregator(Aggregator):
+    """
+    records the directories it processes (serial only)
+    """
+
+    def process(self, run_dir, outdock=None):
+        self.processed.append(run_dir)
+        super().process(run_dir, outdock)
+
+def test_unchanged_directories_are_not_processed(experiment, tmp_path):
+    agg = aggregate(experiment, str(tmp_path / "data"))
+    k1 = os.path.join(experiment, "AA2AR", "ms", "k1_0")
+    k2 = os.path.join(experiment, "AA2AR", "ms", "k2_0")
+    built = os.stat(agg.part_fn(k1)).st_mtime_ns
+
+    with open(os.path.join(k2, "time_and_enrichment.tab"), "a") as f:
+        f.write("{}/subcluster0002\t10.0\t72.0\t25.0\n".format(k2))
+
+    agg = RecordingAggregator([experiment], str(tmp_path / "data"), serial=True, sphere_files=sphere_files(experiment))
+    agg.processed = []
+    assert agg.run()
+    assert agg.processed == [k2]
+    assert os.stat(agg.part_fn(k1)).st_mtime_ns == built
+    frame = pd.read_csv(tmp_path / "data" / "merged_time_and_enrichment.tab", sep="\t")
+    assert (frame.cluster_id == "k2_0").sum() == 3
+
+def test_unmatched_coordinates_are_not_counted(experiment, tmp_path):
+    # the receptor file without its spheres 5 and 6
+    fn = sphere_files(experiment)[None]
+    with open(fn, "r") as f:
+        lines = f.readlines()
+    with open(fn, "w+") as f:
+        f.writelines(lines[:6])
+    aggregate(experiment, str(tmp_path / "data"))
+    usage = pd.read_csv(tmp_path / "data" / "sphere_usage.tab", sep="\t")
+    assert sorted(usage[usage.cluster_id == "k1_0"].ms_id) == [1, 2, 3, 4]
+
+def test_usage_needs_sphere_files(experiment, tmp_path, capsys):
+    aggregate(experiment, str(tmp_path / "data"), sphere_files={})
+    assert "no matching_spheres.sph given for AA2AR" in capsys.readouterr().out
+    usage = pd.read_csv(tmp_path / "data" / "sphere_usage.tab", sep="\t")
+    assert usage.empty
+    times = pd.read_csv(tmp_path / "data" / "merged_time_and_enrichment.tab", sep="\t")
+    assert times.shape[0] == 4
+
+def test_failed_directories_are_reported(experiment, tmp_path):
+    os.remove(os.path.join(experiment, "AA2AR", "ms", "k2_0", "time_and_enrichment.tab"))
+    agg = Aggregator([experiment], str(tmp_path / "data"), serial=True)
+    assert not agg.run()
+    frame = pd.read_csv(tmp_path / "data" / "aggregate_failures.tab", sep="\t")
+    assert frame.task.tolist() == [os.path.join(experiment, "AA2AR", "ms", "k2_0")]
+    times = pd.read_csv(tmp_path / "data" / "merged_time_and_enrichment.tab", sep="\t")
+    assert times.cluster_id.unique().tolist() == ["k1_0"]
+
+def outdock_percent(run_dir):
+    auc, log_auc = score_runs([directory_run(run_dir)[1]])
+    return round(auc[0] * 100, 4), round(log_auc[0] * 100, 4)
+
+def test_outdock_scores_are_kept_beside_extract(experiment, tmp_path):
+    sweep = os.path.join(experiment, "AA2AR", "ms")
+    for seed, run in enumerate(["k1_0", "k2_0"]):
+        write_outdocks(os.path.join(sweep, run), 2, seed=10 * seed)
+    aggregate(experiment, str(tmp_path / "data"), bootstrap=20)
+    frame = pd.read_csv(tmp_path / "data" / "merged_time_and_enrichment.tab", sep="\t")
+
+    # the Extract.jl values stay in auc / log_auc
+    assert frame.log_auc.tolist() == [20.0, 20.0, 25.0, 25.0]
+    assert frame.score_source.unique().tolist() == ["extract"]
+    for run in ["k1_0", "k2_0"]:
+        rows = frame[frame.cluster_id == run]
+        auc, log_auc = outdock_percent(os.path.join(sweep, run))
+        assert rows.outdock_auc.tolist() == [auc, auc]
+        assert rows.outdock_log_auc.tolist() == [log_auc, log_auc]
+        assert (rows.log_auc_lo <= rows.outdock_log_auc).all()
+        assert (rows.outdock_log_auc <= rows.log_auc_hi).all()
+
+def test_outdock_scores_replace_extract_with_flag(experiment, tmp_path):
+    sweep = os.path.join(experiment, "AA2AR", "ms")
+    for seed, run in enumerate(["k1_0", "k2_0"]):
+        write_outdocks(os.path.join(sweep, run), 2, seed=10 * seed)
+    aggregate(experiment, str(tmp_path / "data"), bootstrap=0, scores="outdock")
+    frame = pd.read_csv(tmp_path / "data" / "merged_time_and_enrichment.tab", sep="\t")
+
+    assert frame.score_source.unique().tolist() == ["outdock"]
+    assert (frame.log_auc == frame.outdock_log_auc).all()
+    assert frame.log_auc.tolist()[0] == outdock_percent(os.path.join(sweep, "k1_0"))[1]
+
+def test_batches_do_not_change_scores(experiment, tmp_path):
+    sweep = os.path.join(experiment, "AA2AR", "ms")
+    for seed, run in enumerate(["k1_0", "k2_0"]):
+        write_outdocks(os.path.join(sweep, run), 2, seed=10 * seed)
+    aggregate(experiment, str(tmp_path / "batched"), bootstrap=0)
+
+    agg = Aggregator([experiment], str(tmp_path / "single"), serial=True, bootstrap=0)
+    agg.batch_size = 1
+    assert agg.run()
+    batched = pd.read_csv(tmp_path / "batched" / "merged_time_and_enrichment.tab", sep="\t")
+    single = pd.read_csv(tmp_path / "single" / "merged_time_and_enrichment.tab", sep="\t")
+    pd.testing.assert_frame_equal(batched, single)
+
+def test_missing_outdocks_fail_with_outdock_scores(experiment, tmp_path):
+    sweep = os.path.join(experiment, "AA2AR", "ms")
+    write_outdocks(os.path.join(sweep, "k1_0"), 2)
+    agg = Aggregator([experiment], str(tmp_path / "data"), serial=True, bootstrap=0, scores="outdock")
+    assert not agg.run()
+    frame = pd.read_csv(tmp_path / "data" / "aggregate_failures.tab", sep="\t")
+    assert frame.task.tolist() == [os.path.join(sweep, "k2_0")]
+    assert "--scores outdock" in frame.error[0]
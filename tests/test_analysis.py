@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from Analysis import load_timescores, aggregate_scores, prepare_timescores, run_means, box_stats, sample_rows
+
+from benchmarks.synthetic import write_synthetic_timescores
+from benchmarks.analysis import legacy_load_timescores
+
+def test_matches_row_wise_startup(tmp_path):
+    fn = str(tmp_path / "merged_time_and_enrichment.tab")
+    write_synthetic_timescores(fn, 4000)
+    time_scores = load_timescores(fn)
+    legacy_scores, legacy_agg = legacy_load_timescores(fn)
+
+    np.testing.assert_allclose(time_scores.pc_enrich, legacy_scores.pc_enrich, atol=1e-12)
+    np.testing.assert_allclose(time_scores.speedup, legacy_scores.speedup)
+    np.testing.assert_array_equal(time_scores.k, legacy_scores.k)
+    np.testing.assert_allclose(aggregate_scores(time_scores).value, legacy_agg.value, atol=1e-12)
+
+def test_outdock_change_and_intervals():
+    frame = pd.DataFrame({
+        "receptor" : ["AA2AR"] * 3,
+        "match_type" : ["ms"] * 3,
+        "cluster_id" : ["k1_0", "k2_0", "k3_0"],
+        "time" : [100.0, 50.0, 25.0],
+        "auc" : [70.0, 70.0, 70.0],
+        "log_auc" : [20.0, 30.0, 10.0],
+        "outdock_log_auc" : [10.0, 12.0, np.nan],
+        "log_auc_lo" : [8.0, 11.0, np.nan],
+        "log_auc_hi" : [12.0, 14.0, np.nan]
+    })
+    frame = prepare_timescores(frame)
+
+    # the Extract.jl change is against the Extract.jl baseline only
+    assert frame.pc_enrich.tolist() == [0.0, 0.5, -0.5]
+    np.testing.assert_allclose(frame.pc_enrich_outdock, [0.0, 0.2, np.nan])
+    np.testing.assert_allclose(frame.pc_enrich_lo, [-0.2, 0.1, np.nan])
+    np.testing.assert_allclose(frame.pc_enrich_hi, [0.2, 0.4, np.nan])
+    assert frame.significant.tolist() == [False, True, False]
+    assert frame.speedup.tolist() == [1.0, 2.0, 4.0]
+
+    means = run_means(frame)
+    assert "pc_enrich_outdock" in means.columns
+
+def test_box_stats_match_per_group_quantiles():
+    rng = np.random.RandomState(0)
+    frame = pd.DataFrame({
+        "k" : rng.randint(1, 4, 3000),
+        "match_type" : rng.choice(["c_match", "s_match"], 3000),
+        "speedup" : rng.standard_cauchy(3000)
+    })
+    frame.loc[::50, "speedup"] = np.nan
+    boxes, outliers = box_stats(frame, ["k", "match_type"], "speedup")
+
+    assert boxes.shape[0] == 6
+    assert boxes["count"].sum() == frame.speedup.notna().sum()
+    for _, box in boxes.iterrows():
+        values = frame[(frame.k == box.k) & (frame.match_type == box.match_type)].speedup.dropna().values
+        q1, median, q3 = np.percentile(values, [25, 50, 75])
+        assert np.allclose([box.q1, box["median"], box.q3, box["mean"]], [q1, median, q3, values.mean()])
+        inside = values[(values >= q1 - 1.5 * (q3 - q1)) & (values <= q3 + 1.5 * (q3 - q1))]
+        assert box.lowerfence == inside.min() and box.upperfence == inside.max()
+        group = outliers[(outliers.k == box.k) & (outliers.match_type == box.match_type)]
+        assert group.shape[0] == values.size - inside.size
+    assert outliers.speedup.notna().all()
+
+def test_sample_rows_caps_and_keeps_order():
+    frame = pd.DataFrame({"x" : np.arange(100)})
+    assert sample_rows(frame, 200) is frame
+    sample = sample_rows(frame, 10)
+    assert sample.shape[0] == 10
+    assert sample.index.is_monotonic_increasing
+    assert sample.equals(sample_rows(frame, 10))
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from SphereFile import SphereSet
+from BatchKMeans import BatchKMeans
+from Backends import BACKENDS
+
+from benchmarks.synthetic import write_synthetic_sph
+
+@pytest.fixture
+def coords(tmp_path):
+    fn = str(tmp_path / "spheres.sph")
+    write_synthetic_sph(fn, 200)
+    return SphereSet.from_file(fn).coords
+
+@pytest.mark.parametrize("name", sorted(BACKENDS))
+def test_labels_for_every_k_and_seed(coords, name):
+    backend = BACKENDS[name]()
+    labels = backend.fit(coords, [1, 3, 6], [0, 1])
+    assert sorted(labels) == [(k, s) for k in [1, 3, 6] for s in [0, 1]]
+    for l in labels.values():
+        assert l.shape == (coords.shape[0],)
+        assert l.min() == 0
+    if backend.deterministic:
+        for k in [1, 3, 6]:
+            np.testing.assert_array_equal(labels[(k, 0)], labels[(k, 1)])
+
+def test_kmeans_backend_matches_batch_kmeans(coords):
+    labels = BACKENDS["kmeans"]().fit(coords, [4], [0, 3])
+    expected = BatchKMeans(4, [0, 3]).fit_predict(coords)
+    np.testing.assert_array_equal(labels[(4, 0)], expected[0])
+    np.testing.assert_array_equal(labels[(4, 3)], expected[1])
+
+@pytest.mark.parametrize("name", ["ward", "grid"])
+def test_partitioners_give_k_clusters(coords, name):
+    labels = BACKENDS[name]().fit(coords, [2, 5, 9], [0])
+    for k in [2, 5, 9]:
+        assert np.unique(labels[(k, 0)]).size == k
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from sklearn.cluster import KMeans
+
+from SphereFile import SphereSet
+from BatchKMeans import BatchKMeans
+
+from benchmarks.synthetic import write_synthetic_sph
+
+@pytest.mark.parametrize("num_spheres", [45, 500])
+@pytest.mark.parametrize("k", [1, 2, 5, 12])
+def test_labels_match_sklearn(tmp_path, num_spheres, k):
+    fn = str(tmp_path / "spheres.sph")
+    write_synthetic_sph(fn, num_spheres)
+    X = SphereSet.from_file(fn).coords
+    seeds = range(8)
+
+    expected = np.array([
+        KMeans(n_clusters=k, random_state=seed).fit_predict(X) for seed in seeds
+        ])
+    np.testing.assert_array_equal(BatchKMeans(k, seeds).fit_predict(X), expected)
+
+def test_seed_order_does_not_change_labels(tmp_path):
+    fn = str(tmp_path / "spheres.sph")
+    write_synthetic_sph(fn, 200)
+    X = SphereSet.from_file(fn).coords
+
+    forward = BatchKMeans(4, [0, 1, 2]).fit_predict(X)
+    backward = BatchKMeans(4, [2, 1, 0]).fit_predict(X)
+    np.testing.assert_array_equal(forward, backward[::-1])
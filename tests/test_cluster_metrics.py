@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from sklearn.metrics import silhouette_score
+
+from ClusterMetrics import ClusterMetrics, prune_reason
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(300, 3))
+    labels = rng.randint(0, 4, size=300)
+    return X, labels
+
+@pytest.mark.parametrize("max_pairwise", [4096, 10])
+def test_metrics_match_direct_computation(data, max_pairwise):
+    X, labels = data
+    m = ClusterMetrics(X, max_pairwise=max_pairwise, sample_size=300).compute(labels)
+
+    sizes = np.bincount(labels)
+    centers = np.array([X[labels == i].mean(axis=0) for i in range(4)])
+    diameters = [
+        np.linalg.norm(X[labels == i][:, None] - X[labels == i][None], axis=2).max()
+        for i in range(4)
+        ]
+    assert m["n_clusters"] == 4
+    assert (m["min_size"], m["max_size"]) == (sizes.min(), sizes.max())
+    assert m["inertia"] == pytest.approx(((X - centers[labels]) ** 2).sum())
+    assert m["silhouette"] == pytest.approx(silhouette_score(X, labels))
+    assert m["max_diameter"] == pytest.approx(max(diameters))
+
+def test_prune_reason(data):
+    X, labels = data
+    m = ClusterMetrics(X).compute(labels)
+    assert prune_reason(m, k=4) == ""
+    assert prune_reason(m, k=5, min_size=m["min_size"] + 1) == "k_mismatch,min_size"
+    assert prune_reason(m, max_size_cv=0.0, min_silhouette=1.0) == "size_cv,silhouette"
+
+    single = ClusterMetrics(X).compute(np.zeros(300, dtype=int))
+    assert np.isnan(single["silhouette"])
+    assert prune_reason(single, min_silhouette=0.5) == ""
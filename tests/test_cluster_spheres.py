@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pytest
+
+from ClusterSpheres import PrepareClusters, partition_hash
+
+from benchmarks.synthetic import write_synthetic_meta
+
+@pytest.fixture
+def meta(tmp_path, monkeypatch):
+    """
+    a synthetic meta directory, the sweep is built in tmp_path/sweep
+    """
+    meta_dir = str(tmp_path / "meta")
+    write_synthetic_meta(meta_dir, 45, 100)
+    os.makedirs(tmp_path / "sweep")
+    monkeypatch.chdir(tmp_path / "sweep")
+    return meta_dir
+
+def build(meta_dir, k_list, num_iter=1, **kwargs):
+    pc = PrepareClusters(meta_dir, k_list, num_iter=num_iter, num_sdi_clusters=4, serial=True, **kwargs)
+    assert pc.build_clusters()
+    return pc
+
+def read(fn):
+    with open(fn) as f:
+        return f.read()
+
+def test_classic_layout_copies_sdi_and_links_meta(meta):
+    build(meta, [2, 3])
+    for dir_name in ["k2_0", "k3_0"]:
+        for bn in ["ligands.names", "decoys.names", "enrichment_sdi"]:
+            assert os.path.islink(os.path.join(dir_name, bn))
+        assert os.path.islink(os.path.join(dir_name, "dockfiles", "vdw.vdw"))
+        assert not os.path.islink(os.path.join(dir_name, "dockfiles", "matching_spheres.sph"))
+        assert "k_clusters" in read(os.path.join(dir_name, "INDOCK"))
+
+        shards = [
+            os.path.join(dir_name, "subcluster{:04d}".format(i), "split_database_index")
+            for i in range(4)
+            ]
+        assert not any(os.path.islink(fn) for fn in shards)
+        lines = [l for fn in shards for l in read(fn).splitlines()]
+        assert sorted(lines) == sorted(read(os.path.join(meta, "enrichment_sdi")).splitlines())
+        assert read(os.path.join(dir_name, "dirlist")).split() == [
+            "./subcluster{:04d}".format(i) for i in range(4)
+            ]
+    assert len(read("dirlist").split()) == 8
+
+def test_shared_layout_links_the_store(meta):
+    build(meta, [2], layout="shared")
+    assert not os.path.exists(os.path.join("k2_0", "ligands.names"))
+    assert os.listdir(os.path.join("k2_0", "dockfiles")) == ["matching_spheres.sph"]
+    assert "../../shared/dockfiles/vdw.parms.amb.mindock" in read(os.path.join("k2_0", "INDOCK"))
+
+    manifest = dict(
+        l.split("\t") for l in read(os.path.join("k2_0", "manifest.tab")).splitlines()[1:]
+        )
+    assert manifest["layout"] == "shared"
+    for i in range(4):
+        sub = os.path.join("k2_0", "subcluster{:04d}".format(i))
+        shard = manifest["subcluster{:04d}".format(i)]
+        assert os.path.samefile(os.path.join(sub, "split_database_index"), shard)
+        assert os.path.samefile(os.path.join(sub, "INDOCK"), os.path.join("k2_0", "INDOCK"))
+
+def test_incremental_build_only_rebuilds_changed_runs(meta):
+    build(meta, [2, 3], incremental=True)
+    marker = os.path.join("k2_0", "subcluster0000", "OUTDOCK")
+    with open(marker, "w+") as f:
+        f.write("docked\n")
+    built = os.stat(os.path.join("k3_0", "INDOCK")).st_mtime_ns
+
+    # new k values are added, unchanged runs keep their DOCK output
+    build(meta, [2, 3, 4], incremental=True)
+    assert os.path.isfile(marker)
+    assert os.stat(os.path.join("k3_0", "INDOCK")).st_mtime_ns == built
+    assert os.path.isdir("k4_0")
+    assert sorted(read("build_manifest.tab").splitlines()[1:])[2].startswith("k4_0\t")
+
+    # a changed INDOCK parameter replaces every run
+    build(meta, [2, 3, 4], incremental=True, indock_params={"match_goal" : "500"})
+    assert not os.path.isfile(marker)
+    assert "500" in read(os.path.join("k2_0", "INDOCK"))
+
+def test_existing_directories_fail_without_incremental(meta):
+    build(meta, [2])
+    marker = os.path.join("k2_0", "subcluster0000", "OUTDOCK")
+    with open(marker, "w+") as f:
+        f.write("docked\n")
+    pc = PrepareClusters(meta, [2], num_sdi_clusters=4, serial=True)
+    assert not pc.build_clusters()
+    assert os.path.isfile(marker)
+    assert "k2_0" in read("build_failures.tab")
+
+def test_classic_layout_leaves_no_store(meta):
+    build(meta, [2, 3])
+    assert sorted(os.listdir(".")) == [
+        "backend_timing.tab", "build_manifest.tab", "dirlist", "k2_0", "k3_0"
+        ]
+
+def test_shared_store_is_reused(meta):
+    build(meta, [2], layout="shared", incremental=True)
+    shards = os.listdir(os.path.join("shared", "sdi"))
+    build(meta, [2, 3], layout="shared", incremental=True)
+    assert os.listdir(os.path.join("shared", "sdi")) == shards
+    assert os.path.samefile(
+        os.path.join("k2_0", "subcluster0001", "split_database_index"),
+        os.path.join("k3_0", "subcluster0001", "split_database_index")
+        )
+
+def test_run_indock_overrides(meta):
+    build(meta, [3], scale_match_goal=True, indock_params={"bump_maximum" : "10.0"})
+    lines = read(os.path.join("k3_0", "INDOCK")).splitlines()
+    assert "match_goal                    333" in lines
+    assert lines[lines.index("bump_rigid                    50.0") + 1] == "k_clusters                    3"
+    assert lines[-1] == "bump_maximum                  10.0"
+
+def test_metrics_only_written_when_asked_or_pruning(meta):
+    build(meta, [2, 3])
+    assert not os.path.isfile("cluster_metrics.tab")
+
+    build(meta, [2, 3], incremental=True, metrics=True)
+    rows = read("cluster_metrics.tab").splitlines()
+    assert len(rows) == 3
+    assert rows[1].split("\t")[-1] == "-"
+
+    # a failed prune removes the run and names the reason
+    pc = PrepareClusters(meta, [2, 3], num_sdi_clusters=4, serial=True, prune={"min_size" : 45})
+    assert pc.evaluate_runs(pc.cluster_seeds()) == []
+    assert all(r.endswith("\tmin_size") for r in read("cluster_metrics.tab").splitlines()[1:])
+
+    build(meta, [2, 3], incremental=True)
+    assert not os.path.isfile("cluster_metrics.tab")
+
+def test_partition_hash_ignores_label_numbering():
+    labels = np.array([0, 0, 1, 2, 1, 2])
+    assert partition_hash(labels) == partition_hash(np.array([2, 2, 0, 1, 0, 1]))
+    assert partition_hash(labels) == partition_hash(labels.astype(np.int64) + 5)
+    assert partition_hash(labels) != partition_hash(np.array([0, 0, 1, 2, 2, 1]))
+
+def test_dedupe_builds_one_directory_per_partition(meta):
+    pc = build(meta, [1, 3], num_iter=3, dedupe=True)
+    labels = pc.cluster_seeds()
+
+    # every seed of k1 has the same partition
+    assert not os.path.isdir("k1_1") and not os.path.isdir("k1_2")
+    rows = [l.split("\t") for l in read("seed_aliases.tab").splitlines()[1:]]
+    assert [r[:4] for r in rows if r[0] == "1"] == [
+        ["1", str(n), "k1_{}".format(n), "k1_0"] for n in range(3)
+        ]
+
+    for k, n, dir_name, run_dir, h in rows:
+        assert h == partition_hash(labels[(int(k), int(n))])
+        assert os.path.isdir(run_dir)
+        assert os.path.isdir(dir_name) == (dir_name == run_dir)
+        same = [r[1] for r in rows if r[0] == k and r[4] == h]
+        assert run_dir == "k{}_{}".format(k, min(same, key=int))
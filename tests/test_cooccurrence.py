@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from Cooccurrence import CoocWriter, CoocStore, store_fns
+
+def test_round_trip_keeps_every_run_size(tmp_path):
+    prefix = str(tmp_path / "co-occurrence")
+    rng = np.random.RandomState(0)
+    runs = {
+        ("AA2AR", "ms", "k1_0") : rng.randint(0, 1000, (45, 45)),
+        ("AA2AR", "ms", "k2_0") : rng.randint(0, 1000, (45, 45)),
+        ("EGFR", "ms", "k1_0") : rng.randint(0, 1000, (12, 12)),
+        ("DRD4", "ms", "k1_0") : np.zeros((0, 0), dtype=int),
+        }
+    writer = CoocWriter(prefix, [m.shape[0] for m in runs.values()])
+    for key, mat in runs.items():
+        writer.add(key, mat)
+    writer.close()
+
+    assert CoocStore.exists(prefix)
+    assert not any(fn.endswith(".tmp") for fn in store_fns(prefix))
+    store = CoocStore(prefix)
+    assert list(store.keys()) == list(runs)
+    for key, mat in runs.items():
+        np.testing.assert_array_equal(store.get(key), mat)
+    # no padding is stored
+    assert store.data.size == 2 * 45 * 45 + 12 * 12
+    assert ("EGFR", "ms", "k2_0") not in store
+    assert store.get(("EGFR", "ms", "k2_0")).shape == (0, 0)
+
+def test_overflowing_counts_are_rejected(tmp_path):
+    writer = CoocWriter(str(tmp_path / "co-occurrence"), [2], dtype=np.int16)
+    with pytest.raises(ValueError, match="overflows"):
+        writer.add(("AA2AR", "ms", "k1_0"), np.array([[0, 40000], [40000, 0]]))
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from Analysis import load_timescores
+from DataStore import DataStore, convert, find_table
+
+from benchmarks.synthetic import write_synthetic_timescores
+
+def test_tables_are_loaded_on_first_use(tmp_path):
+    write_synthetic_timescores(str(tmp_path / "merged_time_and_enrichment.tab"), 2000)
+    store = DataStore(str(tmp_path))
+    assert store.tables == {}
+
+    # no sphere usage table : only fails once it is asked for
+    scores = store.receptor_scores("EGFR")
+    assert list(store.tables) == ["time_scores"]
+
+    frame = load_timescores(str(tmp_path / "merged_time_and_enrichment.tab"))
+    expected = frame[frame.receptor == "EGFR"]
+    assert scores.shape == expected.shape
+    np.testing.assert_allclose(np.sort(scores.pc_enrich.values), np.sort(expected.pc_enrich.values))
+    assert store.receptor_scores("AMPC").receptor.unique().tolist() == ["AMPC"]
+    assert store.receptor_scores("unknown").empty
+
+def test_converted_tables_are_preferred_when_up_to_date(tmp_path):
+    tab_fn = str(tmp_path / "merged_time_and_enrichment.tab")
+    write_synthetic_timescores(tab_fn, 200)
+    convert(str(tmp_path), "parquet")
+    assert find_table(str(tmp_path), "merged_time_and_enrichment")[0].endswith(".parquet")
+
+    # a newer tab separated table wins over its stale copy
+    os.utime(tab_fn, ns=(os.stat(tab_fn).st_atime_ns, os.stat(tab_fn).st_mtime_ns + 10 ** 9))
+    assert find_table(str(tmp_path), "merged_time_and_enrichment")[0] == tab_fn
+
+def test_wide_cooccurrence_drops_padding(tmp_path):
+    columns = ["receptor", "match_type", "cluster_id"] + ["sph.{}".format(i) for i in range(1, 4)]
+    rows = [
+        ["AA2AR", "ms", "k1_0", 0, 2, 1],
+        ["AA2AR", "ms", "k1_0", 2, 0, 3],
+        ["AA2AR", "ms", "k1_0", 1, 3, 0],
+        ["EGFR", "ms", "k1_0", 0, 4, np.nan],
+        ["EGFR", "ms", "k1_0", 4, 0, np.nan],
+        ]
+    pd.DataFrame(rows, columns=columns).to_csv(tmp_path / "co-occurrence.tab", sep="\t", index=False)
+    store = DataStore(str(tmp_path))
+    assert store.cooc_store() is None
+    np.testing.assert_array_equal(store.cooccurrence("EGFR", "ms", "k1_0"), [[0, 4], [4, 0]])
+    assert store.cooccurrence("AA2AR", "ms", "k1_0").shape == (3, 3)
@@ -0,0 +1,59 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from Enrichment import score_runs, bootstrap_runs, BOOT_TEMPORARIES
+
+from benchmarks.synthetic import synthetic_runs
+from benchmarks.enrichment import legacy_roc_scores
+
+@pytest.mark.parametrize("num_mols", [500, 2000, 20000])
+def test_scores_match_extract(num_mols):
+    runs = synthetic_runs(5, num_mols, seed=num_mols)
+    assert all(l.any() for _, l in runs)
+    auc, log_auc = score_runs(runs)
+    expected = np.array([legacy_roc_scores(*r) for r in runs])
+    np.testing.assert_allclose(auc, expected[:, 0], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(log_auc, expected[:, 1], rtol=0, atol=1e-9)
+
+def test_tied_scores_keep_input_order():
+    runs = [(np.round(s / 4), l) for s, l in synthetic_runs(3, 3000, seed=1)]
+    auc, log_auc = score_runs(runs)
+    expected = np.array([legacy_roc_scores(*r) for r in runs])
+    np.testing.assert_allclose(auc, expected[:, 0], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(log_auc, expected[:, 1], rtol=0, atol=1e-9)
+
+def test_runs_of_different_sizes_are_independent():
+    runs = synthetic_runs(2, 500, seed=2) + synthetic_runs(1, 4000, seed=3)
+    together = np.column_stack(score_runs(runs))
+    alone = np.array([np.column_stack(score_runs([r]))[0] for r in runs])
+    np.testing.assert_allclose(together, alone, rtol=0, atol=1e-12)
+
+def test_bootstrap_intervals_bound_their_point():
+    runs = synthetic_runs(4, 5000, seed=4)
+    auc, log_auc = score_runs(runs)
+    ci = bootstrap_runs(runs, num_boot=200)
+    assert np.all(ci["auc_lo"] <= auc) and np.all(auc <= ci["auc_hi"])
+    assert np.all(ci["log_auc_lo"] <= log_auc) and np.all(log_auc <= ci["log_auc_hi"])
+
+def test_bootstrap_is_seeded():
+    runs = synthetic_runs(2, 1000, seed=5)
+    a = bootstrap_runs(runs, num_boot=50, seed=3)
+    b = bootstrap_runs(runs, num_boot=50, seed=3)
+    for name in a:
+        np.testing.assert_array_equal(a[name], b[name])
+
+def test_bootstrap_blocks_stay_under_max_bytes():
+    runs = synthetic_runs(2, 20000, seed=6)
+    max_bytes = 10 * 40000 * 8 * BOOT_TEMPORARIES
+    tracemalloc.start()
+    small = bootstrap_runs(runs, num_boot=40, max_bytes=max_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 1.2 * max_bytes
+
+    # blocking does not change the resamples
+    one = bootstrap_runs(runs, num_boot=40)
+    for name in one:
+        np.testing.assert_array_equal(small[name], one[name])
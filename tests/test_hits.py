@@ -0,0 +1,80 @@
+import numpy as np
+import os
+import pytest
+
+from Hits import select_hits, BestScores, TopScores, ScoreCounts
+from Outdock import parse_directory
+
+from benchmarks.synthetic import write_synthetic_outdock
+from benchmarks.hits import legacy_hits
+
+@pytest.fixture(scope="module")
+def run_dir(tmp_path_factory):
+    dir_name = str(tmp_path_factory.mktemp("sweep") / "k2_0")
+    for i in range(3):
+        subdir = os.path.join(dir_name, "subcluster{:04d}".format(i))
+        os.makedirs(subdir)
+        write_synthetic_outdock(os.path.join(subdir, "OUTDOCK"), 2000, seed=i)
+    return dir_name
+
+@pytest.mark.parametrize("q", [0.01, 0.1, 0.5])
+def test_quantile_matches_extract(run_dir, q):
+    hits = select_hits(run_dir, q)
+    legacy = legacy_hits(run_dir, q)
+    assert [(h[0], h[1]) for h in hits] == list(zip(legacy.mol_name, legacy.Total))
+    assert [h[2] for h in hits] == list(zip(legacy.sub_idx, legacy.cls_idx, legacy.mol_idx))
+
+def test_top_matches_quantile_hits(run_dir):
+    hits = select_hits(run_dir, 0.1)
+    top = select_hits(run_dir, 0.1, top=len(hits))
+    assert sorted((h[1], h[0]) for h in top) == sorted((h[1], h[0]) for h in hits)
+
+def test_top_scores_bounded_best_n():
+    rng = np.random.RandomState(0)
+    names = ["mol{}".format(i) for i in rng.randint(0, 300, 5000)]
+    totals = np.round(rng.normal(-30, 5, 5000), 1)
+
+    best = BestScores()
+    top = TopScores(25)
+    for i, (name, total) in enumerate(zip(names, totals)):
+        best.add(name, total, i)
+        top.add(name, total, i)
+
+    assert len(top) == 25
+    assert len(top.heap) <= 2 * 25 + 16
+    expected = sorted(total for total, _ in best.best.values())[:25]
+    assert sorted(total for _, total, _ in top.items()) == expected
+    # every member keeps its best pose
+    for name, total, location in top.items():
+        assert (total, location) == best.best[name]
+
+def test_score_counts_quantile_matches_numpy():
+    rng = np.random.RandomState(1)
+    totals = np.round(rng.normal(-30, 5, 3000), 2)
+    counts = ScoreCounts()
+    for total in totals:
+        counts.add(total)
+    assert len(counts.counts) < totals.size
+    for q in [0, 0.01, 0.1, 0.5, 1]:
+        assert counts.quantile(q) == pytest.approx(np.quantile(totals, q), abs=1e-12)
+    assert np.isnan(ScoreCounts().quantile(0.1))
+
+@pytest.mark.parametrize("q", [0.01, 0.1])
+def test_bounded_quantile_counts_every_pose(run_dir, q):
+    _, scores, _ = parse_directory(run_dir)
+    totals = np.concatenate([s["Total"] for s in scores])
+    threshold = np.quantile(totals[~np.isnan(totals)], q)
+
+    hits = select_hits(run_dir, q, max_molecules=500)
+    exact = select_hits(run_dir, 1.0)
+    expected = [h for h in exact if h[1] < threshold]
+    assert hits == sorted(expected, key=lambda h : h[2])
+
+def test_best_scores_drop_the_map_past_max_molecules():
+    best = BestScores(max_molecules=10)
+    for i in range(25):
+        best.add("mol{}".format(i), float(i), i)
+    assert best.overflowed
+    assert len(best) == 0
+    assert best.counts.n == 25
+    assert best.quantile(0.5) == 12.0
@@ -0,0 +1,57 @@
+import pytest
+
+from Indock import IndockTemplate, parse_overrides
+
+INDOCK = (
+    "DOCK 3.7 parameter\n"
+    "#####################################################\n"
+    "# INPUT/OUTPUT\n"
+    "ligand_atom_file              split_database_index\n"
+    "match_goal                    1000\n"
+    "bump_rigid                    50.0   \n"
+    "\n"
+    "receptor_sphere_file          ../dockfiles/matching_spheres.sph\n"
+    "vdw_parameter_file            ../dockfiles/vdw.parms.amb.mindock"
+    )
+
+@pytest.fixture
+def template():
+    return IndockTemplate(INDOCK.splitlines(keepends=True))
+
+def test_render_without_overrides_is_verbatim(template):
+    assert template.render() == INDOCK
+
+def test_overrides_only_change_values(template):
+    text = template.render({"match_goal" : "333"})
+    assert text == INDOCK.replace("1000", "333")
+
+def test_new_keys_follow_anchor_or_are_appended(template):
+    text = template.render(
+        {"k_clusters" : "4", "check_clashes" : "yes"},
+        anchors = {"k_clusters" : "bump_rigid"}
+        )
+    lines = text.splitlines()
+    assert lines[5] == "bump_rigid                    50.0   "
+    assert lines[6] == "k_clusters                    4"
+    assert lines[-2] == "vdw_parameter_file            ../dockfiles/vdw.parms.amb.mindock"
+    assert lines[-1] == "check_clashes                 yes"
+
+def test_lookup_and_map_values(template):
+    assert "match_goal" in template
+    assert "k_clusters" not in template
+    assert template.get("bump_rigid") == "50.0"
+
+    mapped = template.map_values(lambda v : v.replace("../dockfiles/", "../../shared/dockfiles/"))
+    assert mapped.get("vdw_parameter_file") == "../../shared/dockfiles/vdw.parms.amb.mindock"
+    assert template.get("vdw_parameter_file") == "../dockfiles/vdw.parms.amb.mindock"
+    # comments are not values
+    assert mapped.render().splitlines()[2] == "# INPUT/OUTPUT"
+
+def test_parse_overrides():
+    assert parse_overrides(["match_goal=500", " bump_maximum = 10.0"]) == {
+        "match_goal" : "500", "bump_maximum" : "10.0"
+        }
+    assert parse_overrides(None) == {}
+    for bad in ["match_goal", "=500"]:
+        with pytest.raises(ValueError):
+            parse_overrides([bad])
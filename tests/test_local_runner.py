@@ -0,0 +1,68 @@
+import os
+
+import pandas as pd
+import pytest
+
+from LocalRunner import LocalRunner, longest_first
+
+@pytest.fixture
+def dirlist(tmp_path, monkeypatch):
+    """
+    4 entries whose command fails when they hold a fail file, and one
+    dirlist entry that is not a directory
+    """
+    monkeypatch.chdir(tmp_path)
+    with open("dirlist", "w+") as f:
+        for i in range(4):
+            entry = "k2_0/subcluster{:04d}".format(i)
+            os.makedirs(entry)
+            f.write("./{}\n".format(entry))
+        f.write("./k2_0/subcluster0009\n")
+    with open("k2_0/subcluster0002/fail", "w+") as f:
+        f.write("\n")
+    return "dirlist"
+
+COMMAND = "sh -c 'if [ -f fail ]; then echo bad pose >&2; exit 3; fi; echo done > OUTDOCK'"
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_failures_and_missing_entries_are_reported(dirlist, jobs):
+    runner = LocalRunner(dirlist, COMMAND, jobs=jobs)
+    assert not runner.run()
+
+    log = pd.read_csv("local_runs.tab", sep="\t")
+    assert sorted(log.entry) == ["./k2_0/subcluster{:04d}".format(i) for i in range(4)]
+    failed = log[log.status != 0]
+    assert failed.entry.tolist() == ["./k2_0/subcluster0002"]
+    assert failed.status.tolist() == [3]
+    assert failed.stderr.tolist() == ["bad pose"]
+    assert os.path.isfile("k2_0/subcluster0001/OUTDOCK")
+    with open("k2_0/subcluster0002/stderr") as f:
+        assert f.readline().startswith("HOST:")
+
+    failures = pd.read_csv("local_failures.tab", sep="\t")
+    assert failures.task.tolist() == ["./k2_0/subcluster0002", "./k2_0/subcluster0009"]
+    assert failures.error.tolist() == ["exit status 3 : bad pose", "not a directory"]
+
+def test_successful_run_removes_old_failures(dirlist):
+    assert not LocalRunner(dirlist, COMMAND, jobs=1).run()
+    os.remove("k2_0/subcluster0002/fail")
+    with open(dirlist) as f:
+        lines = f.readlines()[:4]
+    with open(dirlist, "w+") as f:
+        f.writelines(lines)
+    assert LocalRunner(dirlist, COMMAND, jobs=1).run()
+    assert not os.path.exists("local_failures.tab")
+
+def test_longest_first_uses_previous_log(dirlist):
+    entries = ["./k2_0/subcluster{:04d}".format(i) for i in range(4)]
+    with open("local_runs.tab", "w+") as f:
+        f.write("entry\tstatus\tseconds\thost\tstderr\n")
+        f.write("{}\t0\t5.0\th\t-\n".format(entries[0]))
+        f.write("{}\t0\t9.0\th\t-\n".format(entries[1]))
+        f.write("{}\t1\t99.0\th\t-\n".format(entries[2]))
+    runner = LocalRunner(dirlist, COMMAND, longest_first=True)
+    ordered, missing = runner.entries()
+    # entries without a successful previous time count as the longest one
+    assert ordered == [entries[1], entries[2], entries[3], entries[0]]
+    assert missing == ["./k2_0/subcluster0009"]
+    assert longest_first(entries, {}) == entries
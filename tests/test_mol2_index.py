@@ -0,0 +1,99 @@
+import numpy as np
+import gzip
+import os
+import pytest
+
+import Mol2Index
+from Mol2Index import Mol2Index as Index, scan_file, rechunked_fn
+
+from benchmarks.synthetic import write_synthetic_mol2
+from benchmarks.mol2_index import rescan_poses
+
+@pytest.fixture
+def subdir(tmp_path):
+    write_synthetic_mol2(str(tmp_path / "test.0001.mol2.gz"), 400, seed=0)
+    write_synthetic_mol2(str(tmp_path / "test.0002.mol2.gz"), 150, seed=1)
+    return str(tmp_path)
+
+def read(fn, decompress=False):
+    with (gzip.open if decompress else open)(fn, "rb") as f:
+        return f.read()
+
+@pytest.mark.parametrize("checkpoint", [None, 20000])
+def test_fetch_matches_rescan(subdir, checkpoint):
+    index = Index.build(subdir, checkpoint)
+    assert len(index) == 550
+
+    numbers = {1, 2, 77, 150, 151, 399, 400}
+    for file_idx, fn in enumerate(Mol2Index.mol2_files(subdir)):
+        expected = rescan_poses(fn, numbers)
+        rows = index.lookup(file=os.path.basename(fn))
+        rows = rows[np.isin(index.arrays["number"][rows], list(numbers))]
+        poses = index.fetch(rows)
+        assert len(poses) == len(expected)
+        for number, pose in zip(index.arrays["number"][rows], poses):
+            assert pose == expected[number]
+
+def test_lookup_by_name(subdir):
+    index = Index.build(subdir)
+    names = index.arrays["name"]
+    for name in [names[0], names[200], names[-1]]:
+        np.testing.assert_array_equal(index.lookup(name=name), np.flatnonzero(names == name))
+    row = index.lookup(number=10, file="test.0002.mol2.gz")[0]
+    assert index.lookup(name=names[row], number=10, file="test.0002.mol2.gz").tolist() == [row]
+    assert index.lookup(name="ZINC_unknown").size == 0
+
+def test_saved_index_round_trip(subdir):
+    built = Index.build(subdir, 20000)
+    assert Index.is_current(subdir)
+    assert Index.is_current(subdir, 20000)
+    assert not Index.is_current(subdir, 10000)
+    loaded = Index.load(subdir)
+    for name in built.arrays:
+        np.testing.assert_array_equal(loaded.arrays[name], built.arrays[name])
+    rows = loaded.lookup(number=10)
+    assert loaded.fetch(rows) == built.fetch(rows)
+
+def test_checkpoint_writes_a_copy(subdir):
+    fn = Mol2Index.mol2_files(subdir)[0]
+    original = read(fn)
+
+    scanner, members, indexed_fn = scan_file(fn, checkpoint=20000)
+    assert indexed_fn == rechunked_fn(fn) == fn.replace(".mol2.gz", ".rechunked.mol2.gz")
+    assert read(fn) == original
+    assert read(indexed_fn, decompress=True) == read(fn, decompress=True)
+    assert members.shape[0] > 1
+    assert not os.path.exists(indexed_fn + ".tmp")
+
+    # the copy is not indexed as a DOCK output
+    assert Mol2Index.mol2_files(subdir) == sorted(
+        os.path.join(subdir, f) for f in ["test.0001.mol2.gz", "test.0002.mol2.gz"]
+        )
+
+def test_checkpoint_in_place(subdir):
+    fn = Mol2Index.mol2_files(subdir)[0]
+    content = read(fn, decompress=True)
+    scanner, members, indexed_fn = scan_file(fn, checkpoint=20000, in_place=True)
+    assert indexed_fn == fn
+    assert read(fn, decompress=True) == content
+    assert members.shape[0] > 1
+    assert not os.path.exists(rechunked_fn(fn))
+
+def test_changed_copy_is_not_current(subdir):
+    Index.build(subdir, 20000)
+    fn = rechunked_fn(Mol2Index.mol2_files(subdir)[0])
+    os.remove(fn)
+    assert not Index.is_current(subdir)
+
+@pytest.mark.parametrize("in_place", [False, True])
+def test_failed_checkpoint_leaves_original(subdir, monkeypatch, in_place):
+    fn = Mol2Index.mol2_files(subdir)[0]
+    original = read(fn)
+
+    monkeypatch.setattr(Mol2Index, "stream_checksum", lambda fn : (0, 0))
+    with pytest.raises(RuntimeError):
+        scan_file(fn, checkpoint=20000, in_place=in_place)
+    assert read(fn) == original
+    assert not os.path.exists(rechunked_fn(fn))
+    assert not os.path.exists(fn + ".tmp")
+    assert not os.path.exists(rechunked_fn(fn) + ".tmp")
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Outdock import parse_outdock, extract, SCORE_FIELDS
+
+# excerpt of a DOCK 3.7 OUTDOCK with the lines ParseOUTDOCK skips
+OUTDOCK = """\
+ DOCK 3.7 (version 3.7.5 20200512)
+ receptor_sphere_file: ../dockfiles/matching_spheres.sph
+ number of receptor spheres:   45
+ open the file: /db/ab/xaa.db2.gz
+  mol#           id_num     flexiblecode  matched    nscored  time hac    setnum    matnum   rank cloud    elect +  gist +   vdW + psol +  asol + inter + rec_e + rec_d + r_hyd =    Total
+      1  ZINC000000001234      0      2561       1217    0.72  25      1254      3079      1     1   -12.57    0.00   -33.74   10.69   -3.86    0.00    0.00    0.00    0.00   -39.49
+      2  ZINC000000005678   skip_size
+      3  ZINC000000009012      0        14          0    0.01  31   no_match
+      4  ZINC000000003456     12       988        406    0.33  19       411      1502      1     1    -4.10    0.00   -21.02    4.33   -1.95    0.00    0.00    0.00    0.00   -22.74
+ close the file: /db/ab/xaa.db2.gz
+ open the file: /db/ab/xab.db2.gz
+  mol#           id_num     flexiblecode  matched    nscored  time hac    setnum    matnum   rank cloud    elect +  gist +   vdW + psol +  asol + inter + rec_e + rec_d + r_hyd =    Total
+      1  ZINC000000007890      3     12034       5519    2.15  28      5540     ****** 1     1  -101.97    0.00   -40.12   79.40   -5.11    0.00    0.00    0.00    0.00   -67.80
+      2  ZINC000000002468      0        77         12    0.05  22  bump
+ 912  ZINC000000001357      0       512        200    0.20  24       210       600      1     1    -2.00    0.00   -18.00    3.00   -1.00    0.00    0.00    0.00    0.00   -18.00
+      5  ZINC000000001111      0       512        200    0.20  24       210       600      1     1    -2.00    0.00   -18.00    3.00   -1.00    0.00    0.00    0.00
+ close the file: /db/ab/xab.db2.gz
+elapsed time (sec):   16.0442 (hour):     0.0045
+"""
+
+@pytest.fixture
+def outdock(tmp_path):
+    fn = tmp_path / "k2_0" / "subcluster0000" / "OUTDOCK"
+    fn.parent.mkdir(parents=True)
+    fn.write_text(OUTDOCK)
+    return str(fn)
+
+def test_parse_real_outdock(outdock, capsys):
+    columns, elapsed = parse_outdock(outdock)
+    assert elapsed == pytest.approx(16.0442)
+    assert list(columns) == ["cls_idx"] + [name for name, _ in SCORE_FIELDS]
+
+    np.testing.assert_array_equal(columns["cls_idx"], [1, 1, 2])
+    np.testing.assert_array_equal(columns["mol_idx"], [1, 4, 1])
+    assert columns["mol_name"].tolist() == [
+        "ZINC000000001234", "ZINC000000003456", "ZINC000000007890"
+        ]
+    np.testing.assert_array_equal(columns["flex_code"], ["0", "12", "3"])
+    np.testing.assert_array_equal(columns["matched"], [2561, 988, 12034])
+    np.testing.assert_allclose(columns["time"], [0.72, 0.33, 2.15])
+    np.testing.assert_allclose(columns["elect"], [-12.57, -4.10, -101.97])
+    np.testing.assert_allclose(columns["Total"], [-39.49, -22.74, -67.80])
+    # fortran overflow in an integer column
+    np.testing.assert_array_equal(columns["matnum"], [3079, 1502, -1])
+    for name, dtype in SCORE_FIELDS:
+        if dtype is not str:
+            assert columns[name].dtype == dtype
+
+    # the short score line is reported, the "^ 9" line is ignored as in Extract.jl
+    assert "1 score lines of {} do not have 21 columns".format(outdock) in capsys.readouterr().out
+
+@pytest.mark.parametrize("chunk_rows", [1, 2])
+def test_chunks_give_the_same_columns(outdock, chunk_rows):
+    expected, _ = parse_outdock(outdock)
+    columns, elapsed = parse_outdock(outdock, chunk_rows=chunk_rows)
+    assert elapsed == pytest.approx(16.0442)
+    for name in expected:
+        np.testing.assert_array_equal(columns[name], expected[name])
+
+def test_unfinished_outdock(tmp_path):
+    fn = tmp_path / "OUTDOCK"
+    fn.write_text(OUTDOCK.rsplit("elapsed", 1)[0])
+    columns, elapsed = parse_outdock(str(fn))
+    assert np.isnan(elapsed)
+    assert columns["Total"].size == 3
+
+    fn.write_text(" DOCK 3.7\n")
+    columns, elapsed = parse_outdock(str(fn))
+    assert columns["Total"].size == 0 and columns["Total"].dtype == np.float64
+
+@pytest.mark.parametrize("fmt", ["parquet", "tab"])
+def test_extract_tables(tmp_path, outdock, fmt):
+    second = tmp_path / "k2_0" / "subcluster0001" / "OUTDOCK"
+    second.parent.mkdir()
+    second.write_text(OUTDOCK.rsplit("elapsed", 1)[0])
+    prefix = str(tmp_path / "outdock")
+    extract([str(tmp_path / "k2_0")], prefix, fmt=fmt, jobs=1)
+
+    if fmt == "parquet":
+        scores = pd.read_parquet(prefix + ".scores.parquet")
+        times = pd.read_parquet(prefix + ".time.parquet")
+    else:
+        scores = pd.read_csv(prefix + ".scores.tab", sep="\t", dtype={"flex_code" : str})
+        times = pd.read_csv(prefix + ".time.tab", sep="\t")
+
+    assert scores.shape == (6, 24)
+    assert scores.sub_idx.astype(str).tolist() == ["subcluster0000"] * 3 + ["subcluster0001"] * 3
+    assert set(scores.dir_name.astype(str)) == {str(tmp_path / "k2_0")}
+    np.testing.assert_allclose(scores.Total, [-39.49, -22.74, -67.80] * 2)
+    assert times.elapsed.iloc[0] == pytest.approx(16.0442)
+    assert np.isnan(times.elapsed.iloc[1])
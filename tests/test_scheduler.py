@@ -0,0 +1,65 @@
+import os
+import signal
+
+import pytest
+
+from Scheduler import Scheduler, TaskErrors
+
+class State:
+    """
+    worker state failing (or killing its worker) on the given tasks
+    """
+
+    def __init__(self, fail=(), kill=()):
+        self.fail = fail
+        self.kill = kill
+
+    def task(self, idx):
+        if idx in self.kill:
+            os.kill(os.getpid(), signal.SIGKILL)
+        if idx in self.fail:
+            raise ValueError("task {}".format(idx))
+        return idx * idx
+
+    def parts(self, idx):
+        raise TaskErrors({"{}.a".format(idx) : "bad a", "{}.b".format(idx) : "bad b"})
+
+    def exit(self, idx):
+        raise SystemExit("ERROR : stopped {}".format(idx))
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_failures_are_collected(jobs):
+    scheduler = Scheduler(jobs=jobs, progress=False)
+    failures = scheduler.run(State(fail=(1, 3)), "task", [(i,) for i in range(5)], keys=list("abcde"))
+    assert [(f.key, f.error) for f in failures] == [
+        ("b", "ValueError: task 1"), ("d", "ValueError: task 3")
+        ]
+    assert "Traceback" in failures[0].traceback
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_task_errors_and_exits(jobs):
+    scheduler = Scheduler(jobs=jobs, progress=False)
+    failures = scheduler.run(State(), "parts", [(0,), (1,)])
+    assert [(f.key, f.error) for f in failures] == [
+        ("0.a", "bad a"), ("0.b", "bad b"), ("1.a", "bad a"), ("1.b", "bad b")
+        ]
+    failures = scheduler.run(State(), "exit", [(0,)], keys=["run"])
+    assert [(f.key, f.error) for f in failures] == [("run", "ERROR : stopped 0")]
+
+def test_killed_worker_is_reported_not_waited_for():
+    scheduler = Scheduler(jobs=2, progress=False)
+    failures = scheduler.run(State(kill=(2,)), "task", [(i,) for i in range(6)], keys=range(6))
+    keys = [f.key for f in failures]
+    assert 2 in keys
+    assert all("worker process died" in f.error for f in failures)
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_callback_gets_results_of_successful_tasks(jobs):
+    scheduler = Scheduler(jobs=jobs, progress=False)
+    results = {}
+    failures = scheduler.run(
+        State(fail=(2,)), "task", [(i,) for i in range(4)], keys=list("abcd"),
+        callback=results.__setitem__
+        )
+    assert results == {"a" : 0, "b" : 1, "d" : 9}
+    assert [f.key for f in failures] == ["c"]
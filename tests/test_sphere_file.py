@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from SphereFile import read_sph, SphereSet
+from ClusterSpheres import write_seed_clusters
+
+from benchmarks.synthetic import write_synthetic_sph
+from benchmarks.sphere_file import legacy_read_sph, legacy_write_single
+
+@pytest.mark.parametrize("num_spheres", [1, 45, 5000])
+def test_coordinates_match_legacy_parse(tmp_path, num_spheres):
+    fn = str(tmp_path / "spheres.sph")
+    write_synthetic_sph(fn, num_spheres)
+    header, lines, records = read_sph(fn)
+    assert len(header) == 2
+    assert len(lines) == num_spheres
+    np.testing.assert_array_equal(
+        SphereSet.from_file(fn).coords, legacy_read_sph(fn).astype(np.float64)
+        )
+
+def test_clustered_files_match_legacy_writer(tmp_path):
+    fn = str(tmp_path / "spheres.sph")
+    write_synthetic_sph(fn, 300)
+    spheres = SphereSet.from_file(fn)
+
+    rng = np.random.RandomState(0)
+    runs = [(k, rng.randint(0, k, size=300).astype(np.int32)) for k in [1, 2, 7, 12]]
+    write_seed_clusters(
+        spheres, 0,
+        [(str(tmp_path / "new.{}.sph".format(k)), k, labels) for k, labels in runs]
+        )
+    for k, labels in runs:
+        legacy_write_single(spheres, str(tmp_path / "legacy.{}.sph".format(k)), k, labels)
+        with open(tmp_path / "new.{}.sph".format(k), "rb") as a, \
+                open(tmp_path / "legacy.{}.sph".format(k), "rb") as b:
+            assert a.read() == b.read()
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from SphereUsage import SphereIndex, SphereAccumulator
+
+from benchmarks.sphere_usage import legacy_sphere_usage
+
+def synthetic_poses(num_spheres, num_poses, seed=0):
+    """
+    sphere coordinates, (poses, 4) distinct sphere ids, ligand mask and
+    OXR coordinates within the printed precision of their sphere
+    """
+    rng = np.random.RandomState(seed)
+    coords = np.round(rng.normal(scale=10, size=(num_spheres, 3)), 3)
+    idx = np.argsort(rng.random_sample((num_poses, num_spheres)), axis=1)[:, :4]
+    ligand = rng.random_sample(num_poses) < 0.1
+    oxr = coords[idx] + rng.uniform(-0.004, 0.004, (num_poses, 4, 3))
+    return coords, idx, ligand, oxr
+
+@pytest.mark.parametrize("batch", [7, 1000])
+def test_matches_sphere_usage_jl(batch):
+    coords, idx, ligand, oxr = synthetic_poses(45, 2000)
+    index = SphereIndex(coords)
+    acc = SphereAccumulator(len(coords))
+    for b in range(0, idx.shape[0], batch):
+        found = index.lookup(oxr[b:b + batch].reshape(-1, 3)).reshape(-1, 4)
+        acc.add(found, ligand[b:b + batch])
+
+    text = np.char.mod("%.3f", coords[idx]).reshape(idx.shape[0], 12)
+    usage, cooc = legacy_sphere_usage(zip(text.tolist(), ligand), len(coords))
+
+    # SphereUsage.jl numbers spheres in order of first appearance
+    first = pd.unique(idx.ravel())
+    np.testing.assert_array_equal(cooc[:first.size, :first.size], acc.cooc[np.ix_(first, first)])
+    expected = np.array([usage[i] for i in range(first.size)])
+    np.testing.assert_array_equal(acc.usage[first], expected)
+    assert acc.unmatched == 0
+
+def test_unmatched_spheres_are_counted_not_used():
+    coords, idx, ligand, oxr = synthetic_poses(10, 50, seed=1)
+    index = SphereIndex(coords)
+    oxr[:, 0] += 5.0
+    found = index.lookup(oxr.reshape(-1, 3)).reshape(-1, 4)
+    acc = SphereAccumulator(len(coords))
+    acc.add(found, ligand)
+
+    assert acc.unmatched == idx.shape[0]
+    assert acc.usage[:, 0].sum() == 3 * idx.shape[0]
+    assert acc.cooc.sum() == 6 * idx.shape[0]
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+
+from SplitSDI import SplitSubDir, balance
+
+def write_sdi(fn, num_lines, newline=True):
+    lines = ["/db/mol{:06d}.db2.gz".format(i) for i in range(num_lines)]
+    with open(fn, "w+") as f:
+        f.write("\n".join(lines) + ("\n" if newline else ""))
+    return [l + "\n" for l in lines]
+
+def read(fn):
+    with open(fn) as f:
+        return f.read()
+
+@pytest.mark.parametrize("newline", [True, False])
+def test_roundrobin_matches_blastermaster(tmp_path, newline):
+    lines = write_sdi(str(tmp_path / "sdi"), 1003, newline)
+    ssd = SplitSubDir(str(tmp_path / "sdi"), n=7)
+    # blocks end mid line
+    ssd.block_size = 1000
+    ssd.prepare(str(tmp_path / "shards"))
+
+    if not newline:
+        lines[-1] = lines[-1].rstrip("\n")
+    for i in range(7):
+        assert read(ssd.shard_fn(i)) == "".join(lines[i::7])
+        assert "".join(ssd.read(i)) == "".join(lines[i::7])
+    np.testing.assert_array_equal(ssd.shard_cost, [144] * 2 + [143] * 5)
+
+def test_copies_of_shards(tmp_path):
+    write_sdi(str(tmp_path / "sdi"), 10)
+    ssd = SplitSubDir(str(tmp_path / "sdi"), n=3)
+    ssd.prepare(str(tmp_path / "shards"))
+    ssd.write(str(tmp_path / "copy"), 2)
+    assert read(str(tmp_path / "copy")) == read(ssd.shard_fn(2))
+    assert not os.path.samefile(str(tmp_path / "copy"), ssd.shard_fn(2))
+
+def test_lpt_balance_bound():
+    rng = np.random.RandomState(0)
+    costs = rng.lognormal(sigma=1.5, size=500)
+    load = np.bincount(balance(costs, 8), weights=costs, minlength=8)
+
+    # Graham's bound for longest-processing-time first
+    optimum = max(costs.sum() / 8, costs.max())
+    assert load.max() <= optimum * (4 / 3 - 1 / 24) + 1e-9
+    roundrobin = np.bincount(np.arange(500) % 8, weights=costs)
+    assert load.max() < roundrobin.max()
+
+def test_size_strategy_balances_db2_sizes(tmp_path):
+    sizes = [9000, 100, 100, 100, 4000, 4000, 500, 500]
+    with open(tmp_path / "sdi", "w+") as f:
+        for i, size in enumerate(sizes):
+            with open(tmp_path / "mol{}.db2.gz".format(i), "wb") as db2:
+                db2.write(b"x" * size)
+            f.write("mol{}.db2.gz\n".format(i))
+
+    ssd = SplitSubDir(str(tmp_path / "sdi"), n=2, strategy="size")
+    ssd.prepare(str(tmp_path / "shards"))
+    np.testing.assert_array_equal(sorted(ssd.shard_cost), [9100, 9200])
+    assert read(ssd.shard_fn(0)).split() == ["mol0.db2.gz", "mol1.db2.gz", "mol3.db2.gz"]
+
+def test_time_strategy_reads_outdock_times(tmp_path):
+    with open(tmp_path / "sdi", "w+") as f:
+        f.write("a.db2.gz\nb.db2.gz\nc.db2.gz\nd.db2.gz\n")
+    with open(tmp_path / "OUTDOCK", "w+") as f:
+        for name, times in [("a", [5.0, 5.0]), ("b", [1.0]), ("c", [8.0])]:
+            f.write("open the file: {}.db2.gz\n".format(name))
+            for i, t in enumerate(times):
+                f.write("  {:5d} ZINC{:08d} 1 1 1 {:.2f} 0 0\n".format(i, i, t))
+
+    ssd = SplitSubDir(
+        str(tmp_path / "sdi"), n=2, strategy="time",
+        time_patterns=[str(tmp_path / "OUT*")]
+        )
+    ssd.prepare(str(tmp_path / "shards"))
+    # d has no time and gets the median (8.0)
+    np.testing.assert_array_equal(sorted(ssd.shard_cost), [11.0, 16.0])
+    assert sorted(read(ssd.shard_fn(0)).split() + read(ssd.shard_fn(1)).split()) == [
+        "a.db2.gz", "b.db2.gz", "c.db2.gz", "d.db2.gz"
+        ]